@@ -14,6 +14,9 @@ done
 echo "Applying database migrations"
 python manage.py migrate --noinput
 
+echo "Creating cache table"
+python manage.py createcachetable
+
 echo "Collecting static files"
 python manage.py collectstatic --noinput
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking
+from .models import Booking, CalendarOutbox, EmailOutbox
 
 
 class BookingAdmin(admin.ModelAdmin):
@@ -26,4 +26,36 @@ class BookingAdmin(admin.ModelAdmin):
         return False
 
 
+class CalendarOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'booking_id', 'action', 'event_id', 'status',
+                    'attempts', 'next_attempt_at', 'last_error',
+                    'created_at', 'updated_at')
+    search_fields = ('booking_id', 'event_id')
+    list_filter = ('action', 'status')
+    ordering = ('id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'booking_id', 'kind', 'recipient', 'subject', 'status',
+                    'attempts', 'next_attempt_at', 'message_id', 'sent_at',
+                    'last_error', 'created_at', 'updated_at')
+    search_fields = ('booking_id', 'recipient', 'message_id')
+    list_filter = ('kind', 'status')
+    ordering = ('id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Booking, BookingAdmin)
+admin.site.register(CalendarOutbox, CalendarOutboxAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
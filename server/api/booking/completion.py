@@ -0,0 +1,43 @@
+"""
+Transition of finished bookings to COMPLETED.
+
+A booking is finished once its last occurrence has ended: the end of a non-recurring booking,
+or the end of the last occurrence of a series with UNTIL/COUNT. Booking.series_end_datetime
+stores that time (null for open-ended series, which never finish, and for series running after the
+occurrence horizon until the horizon reaches their end) and is indexed for confirmed
+bookings only, so finding finished bookings never scans completed or cancelled rows.
+
+Bookings are completed in chunks, each in its own short transaction: confirmed finished rows are
+locked with SKIP LOCKED (rows being edited are left for the next run), then bookings and their
+occurrences are updated with one UPDATE each. Run `python manage.py complete_bookings`
+every few minutes (or as a worker with --loop).
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, BookingOccurrence, bump_booking_versions
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def complete_finished_bookings(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """Marks confirmed bookings whose last occurrence ended before `now` as COMPLETED, returns how many."""
+    now = now or timezone.now()
+    completed = 0
+    while True:
+        with transaction.atomic():
+            booking_ids = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(status="CONFIRMED", series_end_datetime__lte=now)
+                .order_by("series_end_datetime")
+                .values_list("id", flat=True)[:batch_size])
+            if not booking_ids:
+                break
+            Booking.objects.filter(id__in=booking_ids).update(status="COMPLETED", updated_at=now)
+            BookingOccurrence.objects.filter(booking_id__in=booking_ids).update(status="COMPLETED")
+            bump_booking_versions(set(Booking.objects.filter(id__in=booking_ids).values_list("room_id", flat=True)))
+        completed += len(booking_ids)
+        if len(booking_ids) < batch_size:
+            break
+    return completed
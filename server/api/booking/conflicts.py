@@ -0,0 +1,222 @@
+"""
+Conflict detection between a (possibly recurring) booking and the existing bookings of a room.
+
+Existing bookings are materialized as BookingOccurrence rows (see occurrences.py), so only the
+new booking's own recurrence rule has to be taken into account. Rather than expanding every
+occurrence of the new series, candidate rows are loaded with one indexed range query over the
+series horizon and each row is tested against the series:
+
+- DAILY and WEEKLY rules (INTERVAL, BYDAY, UNTIL and COUNT) are tested with period arithmetic:
+  the series is split into streams of occurrences repeating every `period`, and the only
+  occurrence of a stream that can overlap a row is computed directly.
+- Other rules fall back to a bounded expansion (up to the occurrence horizon) and a binary search.
+
+All arithmetic uses local wall-clock time, like the recurrence rules themselves.
+
+Batches of new bookings (bulk creation) are checked with find_batch_conflicts: a sweep over the
+occurrences of the batch, and a single query joining every occurrence of the batch with the
+existing occurrences of its room.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import prefetch_related_objects
+from django.utils.timezone import get_fixed_timezone, localtime, make_naive
+
+from .models import Booking, BookingOccurrence
+from .occurrences import get_occurrence_horizon, iter_booking_occurrences
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+# Rule parts supported by the period arithmetic, anything else is expanded
+PERIODIC_RULE_PARTS = {"FREQ", "INTERVAL", "UNTIL", "COUNT", "BYDAY", "WKST"}
+
+
+def _local_naive(value):
+    return make_naive(localtime(value))
+
+
+def _parse_until(value):
+    """Returns UNTIL as a naive local datetime, or None if the format is not supported."""
+    formats = [("%Y%m%dT%H%M%SZ", True), ("%Y%m%dT%H%M%S", False), ("%Y%m%d", False)]
+    for date_format, is_utc in formats:
+        try:
+            until = datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        if is_utc:
+            until = _local_naive(until.replace(tzinfo=get_fixed_timezone(0)))
+        return until
+    return None
+
+
+class PeriodicSeries:
+    """Occurrences of a DAILY or WEEKLY rule, as streams of first starts repeating every `period`."""
+
+    def __init__(self, first_starts, period, duration, last_start, count=None):
+        self.first_starts = first_starts
+        self.period = period
+        self.duration = duration
+        self.last_start = last_start
+        # only set for single-stream rules
+        self.count = count
+
+    @classmethod
+    def from_rule(cls, start_datetime, end_datetime, recurrence_rule, until):
+        """Returns a PeriodicSeries for the rule, or None if the rule needs to be expanded."""
+        try:
+            parts = dict(part.split("=", 1) for part in recurrence_rule.split(";"))
+            interval = int(parts.get("INTERVAL", 1))
+            count = int(parts["COUNT"]) if "COUNT" in parts else None
+        except ValueError:
+            return None
+        byday = parts.get("BYDAY", "").split(",") if parts.get("BYDAY") else []
+        if (set(parts) - PERIODIC_RULE_PARTS or interval < 1
+                or parts["FREQ"] not in ("DAILY", "WEEKLY")
+                or any(day not in WEEKDAYS for day in byday)):
+            return None
+
+        dtstart = _local_naive(start_datetime)
+        last_start = _local_naive(until)
+        if "UNTIL" in parts:
+            rule_until = _parse_until(parts["UNTIL"])
+            if rule_until is None:
+                return None
+            last_start = min(last_start, rule_until)
+
+        if parts["FREQ"] == "DAILY" and not byday:
+            first_starts = [dtstart]
+            period = timedelta(days=interval)
+        elif parts["FREQ"] == "DAILY":
+            # DAILY;BYDAY only keeps the given weekdays of every INTERVAL days
+            if interval != 1:
+                return None
+            first_starts = [dtstart + timedelta(days=(WEEKDAYS.index(day) - dtstart.weekday()) % 7)
+                            for day in byday]
+            period = timedelta(weeks=1)
+        else:
+            # weeks are counted from the week of dtstart (starting on WKST), days before dtstart are skipped
+            week_start_day = WEEKDAYS.index(parts.get("WKST", "MO"))
+            week_start = dtstart - timedelta(days=(dtstart.weekday() - week_start_day) % 7)
+            period = timedelta(weeks=interval)
+            first_starts = []
+            for day in byday or [WEEKDAYS[dtstart.weekday()]]:
+                first_start = week_start + timedelta(days=(WEEKDAYS.index(day) - week_start_day) % 7)
+                first_starts.append(first_start if first_start >= dtstart else first_start + period)
+
+        if count is not None and len(set(first_starts)) > 1:
+            # COUNT is shared by every stream, which needs ordering the occurrences
+            return None
+        return cls(sorted(set(first_starts)), period, end_datetime - start_datetime, last_start, count)
+
+    def overlaps(self, start, end):
+        """Returns True if an occurrence overlaps [start, end) (aware datetimes)."""
+        start, end = _local_naive(start), _local_naive(end)
+        # an occurrence overlaps if it starts after `start - duration` and before `end`
+        after = start - self.duration
+        for first_start in self.first_starts:
+            k = (after - first_start) // self.period + 1 if after >= first_start else 0
+            if self.count is not None and k >= self.count:
+                continue
+            occurrence_start = first_start + k * self.period
+            if occurrence_start < end and occurrence_start <= self.last_start:
+                return True
+        return False
+
+
+class ExpandedSeries:
+    """Occurrences of any rule, expanded up to the occurrence horizon."""
+
+    def __init__(self, start_datetime, end_datetime, recurrence_rule, until):
+        booking = Booking(start_datetime=start_datetime, end_datetime=end_datetime,
+                          recurrence_rule=recurrence_rule)
+        self.starts = [occurrence_start for occurrence_start, _ in iter_booking_occurrences(booking, until)]
+        self.duration = end_datetime - start_datetime
+
+    def overlaps(self, start, end):
+        index = bisect_right(self.starts, start - self.duration)
+        return index < len(self.starts) and self.starts[index] < end
+
+
+def find_conflicting_occurrence(room, start_datetime, end_datetime, recurrence_rule="", exclude_booking_id=None):
+    """
+    Returns the earliest confirmed or completed BookingOccurrence of the room overlapping any
+    occurrence of the booking (with its `booking` loaded), or None.
+    """
+    occurrences = BookingOccurrence.objects.filter(
+        room=room,
+        # Exclude cancelled bookings
+        status__in=['CONFIRMED', 'COMPLETED'],
+        end_datetime__gt=start_datetime,
+    ).select_related('booking').order_by('start_datetime')
+    if exclude_booking_id is not None:
+        occurrences = occurrences.exclude(booking_id=exclude_booking_id)
+
+    if not recurrence_rule:
+        return occurrences.filter(start_datetime__lt=end_datetime).first()
+
+    # occurrences of open-ended series are only materialized up to the horizon
+    until = max(get_occurrence_horizon(), localtime(start_datetime))
+    series = PeriodicSeries.from_rule(start_datetime, end_datetime, recurrence_rule, until)
+    if series is None:
+        series = ExpandedSeries(start_datetime, end_datetime, recurrence_rule, until)
+    candidates = occurrences.filter(start_datetime__lt=until + (end_datetime - start_datetime))
+    for occurrence in candidates.iterator():
+        if series.overlaps(occurrence.start_datetime, occurrence.end_datetime):
+            return occurrence
+    return None
+
+
+def find_batch_conflicts(bookings, occurrences):
+    """
+    Checks a batch of unsaved bookings, `occurrences` holding the expanded (start, end) occurrences
+    of each booking. Returns {index: conflict} for the bookings overlapping an earlier booking of the
+    batch (conflict is the index of that booking) or else an existing confirmed or completed occurrence
+    of their room (conflict is the earliest BookingOccurrence, with its `booking` loaded).
+    """
+    conflicts = {}
+
+    # Overlaps inside the batch: sweep the occurrences of each room by start
+    occurrences_by_room = defaultdict(list)
+    for index, (booking, booking_occurrences) in enumerate(zip(bookings, occurrences)):
+        occurrences_by_room[booking.room_id].extend(
+            (start, end, index) for start, end in booking_occurrences)
+    for room_occurrences in occurrences_by_room.values():
+        room_occurrences.sort()
+        latest_end, latest_index = None, None
+        for start, end, index in room_occurrences:
+            if latest_end is not None and start < latest_end and index != latest_index:
+                later, earlier = max(index, latest_index), min(index, latest_index)
+                conflicts.setdefault(later, earlier)
+            if latest_end is None or end > latest_end:
+                latest_end, latest_index = end, index
+
+    # Overlaps with existing bookings: one query for every occurrence of the batch
+    candidates = [
+        (index, booking.room_id, start, end)
+        for index, (booking, booking_occurrences) in enumerate(zip(bookings, occurrences))
+        if index not in conflicts
+        for start, end in booking_occurrences
+    ]
+    if not candidates:
+        return conflicts
+    indexes, room_ids, starts, ends = (list(values) for values in zip(*candidates))
+    overlapping_occurrences = list(BookingOccurrence.objects.raw(
+        f"""
+        SELECT DISTINCT ON (candidate.batch_index) occurrence.*, candidate.batch_index
+        FROM {BookingOccurrence._meta.db_table} AS occurrence
+        JOIN unnest(%s::integer[], %s::integer[], %s::timestamptz[], %s::timestamptz[])
+            AS candidate(batch_index, room_id, start_datetime, end_datetime)
+            ON occurrence.room_id = candidate.room_id
+            AND occurrence.start_datetime < candidate.end_datetime
+            AND occurrence.end_datetime > candidate.start_datetime
+        WHERE occurrence.status IN ('CONFIRMED', 'COMPLETED')
+        ORDER BY candidate.batch_index, occurrence.start_datetime
+        """,
+        [indexes, room_ids, starts, ends],
+    ))
+    prefetch_related_objects(overlapping_occurrences, "booking")
+    for occurrence in overlapping_occurrences:
+        conflicts[occurrence.batch_index] = occurrence
+    return conflicts
@@ -0,0 +1,158 @@
+"""
+Outbox for booking emails.
+
+Booking writes only add EmailOutbox rows in their own transaction (enqueue_email / enqueue_emails),
+so no email is queued for a rolled back booking and responses never wait for template rendering
+or the email provider. `python manage.py process_email_outbox` drains the outbox:
+
+- Due entries are claimed in a short transaction (SKIP LOCKED, so several workers can run): their
+  attempt is counted and their next attempt pushed back by CLAIM_SECONDS, so an entry claimed by
+  a worker that crashed is retried later instead of being lost.
+- Emails are built and sent by a small thread pool, each thread reusing one connection of the
+  email backend (one HTTP session with Anymail) for its share of the batch.
+- Sent entries are marked SENT with the provider message ID. Failures are retried with exponential
+  backoff and marked FAILED after settings.EMAIL_OUTBOX_MAX_ATTEMPTS attempts; refused recipients
+  are not retried.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from anymail.exceptions import AnymailRecipientsRefused
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..email_utils import build_booking_cancelled_email, build_booking_confirmed_email, email_is_configured
+from .models import EmailOutbox
+from .outbox import get_retry_delay
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_WORKERS = 4
+# how long a claimed entry is reserved for the worker sending it (seconds)
+CLAIM_SECONDS = 5 * 60
+DATETIME_FIELDS = ("start_datetime", "end_datetime")
+
+EMAIL_BUILDERS = {
+    "CONFIRMED": build_booking_confirmed_email,
+    "CANCELLED": build_booking_cancelled_email,
+}
+
+
+def enqueue_email(kind, recipient, subject, context, booking_id=None):
+    """Queues a booking email, in the current transaction. Nothing is queued when email is not configured."""
+    if not email_is_configured():
+        logger.warning("RESEND_API_KEY or DEFAULT_FROM_EMAIL is not set. Emails will not be sent.")
+        return None
+    return EmailOutbox.objects.create(
+        booking_id=booking_id, kind=kind, recipient=recipient, subject=subject, context=context)
+
+
+def enqueue_emails(emails):
+    """Queues many booking emails (dicts of enqueue_email arguments) with one insert."""
+    if not email_is_configured():
+        logger.warning("RESEND_API_KEY or DEFAULT_FROM_EMAIL is not set. Emails will not be sent.")
+        return []
+    return EmailOutbox.objects.bulk_create(EmailOutbox(**email) for email in emails)
+
+
+def build_message(entry):
+    """Builds the email of an outbox entry, with the datetimes of its context parsed back."""
+    context = dict(entry.context)
+    for field in DATETIME_FIELDS:
+        if isinstance(context.get(field), str):
+            context[field] = parse_datetime(context[field])
+    message = EMAIL_BUILDERS[entry.kind]([entry.recipient], context=context, subject=entry.subject)
+    if message is None:
+        raise ValueError("Email context is missing the booking datetimes.")
+    return message
+
+
+def _send_entries(entries):
+    """Sends the emails of entries over one backend connection, returns {entry ID: (message ID, error)}."""
+    results = {}
+    try:
+        with get_connection() as connection:
+            for entry in entries:
+                try:
+                    message = build_message(entry)
+                    message.connection = connection
+                    message.send()
+                except Exception as error:
+                    results[entry.id] = ("", error)
+                    continue
+                status = getattr(message, "anymail_status", None)
+                results[entry.id] = (getattr(status, "message_id", None) or "", None)
+    except Exception as error:
+        # the connection could not be opened (or closed)
+        for entry in entries:
+            results.setdefault(entry.id, ("", error))
+    return results
+
+
+def _record_result(entry, message_id, error, counts, max_attempts, now):
+    """Marks a sent entry SENT, or schedules its retry (gives up after max_attempts)."""
+    entry.updated_at = now
+    if error is None:
+        entry.status = "SENT"
+        entry.message_id = str(message_id)[:100]
+        entry.sent_at = now
+        entry.last_error = ""
+        counts["sent"] += 1
+    elif entry.attempts >= max_attempts or isinstance(error, AnymailRecipientsRefused):
+        entry.status = "FAILED"
+        entry.last_error = str(error)
+        counts["failed"] += 1
+        logger.error(f"Giving up {entry.kind.lower()} email of booking {entry.booking_id}: {error}")
+    else:
+        entry.last_error = str(error)
+        entry.next_attempt_at = now + get_retry_delay(entry.attempts)
+        counts["retried"] += 1
+        logger.warning(
+            f"Failed to send {entry.kind.lower()} email of booking {entry.booking_id}, "
+            f"retrying at {entry.next_attempt_at}: {error}")
+
+
+def process_email_outbox(batch_size=50, workers=DEFAULT_WORKERS):
+    """
+    Sends up to `batch_size` due outbox emails with `workers` threads.
+    Returns a dict with the number of emails sent, retried (rescheduled) and failed (given up).
+    """
+    max_attempts = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    counts = {"sent": 0, "retried": 0, "failed": 0}
+    if not email_is_configured():
+        logger.warning("RESEND_API_KEY or DEFAULT_FROM_EMAIL is not set. Emails will not be sent.")
+        return counts
+
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            status="PENDING", next_attempt_at__lte=now,
+        ).order_by("next_attempt_at", "id")[:batch_size])
+        for entry in entries:
+            entry.attempts += 1
+            entry.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+            entry.updated_at = now
+        EmailOutbox.objects.bulk_update(entries, ["attempts", "next_attempt_at", "updated_at"])
+    if not entries:
+        return counts
+
+    # building and sending emails does not use the database, threads only share the loaded entries
+    chunks = [entries[index::workers] for index in range(min(workers, len(entries)))]
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        for chunk_results in executor.map(_send_entries, chunks):
+            results.update(chunk_results)
+
+    now = timezone.now()
+    for entry in entries:
+        message_id, error = results[entry.id]
+        _record_result(entry, message_id, error, counts, max_attempts, now)
+    EmailOutbox.objects.bulk_update(
+        entries, ["status", "attempts", "next_attempt_at", "last_error", "message_id", "sent_at", "updated_at"])
+    return counts
@@ -1,8 +1,30 @@
+"""
+Google Calendar service client.
+
+Building a service re-reads the service-account file, parses the discovery document and opens
+a new HTTPS connection, so it is done once and reused:
+
+- Credentials are loaded once per process and shared. AuthorizedHttp refreshes the access token
+  when it expires (and retries once on 401), so they never have to be reloaded.
+- The service is built from the discovery document bundled with google-api-python-client
+  (static_discovery, no network call) on top of a keep-alive httplib2 connection.
+  httplib2 connections are not thread-safe, so each thread gets its own service.
+
+Set GOOGLE_CALENDAR_API_ENDPOINT (e.g. "http://localhost:8085/calendar/v3/") to send every
+request, batches included, to another server such as a local fake or emulator.
+"""
+
 import os
+import threading
 from pathlib import Path
+from urllib.parse import urljoin
+
+import httplib2
+from dotenv import load_dotenv
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from dotenv import load_dotenv
+from googleapiclient.http import BatchHttpRequest
 
 
 # Resolve BASE_DIR and load .env
@@ -10,8 +32,21 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# batchPath of the Calendar v3 discovery document
+BATCH_PATH = "/batch/calendar/v3"
+# seconds
+HTTP_TIMEOUT = 30
+
+_credentials = None
+_credentials_path = None
+_credentials_lock = threading.Lock()
+_local = threading.local()
 
-def get_calendar_service():
+
+def get_credentials():
+    """Returns the service-account credentials, loaded once per process (and again if GOOGLE_CREDENTIALS_FILE changes)."""
+    global _credentials, _credentials_path
 
     cred_path = os.getenv("GOOGLE_CREDENTIALS_FILE")
     if not cred_path:
@@ -20,8 +55,42 @@ def get_calendar_service():
             f"Checked: {os.path.join(BASE_DIR, '.env')}"
         )
 
-    creds = service_account.Credentials.from_service_account_file(
-        cred_path,
-        scopes=["https://www.googleapis.com/auth/calendar"]
-    )
-    return build("calendar", "v3", credentials=creds)
+    with _credentials_lock:
+        if _credentials is None or _credentials_path != cred_path:
+            _credentials = service_account.Credentials.from_service_account_file(
+                cred_path, scopes=SCOPES)
+            _credentials_path = cred_path
+        return _credentials
+
+
+def get_calendar_service():
+    """Returns the Calendar v3 service of the current thread, built on first use."""
+    credentials = get_credentials()
+    service = getattr(_local, "service", None)
+    if service is None or _local.credentials is not credentials:
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        api_endpoint = os.getenv("GOOGLE_CALENDAR_API_ENDPOINT")
+        service = build("calendar", "v3", http=http,
+                        static_discovery=True, cache_discovery=False,
+                        client_options={"api_endpoint": api_endpoint} if api_endpoint else None)
+        _local.service = service
+        _local.credentials = credentials
+    return service
+
+
+def new_batch_request(service, callback):
+    """Returns an empty batch request of the service, sent to GOOGLE_CALENDAR_API_ENDPOINT if set."""
+    api_endpoint = os.getenv("GOOGLE_CALENDAR_API_ENDPOINT")
+    if api_endpoint:
+        return BatchHttpRequest(callback=callback, batch_uri=urljoin(api_endpoint, BATCH_PATH))
+    return service.new_batch_http_request(callback=callback)
+
+
+def reset_calendar_service():
+    """Drops the cached credentials, and the service of the current thread (other threads rebuild theirs on next use)."""
+    global _credentials, _credentials_path
+    with _credentials_lock:
+        _credentials = None
+        _credentials_path = None
+    _local.service = None
+    _local.credentials = None
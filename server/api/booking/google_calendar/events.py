@@ -1,5 +1,8 @@
 import os
-from .client import get_calendar_service
+from .client import get_calendar_service, new_batch_request
+
+# Google Calendar accepts up to 50 requests per batch
+BATCH_SIZE = 50
 
 
 def requires_calendar_id(func):
@@ -86,3 +89,59 @@ def delete_event(CALENDAR_ID, event_id: str):
     """
     service = get_calendar_service()
     return service.events().delete(calendarId=CALENDAR_ID, eventId=event_id).execute()
+
+
+@requires_calendar_id
+def batch_events(CALENDAR_ID, operations: list):
+    """
+    Apply many event operations with batch requests of up to BATCH_SIZE operations each.
+
+    Args:
+        operations (list): Operations as dicts with an "action" key:
+        - {"action": "create", "event_data": dict}
+        - {"action": "update", "event_id": str, "event_data": dict}
+        - {"action": "delete", "event_id": str}
+
+    Returns:
+        list: One result per operation, in the same order:
+        {"ok": bool, "event": dict or None, "error": Exception or None}.
+        "event" is the created or updated event (None for deletions), "error" is the
+        HttpError of the operation, or the error of its whole batch request.
+    """
+    service = get_calendar_service()
+    requests = []
+    for operation in operations:
+        action = operation["action"]
+        if action == "create":
+            request = service.events().insert(calendarId=CALENDAR_ID, body=operation["event_data"])
+        elif action == "update":
+            request = service.events().update(
+                calendarId=CALENDAR_ID, eventId=operation["event_id"], body=operation["event_data"])
+        elif action == "delete":
+            request = service.events().delete(calendarId=CALENDAR_ID, eventId=operation["event_id"])
+        else:
+            raise ValueError(f"Unknown event operation: {action}")
+        requests.append(request)
+
+    results = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = {
+            "ok": exception is None,
+            "event": response or None,
+            "error": exception,
+        }
+
+    for chunk_start in range(0, len(requests), BATCH_SIZE):
+        batch = new_batch_request(service, callback)
+        chunk = range(chunk_start, min(chunk_start + BATCH_SIZE, len(requests)))
+        for index in chunk:
+            batch.add(requests[index], request_id=str(index))
+        try:
+            batch.execute()
+        except Exception as error:
+            # the batch request itself failed, operations without a result were not applied
+            for index in chunk:
+                if results[index] is None:
+                    results[index] = {"ok": False, "event": None, "error": error}
+    return results
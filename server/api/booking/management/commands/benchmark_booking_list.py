@@ -0,0 +1,70 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.booking.models import Booking
+from api.booking.serializers import BOOKING_LIST_VALUES, BookingListSerializer, booking_list_data
+from api.room.models import Location, Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the booking list fast path (booking_list_data over .values() rows) against "
+        "BookingListSerializer. Creates a temporary location, room and bookings in the configured "
+        "database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Number of bookings listed.")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per path, the best one is reported.")
+
+    def handle(self, *args, **options):
+        location = Location.objects.create(name=f"Benchmark {timezone.now().isoformat()}")
+        try:
+            room = Room.objects.create(name="Benchmark list", location=location)
+            start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=7)
+            # rows only, occurrences are not needed to list bookings
+            Booking.objects.bulk_create(
+                Booking(
+                    room=room,
+                    visitor_name=f"Visitor {index}",
+                    visitor_email=f"visitor{index}@example.com",
+                    start_datetime=start + timedelta(hours=index),
+                    end_datetime=start + timedelta(hours=index, minutes=45),
+                    recurrence_rule="FREQ=WEEKLY;COUNT=4" if index % 3 == 0 else "",
+                )
+                for index in range(options["rows"])
+            )
+            queryset = Booking.objects.select_related("room").filter(room=room).order_by("-start_datetime")
+
+            serializer_seconds, serializer_data = self._best(
+                lambda: BookingListSerializer(queryset.all(), many=True).data, options["repeat"])
+            fast_seconds, fast_data = self._best(
+                lambda: booking_list_data(queryset.values(*BOOKING_LIST_VALUES)), options["repeat"])
+
+            rows = options["rows"]
+            self.stdout.write(f"{rows} bookings (query and serialization, best of {options['repeat']}):")
+            self.stdout.write(f"  BookingListSerializer: {rows / serializer_seconds:.0f} rows/s ({serializer_seconds * 1000:.1f} ms)")
+            self.stdout.write(f"  booking_list_data:     {rows / fast_seconds:.0f} rows/s ({fast_seconds * 1000:.1f} ms)")
+            self.stdout.write(f"  speedup: {serializer_seconds / fast_seconds:.1f}x")
+            if json.dumps(serializer_data) == json.dumps(fast_data):
+                self.stdout.write(self.style.SUCCESS("  identical JSON"))
+            else:
+                self.stdout.write(self.style.ERROR("  JSON differs"))
+        finally:
+            # bookings are deleted with their room
+            Room.objects.filter(location=location).delete()
+            location.delete()
+
+    def _best(self, run, repeat):
+        """Returns the fastest elapsed seconds of `repeat` runs, and the result of the last run."""
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
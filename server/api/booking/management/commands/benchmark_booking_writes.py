@@ -0,0 +1,156 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.booking.locks import lock_rooms
+from api.booking.models import BookingOccurrence
+from api.booking.serializers import BookingListSerializer
+from api.room.models import Location, Room
+
+# weekly series of 4 occurrences, candidates of a group start 0 to 3 weeks apart so they all overlap
+SERIES_RULE = "FREQ=WEEKLY;COUNT=4"
+SERIES_PER_GROUP = 4
+# distinct (weekday, hour) slots of a block of groups, blocks are 8 weeks apart so they never overlap
+SLOTS_PER_BLOCK = 7 * 8
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent booking creation with the per-room write locks (see api/booking/locks.py). "
+        "Creates a temporary location, rooms and bookings in the configured database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Number of concurrent writers.")
+        parser.add_argument(
+            "--groups",
+            type=int,
+            default=25,
+            help=f"Contended run: groups of {SERIES_PER_GROUP} mutually overlapping weekly series booked in one room.",
+        )
+        parser.add_argument(
+            "--bookings-per-thread",
+            type=int,
+            default=25,
+            help="Parallel run: non-overlapping bookings created by each writer in its own room.",
+        )
+        parser.add_argument(
+            "--no-lock",
+            action="store_true",
+            help="Skip the room locks, to compare (overlapping occurrences may be accepted).",
+        )
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        use_lock = not options["no_lock"]
+        # aligned to a Monday at midnight (local time), far enough in the future for every booking
+        today = timezone.localdate()
+        base = timezone.make_aware(datetime.combine(today + timedelta(days=35 - today.weekday()), datetime.min.time()))
+
+        location = Location.objects.create(name=f"Benchmark {timezone.now().isoformat()}")
+        try:
+            contended_room = Room.objects.create(name="Benchmark contended", location=location)
+            payloads = [
+                self._payload(contended_room, base, group, offset)
+                for group in range(options["groups"])
+                for offset in range(SERIES_PER_GROUP)
+            ]
+            random.Random(0).shuffle(payloads)
+            results = self._run(payloads, threads, use_lock)
+            overlapping = self._count_overlapping_occurrences(contended_room)
+            self._report(f"contended (1 room, {threads} threads)", results, use_lock)
+            self.stdout.write(
+                f"  expected {options['groups']} accepted, {overlapping} overlapping occurrence(s)")
+            if overlapping:
+                self.stdout.write(self.style.ERROR("  overlapping bookings were accepted"))
+            else:
+                self.stdout.write(self.style.SUCCESS("  no overlapping bookings accepted"))
+
+            rooms = [Room.objects.create(name=f"Benchmark parallel {index}", location=location)
+                     for index in range(threads)]
+            payloads = [
+                self._payload(room, base, slot, 0, recurrence_rule="")
+                for slot in range(options["bookings_per_thread"])
+                for room in rooms
+            ]
+            results = self._run(payloads, threads, use_lock)
+            self._report(f"parallel ({threads} rooms, {threads} threads)", results, use_lock)
+        finally:
+            # bookings, occurrences and outbox entries are deleted with their rooms
+            Room.objects.filter(location=location).delete()
+            location.delete()
+
+    def _payload(self, room, base, group, offset, recurrence_rule=SERIES_RULE):
+        block, slot = divmod(group, SLOTS_PER_BLOCK)
+        weekday, hour = divmod(slot, 8)
+        start = base + timedelta(weeks=block * 8 + offset, days=weekday, hours=8 + hour)
+        return {
+            "room_id": room.id,
+            "visitor_name": "Benchmark",
+            "visitor_email": "benchmark@example.com",
+            "start_datetime": start,
+            "end_datetime": start + timedelta(minutes=45),
+            "recurrence_rule": recurrence_rule,
+        }
+
+    def _run(self, payloads, threads, use_lock):
+        """Creates the bookings with `threads` concurrent writers, returns (accepted, rejected, latencies, elapsed)."""
+        counts = {"accepted": 0, "rejected": 0}
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def write(worker_payloads):
+            barrier.wait()
+            try:
+                for payload in worker_payloads:
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            if use_lock:
+                                lock_rooms([payload["room_id"]])
+                            serializer = BookingListSerializer(data=payload)
+                            serializer.is_valid(raise_exception=True)
+                            serializer.save()
+                        result = "accepted"
+                    except ValidationError:
+                        result = "rejected"
+                    with lock:
+                        counts[result] += 1
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(write, payloads[index::threads]) for index in range(threads)]:
+                future.result()
+        return counts["accepted"], counts["rejected"], latencies, time.perf_counter() - started
+
+    def _count_overlapping_occurrences(self, room):
+        overlapping = BookingOccurrence.objects.filter(
+            room=room,
+            status="CONFIRMED",
+            start_datetime__lt=OuterRef("end_datetime"),
+            end_datetime__gt=OuterRef("start_datetime"),
+        ).exclude(booking_id=OuterRef("booking_id"))
+        return BookingOccurrence.objects.filter(room=room, status="CONFIRMED").filter(Exists(overlapping)).count()
+
+    def _report(self, name, results, use_lock):
+        accepted, rejected, latencies, elapsed = results
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1] if latencies_ms else 0
+        self.stdout.write(
+            f"{name}, {'with' if use_lock else 'without'} room locks: "
+            f"{accepted + rejected} attempts, {accepted} accepted, {rejected} rejected in {elapsed:.2f}s "
+            f"({(accepted + rejected) / elapsed:.1f} writes/s, "
+            f"p50 {statistics.median(latencies_ms) if latencies_ms else 0:.1f} ms, p95 {p95:.1f} ms)")
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.email_rendering import clear_email_caches, warm_email_templates
+from api.email_utils import build_booking_cancelled_email, build_booking_confirmed_email
+
+RULES = [
+    "",
+    "FREQ=DAILY;COUNT=5",
+    "FREQ=WEEKLY;COUNT=10",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE,FR;COUNT=12",
+    "FREQ=MONTHLY;BYMONTHDAY=15;COUNT=6",
+    "FREQ=WEEKLY;BYDAY=TU,TH;UNTIL=20991231T000000Z",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark booking email rendering (HTML templates, humanized recurrence rules and ICS invites), "
+        "with cold caches (every render parses templates and humanizes rules again) and with warm caches. "
+        "No email is sent and the database is not used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=2000, help="Number of emails rendered per run.")
+
+    def handle(self, *args, **options):
+        start = timezone.localtime().replace(minute=0, second=0, microsecond=0) + timedelta(days=7)
+        contexts = [
+            {
+                "booking_id": index,
+                "room_name": f"Room {index % 20}",
+                "location_name": "Building A",
+                "visitor_name": f"Visitor {index}",
+                "start_datetime": start + timedelta(hours=index % 48),
+                "end_datetime": start + timedelta(hours=index % 48, minutes=45),
+                "recurrence_rule": RULES[index % len(RULES)],
+                "manage_url": "https://example.com/find-my-booking",
+                "book_room_url": "https://example.com/book-room",
+            }
+            for index in range(options["renders"])
+        ]
+
+        cold = self._run(contexts, cold=True)
+        warm_email_templates()
+        warm = self._run(contexts, cold=False)
+        self.stdout.write(f"{len(contexts)} emails ({len(RULES)} distinct recurrence rules), "
+                          f"confirmed and cancelled alternating:")
+        self.stdout.write(f"  cold caches: {len(contexts) / cold:.0f} renders/s ({cold * 1000 / len(contexts):.3f} ms/render)")
+        self.stdout.write(f"  warm caches: {len(contexts) / warm:.0f} renders/s ({warm * 1000 / len(contexts):.3f} ms/render)")
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {cold / warm:.1f}x"))
+
+    def _run(self, contexts, cold):
+        """Renders every context, returns the elapsed seconds."""
+        started = time.perf_counter()
+        for index, context in enumerate(contexts):
+            if cold:
+                clear_email_caches()
+            build_email = build_booking_confirmed_email if index % 2 == 0 else build_booking_cancelled_email
+            # builds the HTML body and attachments, serializing the MIME message is not measured
+            build_email(["visitor@example.com"], context=context)
+        return time.perf_counter() - started
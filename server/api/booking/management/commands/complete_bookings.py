@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.booking.completion import DEFAULT_BATCH_SIZE, complete_finished_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark confirmed bookings whose last occurrence has ended as COMPLETED "
+        "(open-ended recurring bookings are never completed). "
+        "Run it regularly from cron (e.g. every 5 minutes), or as a worker with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Maximum number of bookings updated per transaction.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep completing bookings instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=300,
+            help="Seconds to wait between passes (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            completed = complete_finished_bookings(batch_size=options["batch_size"])
+            if completed:
+                self.stdout.write(self.style.SUCCESS(f"Completed {completed} booking(s)."))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.booking.outbox import process_calendar_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply pending Google Calendar changes of bookings (create, update and delete events). "
+        "Run it as a worker with --loop, or regularly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Maximum number of outbox entries applied per pass.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep processing the outbox instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the outbox is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            counts = process_calendar_outbox(batch_size=options["batch_size"])
+            if any(counts.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Calendar outbox: {counts['done']} done, {counts['retried']} retried, "
+                    f"{counts['failed']} failed."))
+            if not options["loop"]:
+                break
+            if counts["done"] + counts["retried"] + counts["failed"] < options["batch_size"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.booking.email_outbox import DEFAULT_WORKERS, process_email_outbox
+from api.email_rendering import warm_email_templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Send pending booking emails (confirmations and cancellations). "
+        "Run it as a worker with --loop, or regularly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Maximum number of emails sent per pass.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=DEFAULT_WORKERS,
+            help="Number of threads sending emails.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep processing the outbox instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when the outbox is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        warm_email_templates()
+        while True:
+            counts = process_email_outbox(
+                batch_size=options["batch_size"], workers=max(1, options["workers"]))
+            if any(counts.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    f"Email outbox: {counts['sent']} sent, {counts['retried']} retried, "
+                    f"{counts['failed']} failed."))
+            if not options["loop"]:
+                break
+            if counts["sent"] + counts["retried"] + counts["failed"] < options["batch_size"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.booking.models import Booking
+from api.booking.occurrences import get_series_end
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-expand recurring bookings into BookingOccurrence rows so open-ended series "
+        "stay materialized up to the occurrence horizon, and store the end of series the horizon "
+        "has reached. Run daily (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-expand every booking, including non-recurring and cancelled ones.",
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if not options["all"]:
+            bookings = bookings.filter(status="CONFIRMED").exclude(recurrence_rule="")
+
+        count = 0
+        for booking in bookings.iterator():
+            with transaction.atomic():
+                booking.sync_occurrences()
+                # series ending after the previous horizon have no series end yet
+                if booking.series_end_datetime is None:
+                    series_end_datetime = get_series_end(booking)
+                    if series_end_datetime is not None:
+                        Booking.objects.filter(pk=booking.pk).update(series_end_datetime=series_end_datetime)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed occurrences of {count} booking(s)."))
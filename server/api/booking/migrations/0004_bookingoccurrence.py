@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:19
+
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from dateutil.rrule import rrulestr
+from django.db import migrations, models
+from django.utils.timezone import localdate, localtime, make_aware
+
+# Open-ended series are materialized up to this many days ahead (as api.booking.occurrences
+# at the time of this migration), refresh_booking_occurrences rolls the horizon forward
+OCCURRENCE_HORIZON_DAYS = 730
+
+
+def iter_booking_occurrences(booking):
+    """
+    Yields (start, end) local datetime tuples for every occurrence of a booking.
+    A frozen copy of api.booking.occurrences.iter_booking_occurrences, so this migration does not
+    change with the application code.
+    """
+    start_datetime = localtime(booking.start_datetime)
+    end_datetime = localtime(booking.end_datetime)
+    if not booking.recurrence_rule:
+        yield start_datetime, end_datetime
+        return
+
+    duration = end_datetime - start_datetime
+    horizon = make_aware(datetime.combine(localdate() + timedelta(days=OCCURRENCE_HORIZON_DAYS), time.max))
+    # dateutil drops microseconds from DTSTART, so expand from the truncated start and add them back
+    dtstart = start_datetime.replace(microsecond=0)
+    offset = start_datetime - dtstart
+    occurrence_starts = rrulestr(booking.recurrence_rule, dtstart=dtstart).between(
+        dtstart, max(horizon, start_datetime), inc=True)
+    for occurrence_start in occurrence_starts:
+        occurrence_start = localtime(occurrence_start) + offset
+        yield occurrence_start, occurrence_start + duration
+
+
+def populate_occurrences(apps, schema_editor):
+    Booking = apps.get_model("booking", "Booking")
+    BookingOccurrence = apps.get_model("booking", "BookingOccurrence")
+    for booking in Booking.objects.iterator():
+        BookingOccurrence.objects.bulk_create(
+            BookingOccurrence(
+                booking_id=booking.id,
+                room_id=booking.room_id,
+                start_datetime=occurrence_start,
+                end_datetime=occurrence_end,
+                status=booking.status,
+            )
+            for occurrence_start, occurrence_end in iter_booking_occurrences(booking)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0003_alter_booking_visitor_email"),
+        ("room", "0003_merged_room_updates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingOccurrence",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("start_datetime", models.DateTimeField()),
+                ("end_datetime", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("CONFIRMED", "CONFIRMED"),
+                            ("CANCELLED", "CANCELLED"),
+                            ("COMPLETED", "COMPLETED"),
+                        ],
+                        default="CONFIRMED",
+                        max_length=9,
+                    ),
+                ),
+                ("booking", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="occurrences", to="booking.booking")),
+                ("room", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="room.room")),
+            ],
+            options={
+                "ordering": ["start_datetime"],
+                "indexes": [models.Index(fields=["room", "status", "end_datetime", "start_datetime"], name="booking_occ_room_range_idx")],
+            },
+        ),
+        migrations.RunPython(populate_occurrences, migrations.RunPython.noop),
+    ]
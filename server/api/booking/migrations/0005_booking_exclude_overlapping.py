@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+from bisect import bisect_left
+from collections import defaultdict
+
+import api.booking.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+
+
+def check_overlapping_bookings(apps, schema_editor):
+    """
+    Refuses to add booking_exclude_overlapping while existing bookings violate it: every booking
+    overlapping an earlier created one of its room is listed, so an admin can cancel it through the
+    normal cancel flow (notifying the visitor and removing the calendar event) before migrating again.
+    """
+    Booking = apps.get_model("booking", "Booking")
+    # kept [start, end) ranges of each room, sorted and disjoint, with their booking IDs
+    kept_starts = defaultdict(list)
+    kept_ends = defaultdict(list)
+    kept_ids = defaultdict(list)
+    overlaps = []
+    bookings = Booking.objects.exclude(status="CANCELLED").order_by("id").values_list(
+        "id", "room_id", "start_datetime", "end_datetime")
+    for booking_id, room_id, start_datetime, end_datetime in bookings.iterator():
+        starts, ends, ids = kept_starts[room_id], kept_ends[room_id], kept_ids[room_id]
+        # the last kept range starting before this booking ends is the only one that can overlap it
+        index = bisect_left(starts, end_datetime)
+        if index and ends[index - 1] > start_datetime:
+            overlaps.append(f"{booking_id} (overlaps {ids[index - 1]})")
+            continue
+        index = bisect_left(starts, start_datetime)
+        starts.insert(index, start_datetime)
+        ends.insert(index, end_datetime)
+        ids.insert(index, booking_id)
+    if overlaps:
+        raise RuntimeError(
+            f"Cancel the {len(overlaps)} booking(s) overlapping an earlier booking of their room before "
+            f"migrating: {', '.join(overlaps)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0004_bookingoccurrence"),
+        ("room", "0003_merged_room_updates"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_overlapping_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="booking",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("status", "CANCELLED"), _negated=True),
+                expressions=[
+                    (
+                        api.booking.models.TsTzRange(
+                            "start_datetime",
+                            "end_datetime",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(),
+                        ),
+                        "&&",
+                    ),
+                    (
+                        api.booking.models.Int4Range(
+                            "room_id", "room_id", models.Value("[]")
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="booking_exclude_overlapping",
+            ),
+        ),
+    ]
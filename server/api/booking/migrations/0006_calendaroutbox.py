@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_booking_exclude_overlapping'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarOutbox',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('CREATE', 'CREATE'), ('UPDATE', 'UPDATE'), ('DELETE', 'DELETE')], max_length=6)),
+                ('event_id', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(
+                    choices=[('PENDING', 'PENDING'), ('DONE', 'DONE'), ('FAILED', 'FAILED')], default='PENDING', max_length=7)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_outbox', to='booking.booking')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='calendar_outbox_pending_idx')],
+            },
+        ),
+    ]
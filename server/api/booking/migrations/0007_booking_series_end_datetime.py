@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+from datetime import datetime, time, timedelta
+
+from dateutil.rrule import rrulestr
+from django.db import migrations, models
+from django.utils.timezone import localdate, localtime, make_aware
+
+# Series are expanded up to this many days ahead (the occurrence horizon of api.booking.occurrences)
+OCCURRENCE_HORIZON_DAYS = 730
+
+
+def get_series_end(booking):
+    """
+    Returns the end of the last occurrence of a booking, or None for open-ended series (no UNTIL/COUNT)
+    and series running after the occurrence horizon.
+    A frozen copy of api.booking.occurrences.get_series_end, so this migration does not change with
+    the application code.
+    """
+    if not booking.recurrence_rule:
+        return booking.end_datetime
+    rule_parts = {part.split("=", 1)[0].upper() for part in booking.recurrence_rule.split(";")}
+    if not rule_parts & {"UNTIL", "COUNT"}:
+        return None
+
+    start_datetime = localtime(booking.start_datetime)
+    # dateutil drops microseconds from DTSTART, so expand from the truncated start and add them back
+    dtstart = start_datetime.replace(microsecond=0)
+    # series running after the occurrence horizon are handled like open-ended ones
+    horizon = max(make_aware(datetime.combine(localdate() + timedelta(days=OCCURRENCE_HORIZON_DAYS), time.max)),
+                  start_datetime)
+    last_start = None
+    for occurrence_start in rrulestr(booking.recurrence_rule, dtstart=dtstart):
+        if occurrence_start > horizon:
+            return None
+        last_start = occurrence_start
+    if last_start is None:
+        return booking.end_datetime
+    return last_start + (start_datetime - dtstart) + (booking.end_datetime - booking.start_datetime)
+
+
+def populate_series_end(apps, schema_editor):
+    Booking = apps.get_model("booking", "Booking")
+    bookings = []
+    for booking in Booking.objects.only("start_datetime", "end_datetime", "recurrence_rule").iterator():
+        booking.series_end_datetime = get_series_end(booking)
+        bookings.append(booking)
+        if len(bookings) == 1000:
+            Booking.objects.bulk_update(bookings, ["series_end_datetime"])
+            bookings = []
+    Booking.objects.bulk_update(bookings, ["series_end_datetime"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_calendaroutbox'),
+        ('room', '0005_room_booking_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='series_end_datetime',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'CONFIRMED')), fields=['series_end_datetime'], name='booking_confirmed_end_idx'),
+        ),
+        migrations.RunPython(populate_series_end, migrations.RunPython.noop),
+    ]
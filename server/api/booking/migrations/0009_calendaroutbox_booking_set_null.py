@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calendaroutbox',
+            name='booking',
+            field=models.ForeignKey(
+                blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='calendar_outbox', to='booking.booking'),
+        ),
+    ]
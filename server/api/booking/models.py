@@ -1,5 +1,22 @@
-from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.fields import DateTimeRangeField, IntegerRangeField, RangeBoundary, RangeOperators
+from django.db import models, transaction
+from django.db.models import F, Func, Q, Value
+from django.utils import timezone
+from django.utils.timezone import localtime
 from api.room.models import Room
+from .occurrences import get_series_end, iter_booking_occurrences, occurrence_cache
+
+
+class TsTzRange(Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
+class Int4Range(Func):
+    function = "INT4RANGE"
+    output_field = IntegerRangeField()
 
 
 class Booking(models.Model):
@@ -10,6 +27,10 @@ class Booking(models.Model):
         "COMPLETED": "COMPLETED"
     }
 
+    # Fields that change the expanded occurrences of a booking
+    OCCURRENCE_FIELDS = {"room", "room_id", "start_datetime",
+                         "end_datetime", "recurrence_rule"}
+
     id = models.AutoField(primary_key=True)
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     visitor_name = models.CharField(max_length=100)
@@ -23,8 +44,209 @@ class Booking(models.Model):
     google_event_id = models.CharField(max_length=100, blank=True)
     # return "" when it is not cancelled
     cancel_reason = models.TextField(blank=True)
+    # end of the last occurrence, null for open-ended series (maintained by save)
+    series_end_datetime = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # finished confirmed bookings, see api/booking/completion.py
+            models.Index(fields=["series_end_datetime"], condition=Q(status="CONFIRMED"),
+                         name="booking_confirmed_end_idx"),
+        ]
+        constraints = [
+            # Reject overlapping non-cancelled bookings of the same room atomically in the database.
+            # [start, end) ranges allow back-to-back bookings. The room is compared as the single-value
+            # range [room_id, room_id] so both columns use the built-in GiST range opclass
+            # (no btree_gist extension needed).
+            ExclusionConstraint(
+                name="booking_exclude_overlapping",
+                expressions=[
+                    (TsTzRange("start_datetime", "end_datetime",
+                               RangeBoundary()), RangeOperators.OVERLAPS),
+                    (Int4Range("room_id", "room_id", Value("[]")),
+                     RangeOperators.OVERLAPS),
+                ],
+                condition=~Q(status="CANCELLED"),
+            ),
+        ]
+
     def __str__(self):
         return f"Room {self.room_id} booked by {self.visitor_name} from {self.start_datetime} to {self.end_datetime}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the loaded series so its cached expansions can be dropped when it changes
+        # (unless the fields are deferred, e.g. when bookings are collected for deletion)
+        deferred_fields = instance.get_deferred_fields()
+        if not deferred_fields & {"recurrence_rule", "start_datetime"}:
+            instance._loaded_series = instance._series_key()
+        if "room_id" not in deferred_fields:
+            instance._loaded_room_id = instance.room_id
+        return instance
+
+    def _series_key(self):
+        if not self.recurrence_rule or self.start_datetime is None:
+            return None
+        # matches the dtstart used by iter_booking_occurrences
+        return (self.recurrence_rule, localtime(self.start_datetime).replace(microsecond=0))
+
+    def save(self, *args, **kwargs):
+        """Save the booking and keep its BookingOccurrence rows up to date."""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or self.OCCURRENCE_FIELDS.intersection(update_fields):
+            self.series_end_datetime = get_series_end(self)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "series_end_datetime"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or self.OCCURRENCE_FIELDS.intersection(update_fields):
+                loaded_series = getattr(self, "_loaded_series", None)
+                if loaded_series and loaded_series != self._series_key():
+                    occurrence_cache.invalidate(*loaded_series)
+                self.sync_occurrences()
+                self._loaded_series = self._series_key()
+            elif "status" in update_fields:
+                self.occurrences.update(status=self.status)
+            bump_booking_versions(
+                {self.room_id, getattr(self, "_loaded_room_id", self.room_id)})
+            self._loaded_room_id = self.room_id
+
+    def sync_occurrences(self):
+        """Re-expand the booking into BookingOccurrence rows."""
+        self.occurrences.all().delete()
+        BookingOccurrence.objects.bulk_create(
+            BookingOccurrence(
+                booking=self,
+                room_id=self.room_id,
+                start_datetime=occurrence_start,
+                end_datetime=occurrence_end,
+                status=self.status,
+            )
+            for occurrence_start, occurrence_end in iter_booking_occurrences(self)
+        )
+
+
+def bump_booking_versions(room_ids):
+    """Increments the booking version of rooms whose bookings were written."""
+    Room.objects.filter(pk__in=room_ids).update(
+        booking_version=F("booking_version") + 1)
+
+
+class BookingOccurrence(models.Model):
+    """
+    A single occurrence of a booking, expanded from its recurrence rule.
+    Non-recurring bookings have exactly one occurrence. Rows are managed by Booking.save.
+    """
+    id = models.AutoField(primary_key=True)
+    booking = models.ForeignKey(
+        Booking, on_delete=models.CASCADE, related_name="occurrences")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE)
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    # mirrors the status of the booking
+    status = models.CharField(
+        max_length=9, choices=Booking.STATUS_CHOICES, default="CONFIRMED")
+
+    class Meta:
+        ordering = ["start_datetime"]
+        indexes = [
+            # range queries: room_id = ? AND status = ? AND end > ? AND start < ?
+            models.Index(fields=["room", "status", "end_datetime", "start_datetime"],
+                         name="booking_occ_room_range_idx"),
+        ]
+
+    def __str__(self):
+        return f"Occurrence of booking {self.booking_id} from {self.start_datetime} to {self.end_datetime}"
+
+
+class CalendarOutbox(models.Model):
+    """
+    A pending Google Calendar change of a booking.
+    Written in the same transaction as the booking and applied by the process_calendar_outbox
+    management command (see outbox.py), so booking requests never wait for Google.
+    """
+    ACTION_CHOICES = {
+        "CREATE": "CREATE",
+        "UPDATE": "UPDATE",
+        "DELETE": "DELETE"
+    }
+    STATUS_CHOICES = {
+        "PENDING": "PENDING",
+        "DONE": "DONE",
+        "FAILED": "FAILED"
+    }
+
+    id = models.AutoField(primary_key=True)
+    # kept when the booking is deleted, so the deletion of its event is still applied
+    booking = models.ForeignKey(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name="calendar_outbox")
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    # event to delete (google_event_id of the booking is cleared when it is cancelled)
+    event_id = models.CharField(max_length=100, blank=True)
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"],
+                         name="calendar_outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.action} calendar event of booking {self.booking_id} ({self.status})"
+
+
+class EmailOutbox(models.Model):
+    """
+    A booking email waiting to be sent.
+    Written in the same transaction as the booking and sent by the process_email_outbox
+    management command (see email_outbox.py), so booking requests never wait for the email provider.
+    """
+    KIND_CHOICES = {
+        "CONFIRMED": "CONFIRMED",
+        "CANCELLED": "CANCELLED"
+    }
+    STATUS_CHOICES = {
+        "PENDING": "PENDING",
+        "SENT": "SENT",
+        "FAILED": "FAILED"
+    }
+
+    id = models.AutoField(primary_key=True)
+    # kept (without booking) if the booking is deleted before the email is sent
+    booking = models.ForeignKey(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name="email_outbox")
+    kind = models.CharField(max_length=9, choices=KIND_CHOICES)
+    recipient = models.EmailField(max_length=100)
+    subject = models.CharField(max_length=200)
+    # template context, as it was when the email was queued
+    context = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # ID of the message at the email provider, once sent
+    message_id = models.CharField(max_length=100, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"],
+                         name="email_outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} email of booking {self.booking_id} to {self.recipient} ({self.status})"
@@ -0,0 +1,159 @@
+"""
+Expansion of bookings into their individual occurrences.
+
+A booking only stores its first occurrence and an optional RFC 5545 recurrence rule.
+Every booking is expanded into BookingOccurrence rows when it is saved (see Booking.save),
+so availability and conflict checks can run indexed range queries instead of loading
+whole booking histories and re-expanding recurrence rules on every request.
+
+Open-ended series (no UNTIL/COUNT) are only materialized up to a rolling horizon
+(settings.BOOKING_OCCURRENCE_HORIZON_DAYS from now, 730 days by default).
+Run `python manage.py refresh_booking_occurrences` regularly (e.g. daily) to roll it forward.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from dateutil.rrule import rruleset, rrulestr
+from django.conf import settings
+from django.utils.timezone import localdate, localtime, make_aware
+
+DEFAULT_OCCURRENCE_HORIZON_DAYS = 730
+DEFAULT_RECURRENCE_CACHE_SIZE = 1024
+
+
+# Helper function to expand recurrence rules
+def expand_recurrences(base_start_datetime, rrule_str, rdate_list=None, exdate_list=None):
+    # Convert DTSTART to local timezone (where the recurrence rule apply)
+    start_local = localtime(base_start_datetime)
+    rrule_set = rruleset()
+    if rrule_str:
+        rrule_set.rrule(rrulestr(rrule_str, dtstart=start_local))
+    if rdate_list:
+        for dt in rdate_list:
+            rrule_set.rdate(dt)
+    if exdate_list:
+        for dt in exdate_list:
+            rrule_set.exdate(dt)
+    return rrule_set
+
+
+class OccurrenceCache:
+    """
+    Bounded, thread-safe LRU cache of expanded recurrence rules.
+
+    Keys are (rule string, dtstart, window start, window end) and values are tuples of local
+    occurrence start datetimes, so hot rules (weekly series, room opening hours) are only parsed
+    and expanded once per window. Expansion is a pure function of the key, so stale entries are
+    never wrong; `invalidate` frees the entries of a series whose booking changed.
+    """
+
+    def __init__(self, maxsize=DEFAULT_RECURRENCE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def expand(self, dtstart, rrule_str, window_start, window_end):
+        """Returns the occurrence starts of the rule within [window_start, window_end] (inclusive)."""
+        key = (rrule_str, dtstart, window_start, window_end)
+        with self._lock:
+            occurrences = self._entries.get(key)
+            if occurrences is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return occurrences
+            self.misses += 1
+
+        occurrences = tuple(
+            localtime(occurrence_start)
+            for occurrence_start in expand_recurrences(dtstart, rrule_str).between(
+                window_start, window_end, inc=True)
+        )
+        with self._lock:
+            self._entries[key] = occurrences
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return occurrences
+
+    def invalidate(self, rrule_str, dtstart):
+        """Drops every cached window of the (rule, dtstart) series."""
+        with self._lock:
+            stale_keys = [key for key in self._entries
+                          if key[0] == rrule_str and key[1] == dtstart]
+            for key in stale_keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Process-wide cache shared by booking materialization and room availability
+occurrence_cache = OccurrenceCache(
+    maxsize=getattr(settings, "RECURRENCE_CACHE_SIZE", DEFAULT_RECURRENCE_CACHE_SIZE))
+
+
+def get_occurrence_horizon():
+    """
+    Latest occurrence start that is materialized for open-ended series.
+    Aligned to the end of a day so the expansion window (and its cache key) is stable within a day.
+    """
+    days = getattr(settings, "BOOKING_OCCURRENCE_HORIZON_DAYS",
+                   DEFAULT_OCCURRENCE_HORIZON_DAYS)
+    return make_aware(datetime.combine(localdate() + timedelta(days=days), time.max))
+
+
+def iter_booking_occurrences(booking, until=None):
+    """
+    Yields (start, end) local datetime tuples for every occurrence of a booking.
+    Occurrences starting after `until` (defaults to the occurrence horizon) are not expanded.
+    """
+    start_datetime = localtime(booking.start_datetime)
+    end_datetime = localtime(booking.end_datetime)
+    if not booking.recurrence_rule:
+        yield start_datetime, end_datetime
+        return
+
+    duration = end_datetime - start_datetime
+    until = until or max(get_occurrence_horizon(), start_datetime)
+    # dateutil drops microseconds from DTSTART, so expand from the truncated start and add them back
+    dtstart = start_datetime.replace(microsecond=0)
+    offset = start_datetime - dtstart
+    occurrence_starts = occurrence_cache.expand(
+        dtstart, booking.recurrence_rule, dtstart, until)
+    for occurrence_start in occurrence_starts:
+        yield occurrence_start + offset, occurrence_start + offset + duration
+
+
+def get_series_end(booking):
+    """
+    Returns the end of the last occurrence of a booking, or None for open-ended series (no UNTIL/COUNT).
+    Series are only expanded up to the occurrence horizon: a series still running after it is handled
+    like an open-ended one (None) until the horizon reaches its end (see refresh_booking_occurrences).
+    """
+    if not booking.recurrence_rule:
+        return booking.end_datetime
+    rule_parts = {part.split("=", 1)[0].upper() for part in booking.recurrence_rule.split(";")}
+    if not rule_parts & {"UNTIL", "COUNT"}:
+        return None
+
+    start_datetime = localtime(booking.start_datetime)
+    dtstart = start_datetime.replace(microsecond=0)
+    horizon = max(get_occurrence_horizon(), start_datetime)
+    last_start = None
+    for occurrence_start in expand_recurrences(dtstart, booking.recurrence_rule):
+        if occurrence_start > horizon:
+            return None
+        last_start = occurrence_start
+    if last_start is None:
+        return booking.end_datetime
+    return last_start + (start_datetime - dtstart) + (booking.end_datetime - booking.start_datetime)
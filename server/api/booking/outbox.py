@@ -0,0 +1,223 @@
+"""
+Transactional outbox for Google Calendar sync.
+
+Booking writes only add a CalendarOutbox row in their own transaction (enqueue_calendar_sync).
+`python manage.py process_calendar_outbox` drains the outbox: entries of a booking are applied in
+order, failures are retried with exponential backoff and given up after
+settings.CALENDAR_OUTBOX_MAX_ATTEMPTS attempts.
+
+CREATE and UPDATE entries both push the current state of the booking (creating the event if the
+booking has none yet, which also stores google_event_id), so replaying an entry is harmless.
+DELETE entries (e.g. of a bulk cancellation) are applied together with batch requests (batch_events).
+
+Google is called outside of any transaction: entries are claimed first (their attempt is counted
+and their next attempt pushed back by CLAIM_SECONDS, so a crashed worker's entries are retried),
+and no booking is locked meanwhile. A created event is only stored if the booking is still
+active without an event, else its deletion is queued.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from .google_calendar.events import batch_events, create_event, delete_event, update_event
+from .models import Booking, CalendarOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+# how long a claimed entry is left to its worker before it is due again
+CLAIM_SECONDS = 5 * 60
+
+
+def build_event_data(booking):
+    return {
+        "summary": f"Booking of {booking.room.name} - {booking.visitor_name}",
+        "description": "Booking confirmed",
+        "start": {
+            "dateTime": booking.start_datetime.isoformat(),
+            "timeZone": "Australia/Perth",
+        },
+        "end": {
+            "dateTime": booking.end_datetime.isoformat(),
+            "timeZone": "Australia/Perth",
+        },
+        "recurrence": [f"RRULE:{booking.recurrence_rule}"] if booking.recurrence_rule else [],
+        # Add for the filtering of events to render in frontend calendar
+        "extendedProperties": {
+            "shared": {
+                "roomId": str(booking.room.id)
+            }
+        }
+    }
+
+
+def enqueue_calendar_sync(booking, action, event_id=""):
+    """Queues a Google Calendar change of the booking, in the current transaction."""
+    return CalendarOutbox.objects.create(booking=booking, action=action, event_id=event_id)
+
+
+def enqueue_calendar_syncs(booking_ids, action, event_ids=None):
+    """
+    Queues the same Google Calendar change of many bookings with one insert.
+    `event_ids` gives the event to delete of each booking (DELETE entries).
+    """
+    event_ids = event_ids or [""] * len(booking_ids)
+    return CalendarOutbox.objects.bulk_create(
+        CalendarOutbox(booking_id=booking_id, action=action, event_id=event_id)
+        for booking_id, event_id in zip(booking_ids, event_ids))
+
+
+def get_retry_delay(attempts):
+    """Exponential backoff: 30s, 1min, 2min... capped at 1 hour."""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _is_already_deleted(error):
+    return isinstance(error, HttpError) and error.resp.status in (404, 410)
+
+
+def _enqueue_event_deletion(booking_id, event_id):
+    """Queues the deletion of an event created for a booking that was cancelled or deleted meanwhile."""
+    with transaction.atomic():
+        # the lock keeps the booking from being deleted before the entry is written
+        booking_exists = Booking.objects.select_for_update().filter(pk=booking_id).exists()
+        CalendarOutbox.objects.create(
+            booking_id=booking_id if booking_exists else None, action="DELETE", event_id=event_id)
+
+
+def _apply(entry):
+    if entry.action == "DELETE":
+        if not entry.event_id:
+            return
+        try:
+            delete_event(entry.event_id)
+        except HttpError as error:
+            if not _is_already_deleted(error):
+                raise
+        return
+
+    booking = Booking.objects.select_related("room").filter(pk=entry.booking_id).first()
+    # the booking was deleted, or the cancellation queued the deletion of the event (if it was created)
+    if booking is None or booking.status == "CANCELLED":
+        return
+    event_data = build_event_data(booking)
+    if booking.google_event_id:
+        update_event(booking.google_event_id, event_data)
+        return
+    event_id = create_event(event_data)["id"]
+    # the booking was read without a lock: only store the event if the booking is still active without
+    # an event, a cancellation committed in the meantime did not see this event
+    stored = Booking.objects.filter(pk=booking.pk, google_event_id="").exclude(
+        status="CANCELLED").update(google_event_id=event_id)
+    if not stored:
+        _enqueue_event_deletion(booking.pk, event_id)
+
+
+def _claim(entries):
+    """Counts the attempt of entries and pushes their next attempt back while they are applied."""
+    now = timezone.now()
+    for entry in entries:
+        entry.attempts += 1
+        entry.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+        entry.updated_at = now
+    CalendarOutbox.objects.bulk_update(entries, ["attempts", "next_attempt_at", "updated_at"])
+
+
+def _save_results(entries):
+    now = timezone.now()
+    for entry in entries:
+        entry.updated_at = now
+    CalendarOutbox.objects.bulk_update(entries, ["status", "next_attempt_at", "last_error", "updated_at"])
+
+
+def _record_result(entry, error, counts, max_attempts):
+    """Marks an applied entry done, or schedules its retry (gives up after max_attempts)."""
+    if error is None:
+        entry.status = "DONE"
+        entry.last_error = ""
+        counts["done"] += 1
+    elif entry.attempts >= max_attempts:
+        entry.last_error = str(error)
+        entry.status = "FAILED"
+        counts["failed"] += 1
+        logger.error(
+            f"Giving up {entry.action} of Google Calendar event of booking {entry.booking_id}: {error}")
+    else:
+        entry.last_error = str(error)
+        entry.next_attempt_at = timezone.now() + get_retry_delay(entry.attempts)
+        counts["retried"] += 1
+        logger.warning(
+            f"Failed to {entry.action.lower()} Google Calendar event of booking {entry.booking_id}, "
+            f"retrying at {entry.next_attempt_at}: {error}")
+
+
+def _process_deletions(entry_ids, counts, max_attempts):
+    """Applies the DELETE entries among `entry_ids` with batch requests, returns the IDs of the entries handled."""
+    with transaction.atomic():
+        # skip entries another worker is processing, and entries waiting for earlier entries of their booking
+        entries = list(CalendarOutbox.objects.select_for_update(skip_locked=True).filter(
+            pk__in=entry_ids, status="PENDING", action="DELETE", next_attempt_at__lte=timezone.now(),
+        ).exclude(Exists(CalendarOutbox.objects.filter(
+            booking_id=OuterRef("booking_id"), status="PENDING", id__lt=OuterRef("id"),
+        ))))
+        _claim(entries)
+
+    deletions = [entry for entry in entries if entry.event_id]
+    results = []
+    if deletions:
+        try:
+            results = batch_events([{"action": "delete", "event_id": entry.event_id} for entry in deletions])
+        except Exception as error:
+            results = [{"ok": False, "error": error}] * len(deletions)
+    errors = {entry.id: None if result["ok"] or _is_already_deleted(result["error"]) else result["error"]
+              for entry, result in zip(deletions, results)}
+
+    for entry in entries:
+        _record_result(entry, errors.get(entry.id), counts, max_attempts)
+    _save_results(entries)
+    return {entry.id for entry in entries}
+
+
+def process_calendar_outbox(batch_size=50):
+    """
+    Applies up to `batch_size` due outbox entries.
+    Returns a dict with the number of entries done, retried (rescheduled) and failed (given up).
+    """
+    max_attempts = getattr(settings, "CALENDAR_OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    counts = {"done": 0, "retried": 0, "failed": 0}
+    entry_ids = list(CalendarOutbox.objects.filter(
+        status="PENDING", next_attempt_at__lte=timezone.now()
+    ).values_list("id", flat=True)[:batch_size])
+    handled_ids = _process_deletions(entry_ids, counts, max_attempts)
+
+    for entry_id in entry_ids:
+        if entry_id in handled_ids:
+            continue
+        with transaction.atomic():
+            # skip entries another worker is processing (or has claimed)
+            entry = CalendarOutbox.objects.select_for_update(skip_locked=True).filter(
+                pk=entry_id, status="PENDING", next_attempt_at__lte=timezone.now()).first()
+            if entry is None:
+                continue
+            # entries of a booking are applied in order, wait for earlier ones (e.g. in backoff)
+            if entry.booking_id is not None and CalendarOutbox.objects.filter(
+                    booking_id=entry.booking_id, status="PENDING", id__lt=entry.id).exists():
+                continue
+            _claim([entry])
+
+        try:
+            _apply(entry)
+        except Exception as error:
+            _record_result(entry, error, counts, max_attempts)
+        else:
+            _record_result(entry, None, counts, max_attempts)
+        _save_results([entry])
+    return counts
@@ -1,8 +1,27 @@
 from rest_framework import serializers
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.utils import timezone
-from .models import Booking
+from datetime import datetime, time, timedelta
+from .models import Booking, BookingOccurrence, bump_booking_versions
+from .conflicts import find_batch_conflicts, find_conflicting_occurrence
+from .locks import get_room_ids
+from .occurrences import get_series_end, iter_booking_occurrences
 from api.room.models import Room
 import re
+from dateutil.rrule import rrulestr
+
+
+# Maximum number of bookings created by one POST /api/bookings/bulk/ request
+MAX_BULK_BOOKINGS = 500
+
+
+def room_already_booked_message(overlapping_occurrence):
+    start = timezone.localtime(overlapping_occurrence.start_datetime)
+    end = timezone.localtime(overlapping_occurrence.end_datetime)
+    return (f'Room is already booked from {start.strftime("%Y-%m-%d %H:%M")} '
+            f'to {end.strftime("%Y-%m-%d %H:%M")} '
+            f'by {overlapping_occurrence.booking.visitor_name}.')
 
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -27,6 +46,9 @@ class RoomShortSerializer(serializers.ModelSerializer):
 
 
 class BookingSerializer(DynamicFieldsModelSerializer):
+    # bulk creation checks the overlaps of the whole batch at once (see BookingBulkCreateSerializer)
+    check_overlap = True
+
     room = RoomShortSerializer(read_only=True)          # for nested output
     room_id = serializers.PrimaryKeyRelatedField(
         queryset=Room.objects.all(),
@@ -83,35 +105,6 @@ class BookingSerializer(DynamicFieldsModelSerializer):
                     ]
                 })
 
-        # Check for overlapping bookings in the same room
-        if room and start_datetime and end_datetime:
-            overlapping_bookings = Booking.objects.filter(
-                room=room,
-                # Exclude cancelled bookings
-                status__in=['CONFIRMED', 'COMPLETED'],
-                start_datetime__lt=end_datetime,  # Existing booking starts before this one ends
-                end_datetime__gt=start_datetime   # Existing booking ends after this one starts
-            )
-
-            # For updates, exclude the current booking being updated
-            if self.instance:
-                overlapping_bookings = overlapping_bookings.exclude(
-                    id=self.instance.id)
-
-            if overlapping_bookings.exists():
-                overlapping_booking = overlapping_bookings.first()
-
-                start = timezone.localtime(overlapping_booking.start_datetime)
-                end = timezone.localtime(overlapping_booking.end_datetime)
-
-                raise serializers.ValidationError({
-                    'non_field_errors': [
-                        f'Room is already booked from {start.strftime("%Y-%m-%d %H:%M")} '
-                        f'to {end.strftime("%Y-%m-%d %H:%M")} '
-                        f'by {overlapping_booking.visitor_name}.'
-                    ]
-                })
-
         # Validate recurrence_rule (Google Calendar RFC 5545 format)
         if recurrence_rule:
             # Basic RFC 5545 RRULE validation: must start with FREQ= and contain valid frequency
@@ -121,6 +114,15 @@ class BookingSerializer(DynamicFieldsModelSerializer):
                     'recurrence_rule': 'Recurrence rule must start with FREQ= and use a valid frequency (DAILY, WEEKLY, MONTHLY, YEARLY).'
                 })
 
+            # The rule is expanded into occurrences when the booking is saved, so it must be parsable
+            try:
+                rrulestr(recurrence_rule, dtstart=timezone.localtime(
+                    start_datetime) if start_datetime else None)
+            except ValueError as error:
+                raise serializers.ValidationError({
+                    'recurrence_rule': f'Recurrence rule is invalid. Error: {error}'
+                })
+
             until_match = re.search(r'UNTIL=(\d{8}T\d{6}Z)', recurrence_rule)
             if until_match:
                 until_str = until_match.group(1)
@@ -138,8 +140,62 @@ class BookingSerializer(DynamicFieldsModelSerializer):
                         'recurrence_rule': 'UNTIL date in recurrence rule must be greater than the booking end datetime.'
                     })
 
+        # Check for overlapping bookings in the same room, over every occurrence of a recurring booking
+        # (occurrences of existing recurring bookings are materialized as BookingOccurrence rows)
+        if self.check_overlap and room and start_datetime and end_datetime:
+            overlapping_occurrence = find_conflicting_occurrence(
+                room, start_datetime, end_datetime, recurrence_rule,
+                # For updates, exclude the current booking being updated
+                exclude_booking_id=self.instance.id if self.instance else None)
+            if overlapping_occurrence:
+                raise self._room_already_booked_error(overlapping_occurrence)
+
         return data
 
+    def _room_already_booked_error(self, overlapping_occurrence):
+        return serializers.ValidationError({
+            'non_field_errors': [room_already_booked_message(overlapping_occurrence)]
+        })
+
+    def _handle_overlap_integrity_error(self, error, booking):
+        """
+        Turn a violation of the booking_exclude_overlapping constraint (a concurrent write that
+        passed validate() at the same time) into the same error as the overlap check in validate().
+        """
+        diag = getattr(error.__cause__, 'diag', None)
+        if getattr(diag, 'constraint_name', None) != 'booking_exclude_overlapping':
+            raise error
+
+        overlapping_occurrences = BookingOccurrence.objects.filter(
+            room_id=booking.room_id,
+            status__in=['CONFIRMED', 'COMPLETED'],
+            start_datetime__lt=booking.end_datetime,
+            end_datetime__gt=booking.start_datetime
+        ).select_related('booking')
+        if booking.pk:
+            overlapping_occurrences = overlapping_occurrences.exclude(
+                booking_id=booking.pk)
+        overlapping_occurrence = overlapping_occurrences.first()
+        if overlapping_occurrence:
+            raise self._room_already_booked_error(
+                overlapping_occurrence) from error
+        raise serializers.ValidationError({
+            'non_field_errors': ['Room is already booked for the requested time.']
+        }) from error
+
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except IntegrityError as error:
+            self._handle_overlap_integrity_error(
+                error, Booking(**validated_data))
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except IntegrityError as error:
+            self._handle_overlap_integrity_error(error, instance)
+
     def save(self, **kwargs):
         """Override save to handle status logic after validation."""
         cancel_reason = self.validated_data.get('cancel_reason')
@@ -161,3 +217,215 @@ class BookingListSerializer(BookingSerializer):
         fields = ('id', 'room', 'room_id', 'visitor_name', 'visitor_email', 'start_datetime', 'end_datetime',
                   'recurrence_rule', 'status', 'google_event_id', 'created_at')
         read_only_fields = ['google_event_id', 'status']
+
+
+# Columns of the read-only fast path of BookingListSerializer (see booking_list_data)
+BOOKING_LIST_VALUES = ('id', 'room_id', 'room__name', 'visitor_name', 'visitor_email', 'start_datetime',
+                       'end_datetime', 'recurrence_rule', 'status', 'google_event_id', 'created_at')
+
+
+def booking_list_data(rows):
+    """
+    Read-only fast path of BookingListSerializer for list responses: builds the same dicts from
+    `queryset.values(*BOOKING_LIST_VALUES)` rows (loaded with one query joining the room), without
+    instantiating serializers and fields for every booking.
+    """
+    # same datetime formatting as the serializer (current timezone, ISO 8601)
+    format_datetime = serializers.DateTimeField().to_representation
+    return [
+        {
+            'id': row['id'],
+            'room': {'id': row['room_id'], 'name': row['room__name']},
+            'visitor_name': row['visitor_name'],
+            'visitor_email': row['visitor_email'],
+            'start_datetime': format_datetime(row['start_datetime']),
+            'end_datetime': format_datetime(row['end_datetime']),
+            'recurrence_rule': row['recurrence_rule'],
+            'status': row['status'],
+            'google_event_id': row['google_event_id'],
+            'created_at': format_datetime(row['created_at']),
+        }
+        for row in rows
+    ]
+
+
+class BulkRoomField(serializers.PrimaryKeyRelatedField):
+    """Looks rooms up in the rooms of the batch, loaded with one query by BookingBulkCreateSerializer."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            room = self.root.rooms.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if room is None:
+            self.fail('does_not_exist', pk_value=data)
+        return room
+
+
+class BookingBulkItemSerializer(BookingListSerializer):
+    check_overlap = False
+
+    room_id = BulkRoomField(
+        queryset=Room.objects.all(),
+        source='room',
+        write_only=True
+    )
+
+    def to_internal_value(self, data):
+        # a single booking with a cancel_reason is created CANCELLED (see BookingSerializer.save),
+        # bulk bookings are always created CONFIRMED, so the reason is rejected rather than ignored
+        cancel_reason = data.get('cancel_reason') if isinstance(data, dict) else None
+        if cancel_reason is not None and str(cancel_reason).strip():
+            raise serializers.ValidationError({
+                'cancel_reason': ['Bookings created in bulk cannot be cancelled.']
+            })
+        return super().to_internal_value(data)
+
+
+class BookingBulkCreateSerializer(serializers.Serializer):
+    """
+    Creates many bookings at once (e.g. a term's worth of classes).
+    Overlaps between the bookings of the batch and with existing bookings are checked with a single
+    query (find_batch_conflicts), and bookings and their occurrences are inserted with bulk_create.
+    """
+    bookings = BookingBulkItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_BULK_BOOKINGS)
+
+    def to_internal_value(self, data):
+        # rooms of the batch, looked up by BulkRoomField
+        room_ids = set()
+        items = data.get('bookings') if isinstance(data, dict) else None
+        if isinstance(items, list) and len(items) <= MAX_BULK_BOOKINGS:
+            room_ids = get_room_ids(items)
+        self.rooms = Room.objects.select_related('location').in_bulk(room_ids)
+        return super().to_internal_value(data)
+
+    def validate_bookings(self, items):
+        bookings = [Booking(**item) for item in items]
+        self._occurrences = [list(iter_booking_occurrences(booking)) for booking in bookings]
+        conflicts = find_batch_conflicts(bookings, self._occurrences)
+        if conflicts:
+            # errors by index of the booking in the batch, like the field errors of the bookings
+            errors = {}
+            for index, conflict in sorted(conflicts.items()):
+                if isinstance(conflict, int):
+                    message = f'Overlaps booking {conflict} of the batch.'
+                else:
+                    message = room_already_booked_message(conflict)
+                errors[index] = {'non_field_errors': [message]}
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        """Inserts the bookings and their occurrences, returns the created bookings."""
+        bookings = [Booking(**item) for item in validated_data['bookings']]
+        for booking in bookings:
+            booking.series_end_datetime = get_series_end(booking)
+        with transaction.atomic():
+            try:
+                # savepoint, so a concurrent overlap only rolls back the inserts
+                with transaction.atomic():
+                    Booking.objects.bulk_create(bookings)
+            except IntegrityError as error:
+                diag = getattr(error.__cause__, 'diag', None)
+                if getattr(diag, 'constraint_name', None) != 'booking_exclude_overlapping':
+                    raise
+                raise serializers.ValidationError({
+                    'non_field_errors': ['Room is already booked for the requested time.']
+                }) from error
+
+            BookingOccurrence.objects.bulk_create(
+                BookingOccurrence(
+                    booking=booking,
+                    room_id=booking.room_id,
+                    start_datetime=occurrence_start,
+                    end_datetime=occurrence_end,
+                    status=booking.status,
+                )
+                for booking, booking_occurrences in zip(bookings, self._occurrences)
+                for occurrence_start, occurrence_end in booking_occurrences
+            )
+            bump_booking_versions({booking.room_id for booking in bookings})
+        return bookings
+
+
+class BookingBulkCancelSerializer(serializers.Serializer):
+    """
+    Cancels the confirmed upcoming bookings of rooms (or of every room of locations) lying entirely within
+    a date range, with set-based updates instead of one partial_update per booking.
+    Recurring bookings with occurrences outside the range (before it, after it, or open-ended) are not
+    cancelled (that would cancel those occurrences too), their IDs are returned so they can be handled
+    one by one.
+    """
+    room_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    location_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    # local dates, both included
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    cancel_reason = serializers.CharField()
+
+    def validate(self, data):
+        if not data['room_ids'] and not data['location_ids']:
+            raise serializers.ValidationError({
+                'non_field_errors': ['room_ids or location_ids is required.']
+            })
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({
+                'end_date': 'end_date must be on or after start_date.'
+            })
+        return data
+
+    def _get_range(self):
+        range_start = timezone.make_aware(datetime.combine(self.validated_data['start_date'], time.min))
+        range_end = timezone.make_aware(datetime.combine(self.validated_data['end_date'] + timedelta(days=1), time.min))
+        # past bookings are left as they are
+        return max(range_start, timezone.now()), range_end
+
+    def _room_filter(self):
+        # works for both bookings and occurrences
+        room_filter = Q()
+        if self.validated_data['room_ids']:
+            room_filter |= Q(room_id__in=self.validated_data['room_ids'])
+        if self.validated_data['location_ids']:
+            room_filter |= Q(room__location_id__in=self.validated_data['location_ids'])
+        return room_filter
+
+    def create(self, validated_data):
+        """
+        Cancels the matching bookings, returns (cancelled, skipped_recurring_ids): the cancelled bookings as
+        dicts of the fields needed for calendar deletions and emails, and the recurring bookings not cancelled.
+        """
+        range_start, range_end = self._get_range()
+        with transaction.atomic():
+            cancelled = list(Booking.objects.select_for_update(of=('self',)).filter(
+                self._room_filter(),
+                Q(recurrence_rule='') | Q(series_end_datetime__lte=range_end),
+                status='CONFIRMED',
+                start_datetime__gte=range_start,
+                start_datetime__lt=range_end,
+            ).order_by('id').values(
+                'id', 'room_id', 'room__name', 'visitor_email', 'start_datetime',
+                'end_datetime', 'recurrence_rule', 'google_event_id'))
+            booking_ids = [booking['id'] for booking in cancelled]
+
+            if booking_ids:
+                Booking.objects.filter(pk__in=booking_ids).update(
+                    status='CANCELLED',
+                    cancel_reason=validated_data['cancel_reason'],
+                    google_event_id='',
+                    updated_at=timezone.now(),
+                )
+                BookingOccurrence.objects.filter(booking_id__in=booking_ids).update(status='CANCELLED')
+                bump_booking_versions({booking['room_id'] for booking in cancelled})
+
+            # occurrences of the cancelled bookings are no longer confirmed
+            skipped_recurring_ids = sorted(set(BookingOccurrence.objects.filter(
+                self._room_filter(),
+                ~Q(booking__recurrence_rule=''),
+                status='CONFIRMED',
+                start_datetime__lt=range_end,
+                end_datetime__gt=range_start,
+            ).values_list('booking_id', flat=True)))
+        return cancelled, skipped_recurring_ids
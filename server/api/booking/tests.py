@@ -1,16 +1,36 @@
-from datetime import timedelta
+from datetime import timedelta, timezone as dt_timezone
 import csv
+import email
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import StringIO
 import os
-from .models import Booking
+import threading
+from .models import Booking, BookingOccurrence, CalendarOutbox, EmailOutbox
 from api.room.models import Room, Location, Amenity
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.utils import timezone
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 from unittest.mock import patch
 from types import SimpleNamespace
-from api.booking.views import BookingViewSet
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.errors import HttpError
+import httplib2
+from api.booking.google_calendar.events import batch_events
+from api.booking.google_calendar.client import get_calendar_service, reset_calendar_service
+from api.booking.locks import ROOM_BOOKING_LOCK_NAMESPACE, get_room_ids, lock_rooms
+from api.booking.email_outbox import enqueue_email, enqueue_emails, process_email_outbox
+from api.booking.outbox import build_event_data, enqueue_calendar_sync, enqueue_calendar_syncs, process_calendar_outbox
+from api.booking.serializers import BookingListSerializer, BookingSerializer
+from api.booking.occurrences import OccurrenceCache, occurrence_cache
+from api.booking.conflicts import ExpandedSeries, PeriodicSeries
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.db import IntegrityError, connection, transaction
+from rest_framework.exceptions import ValidationError
 
 User = get_user_model()
 future_date = timezone.now() + timedelta(days=7)
@@ -75,7 +95,7 @@ class BookingViewTest(APITestCase):
 
     # ==================== CREATE TESTS (POST /api/bookings/) ====================
 
-    @patch('api.booking.views.create_event')
+    @patch('api.booking.outbox.create_event')
     def test_booking_creation_with_google_calendar(self, mock_create_event):
         """Test successful booking creation with Google Calendar integration."""
         # Mock Google Calendar API response
@@ -99,17 +119,24 @@ class BookingViewTest(APITestCase):
         data = response.json()
         self.assertEqual(data["visitor_name"], payload["visitor_name"])
         self.assertEqual(data["visitor_email"], payload["visitor_email"])
-        self.assertEqual(data["google_event_id"], "mocked-google-event-id")
         self.assertEqual(data["status"], "CONFIRMED")  # Default status
 
-        # Verify Google Calendar API was called
+        # The event is created by the outbox worker, not during the request
+        self.assertEqual(data["google_event_id"], "")
+        mock_create_event.assert_not_called()
+        entry = CalendarOutbox.objects.get(booking_id=data["id"])
+        self.assertEqual((entry.action, entry.status), ("CREATE", "PENDING"))
+
+        self.assertEqual(process_calendar_outbox(), {"done": 1, "retried": 0, "failed": 0})
         mock_create_event.assert_called_once()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "DONE")
 
         # Verify booking was created in database
         booking = Booking.objects.get(id=data["id"])
         self.assertEqual(booking.google_event_id, "mocked-google-event-id")
 
-    @patch('api.booking.views.create_event')
+    @patch('api.booking.outbox.create_event')
     def test_booking_creation_handles_google_calendar_failure(self, mock_create_event):
         """Test booking creation when Google Calendar API fails."""
         # Mock Google Calendar API to raise an exception
@@ -128,10 +155,19 @@ class BookingViewTest(APITestCase):
         response = self.client.post(
             url, payload, format='json', HTTP_X_REQUESTED_WITH=custom_header)
 
-        # Should return error when Google Calendar fails
-        self.assertEqual(response.status_code,
-                         status.HTTP_500_INTERNAL_SERVER_ERROR)
-        self.assertIn("Google Calendar", response.json()["detail"])
+        # The booking does not depend on Google Calendar being reachable
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # The worker schedules a retry with backoff
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 1, "failed": 0})
+        entry = CalendarOutbox.objects.get(booking_id=response.json()["id"])
+        self.assertEqual(entry.status, "PENDING")
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn("Google Calendar API error", entry.last_error)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        # not due yet
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 0, "failed": 0})
+        self.assertEqual(mock_create_event.call_count, 1)
 
     def test_booking_creation_fails_with_invalid_datetime(self):
         """Test booking creation fails when end_datetime is before start_datetime."""
@@ -172,6 +208,18 @@ class BookingViewTest(APITestCase):
         self.assertIn(self.booking.id, booking_ids)
         self.assertIn(self.second_booking.id, booking_ids)
 
+    def test_booking_listing_matches_booking_list_serializer(self):
+        """Test the list fast path returns the same JSON as BookingListSerializer."""
+        self.client.force_authenticate(user=self.admin_user)
+        self.second_booking.recurrence_rule = "FREQ=WEEKLY;COUNT=2"
+        self.second_booking.save()
+        response = self.client.get('/api/bookings/?ordering=start_datetime', HTTP_X_REQUESTED_WITH=custom_header)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = BookingListSerializer(
+            Booking.objects.select_related("room").order_by("start_datetime"), many=True).data
+        self.assertEqual(response.json()["results"], json.loads(json.dumps(expected)))
+
     def test_booking_listing_with_visitor_email_query_param(self):
         """Test listing bookings with visitor_email query parameter (no auth required)."""
         url = f'/api/bookings/?visitor_email={self.booking.visitor_email}'
@@ -589,9 +637,9 @@ class BookingViewTest(APITestCase):
             visitor_name='John Smith',
             visitor_email='johnsmith@example.com',
             start_datetime=future_date.replace(
-                hour=15, minute=0, second=0, microsecond=0),
-            end_datetime=future_date.replace(
                 hour=16, minute=0, second=0, microsecond=0),
+            end_datetime=future_date.replace(
+                hour=17, minute=0, second=0, microsecond=0),
             recurrence_rule="",
             status='CONFIRMED',
             google_event_id='test-john-smith'
@@ -622,9 +670,9 @@ class BookingViewTest(APITestCase):
                 visitor_name=f'Bulk User {i}',
                 visitor_email=f'bulk{i}@example.com',
                 start_datetime=future_date.replace(
-                    hour=10, minute=0, second=0, microsecond=0) + timedelta(days=i),
+                    hour=10, minute=0, second=0, microsecond=0) + timedelta(days=i + 1),
                 end_datetime=future_date.replace(
-                    hour=11, minute=0, second=0, microsecond=0) + timedelta(days=i),
+                    hour=11, minute=0, second=0, microsecond=0) + timedelta(days=i + 1),
                 recurrence_rule="",
                 status='CONFIRMED',
                 google_event_id=f'test-bulk-{i}'
@@ -681,7 +729,7 @@ class BookingViewTest(APITestCase):
 
     # ==================== UPDATE TESTS (PATCH /api/bookings/{id}/) ====================
 
-    @patch('api.booking.views.update_event')
+    @patch('api.booking.outbox.update_event')
     def test_booking_update_with_google_calendar(self, mock_update_event):
         """Test successful booking update with Google Calendar sync."""
         payload = {
@@ -700,8 +748,11 @@ class BookingViewTest(APITestCase):
         self.assertEqual(data["id"], self.booking.id)
         self.assertEqual(data["status"], "CONFIRMED")
 
-        # Verify Google Calendar API was called
+        # Verify Google Calendar API was called by the outbox worker
+        mock_update_event.assert_not_called()
+        process_calendar_outbox()
         mock_update_event.assert_called_once()
+        self.assertEqual(mock_update_event.call_args.args[0], self.booking.google_event_id)
 
         # Verify booking was updated in database
         updated_booking = Booking.objects.get(id=self.booking.id)
@@ -739,8 +790,8 @@ class BookingViewTest(APITestCase):
 
     # ==================== CANCELLATION TESTS (PATCH with cancel_reason) ====================
 
-    @patch('api.booking.views.delete_event')
-    def test_booking_cancellation_with_google_calendar(self, mock_delete_event):
+    @patch('api.booking.outbox.batch_events')
+    def test_booking_cancellation_with_google_calendar(self, mock_batch_events):
         """Test successful booking cancellation with Google Calendar deletion."""
         payload = {
             "visitor_email": self.booking.visitor_email,
@@ -757,8 +808,11 @@ class BookingViewTest(APITestCase):
         self.assertEqual(data["status"], "CANCELLED")
         self.assertEqual(data["cancel_reason"], payload["cancel_reason"])
 
-        # Verify Google Calendar API was called to delete event
-        mock_delete_event.assert_called_once_with(self.booking.google_event_id)
+        # Verify Google Calendar API was called by the outbox worker to delete event
+        mock_batch_events.return_value = [{"ok": True, "event": None, "error": None}]
+        process_calendar_outbox()
+        mock_batch_events.assert_called_once_with(
+            [{"action": "delete", "event_id": self.booking.google_event_id}])
 
         # Verify booking was cancelled in database
         cancelled_booking = Booking.objects.get(id=self.booking.id)
@@ -805,11 +859,8 @@ class BookingViewTest(APITestCase):
 
     # ==================== PAGINATION TESTS ====================
 
-    @patch('api.booking.views.create_event')
-    def test_booking_listing_pagination(self, mock_create_event):
+    def test_booking_listing_pagination(self):
         """Test that booking listing supports pagination."""
-        mock_create_event.return_value = {"id": "test-event-id"}
-
         # Create multiple bookings
         for i in range(15):
             start_dt = future_date.replace(
@@ -873,11 +924,996 @@ class BookingViewTest(APITestCase):
             recurrence_rule="FREQ=DAILY;COUNT=5"
         )
 
-        booking_viewset = BookingViewSet()
-        event_data = booking_viewset._build_event_data(mock_booking)
+        event_data = build_event_data(mock_booking)
 
         self.assertEqual(
             event_data["summary"], f"Booking of {self.room.name} - Alice Johnson")
         self.assertIn("description", event_data)
         self.assertEqual(event_data["extendedProperties"]["shared"].get(
             "roomId"), str(self.room.id))
+
+
+class CalendarOutboxTest(TestCase):
+
+    def setUp(self):
+        location = Location.objects.create(name="Building A")
+        room = Room.objects.create(
+            name="Room A",
+            location=location,
+            start_datetime=future_date.replace(hour=9, minute=0, second=0, microsecond=0),
+            end_datetime=future_date.replace(hour=18, minute=0, second=0, microsecond=0),
+        )
+        self.booking = Booking.objects.create(
+            room=room,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=future_date.replace(hour=10, minute=0, second=0, microsecond=0),
+            end_datetime=future_date.replace(hour=11, minute=0, second=0, microsecond=0),
+        )
+
+    @patch('api.booking.outbox.update_event')
+    @patch('api.booking.outbox.create_event')
+    def test_entries_of_a_booking_are_applied_in_order(self, mock_create_event, mock_update_event):
+        mock_create_event.side_effect = [Exception("unavailable"), {"id": "event-1"}]
+        create = enqueue_calendar_sync(self.booking, "CREATE")
+        update = enqueue_calendar_sync(self.booking, "UPDATE")
+
+        # the update waits for the create in backoff
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 1, "failed": 0})
+        mock_update_event.assert_not_called()
+
+        CalendarOutbox.objects.filter(pk=create.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_calendar_outbox(), {"done": 2, "retried": 0, "failed": 0})
+        mock_update_event.assert_called_once()
+        self.assertEqual(mock_update_event.call_args.args[0], "event-1")
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.google_event_id, "event-1")
+        update.refresh_from_db()
+        self.assertEqual(update.status, "DONE")
+
+    @patch('api.booking.outbox.create_event')
+    def test_event_of_booking_cancelled_meanwhile_is_deleted(self, mock_create_event):
+        def create_event(event_data):
+            # the booking is not locked while Google is called
+            Booking.objects.filter(pk=self.booking.pk).update(status="CANCELLED")
+            return {"id": "event-1"}
+        mock_create_event.side_effect = create_event
+        create = enqueue_calendar_sync(self.booking, "CREATE")
+
+        self.assertEqual(process_calendar_outbox(), {"done": 1, "retried": 0, "failed": 0})
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.google_event_id, "")
+        deletion = CalendarOutbox.objects.exclude(pk=create.pk).get()
+        self.assertEqual((deletion.booking_id, deletion.action, deletion.event_id), (self.booking.id, "DELETE", "event-1"))
+
+    @patch('api.booking.outbox.create_event')
+    def test_event_of_booking_deleted_meanwhile_is_deleted(self, mock_create_event):
+        def create_event(event_data):
+            self.booking.delete()
+            return {"id": "event-1"}
+        mock_create_event.side_effect = create_event
+        enqueue_calendar_sync(self.booking, "CREATE")
+
+        self.assertEqual(process_calendar_outbox(), {"done": 1, "retried": 0, "failed": 0})
+        deletion = CalendarOutbox.objects.get(action="DELETE")
+        self.assertEqual((deletion.booking_id, deletion.event_id), (None, "event-1"))
+
+    @patch('api.booking.outbox.create_event')
+    def test_claimed_entry_is_not_applied_twice(self, mock_create_event):
+        mock_create_event.return_value = {"id": "event-1"}
+        entry = enqueue_calendar_sync(self.booking, "CREATE")
+        # claimed by a worker still waiting for Google
+        CalendarOutbox.objects.filter(pk=entry.pk).update(
+            attempts=1, next_attempt_at=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 0, "failed": 0})
+        mock_create_event.assert_not_called()
+
+    @patch('api.booking.outbox.batch_events')
+    def test_deletions_are_applied_in_one_batch(self, mock_batch_events):
+        other = Booking.objects.create(
+            room=self.booking.room,
+            visitor_name='Jane Doe',
+            visitor_email='jane@example.com',
+            start_datetime=self.booking.end_datetime,
+            end_datetime=self.booking.end_datetime + timedelta(hours=1),
+        )
+        not_found = HttpError(httplib2.Response({"status": 404}), b"")
+        mock_batch_events.return_value = [
+            {"ok": True, "event": None, "error": None},
+            {"ok": False, "event": None, "error": not_found},
+        ]
+        enqueue_calendar_syncs([self.booking.id, other.id], "DELETE", event_ids=["event-1", "event-2"])
+
+        # already deleted events are done
+        self.assertEqual(process_calendar_outbox(), {"done": 2, "retried": 0, "failed": 0})
+        mock_batch_events.assert_called_once_with([
+            {"action": "delete", "event_id": "event-1"},
+            {"action": "delete", "event_id": "event-2"},
+        ])
+
+    @override_settings(CALENDAR_OUTBOX_MAX_ATTEMPTS=2)
+    @patch('api.booking.outbox.batch_events')
+    def test_entry_is_given_up_after_max_attempts(self, mock_batch_events):
+        mock_batch_events.side_effect = Exception("unavailable")
+        entry = enqueue_calendar_sync(self.booking, "DELETE", event_id="event-1")
+
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 1, "failed": 0})
+        CalendarOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 0, "failed": 1})
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("FAILED", 2))
+        self.assertEqual(process_calendar_outbox(), {"done": 0, "retried": 0, "failed": 0})
+
+
+EMAIL_SETTINGS = {
+    "EMAIL_BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+    "ANYMAIL": {"RESEND_API_KEY": "test-key"},
+    "DEFAULT_FROM_EMAIL": "test@example.com",
+}
+
+
+@override_settings(**EMAIL_SETTINGS)
+class EmailOutboxTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        location = Location.objects.create(name="Building A")
+        self.room = Room.objects.create(
+            name="Room A",
+            location=location,
+            start_datetime=future_date.replace(hour=9, minute=0, second=0, microsecond=0),
+            end_datetime=future_date.replace(hour=18, minute=0, second=0, microsecond=0),
+        )
+        self.booking = Booking.objects.create(
+            room=self.room,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=future_date.replace(hour=10, minute=0, second=0, microsecond=0),
+            end_datetime=future_date.replace(hour=11, minute=0, second=0, microsecond=0),
+            recurrence_rule="FREQ=WEEKLY;COUNT=2",
+        )
+        self.context = {
+            "booking_id": self.booking.id,
+            "room_name": self.room.name,
+            "start_datetime": self.booking.start_datetime,
+            "end_datetime": self.booking.end_datetime,
+            "recurrence_rule": self.booking.recurrence_rule,
+            "visitor_name": self.booking.visitor_name,
+            "location_name": "Building A",
+        }
+
+    def test_booking_creation_queues_confirmation_email(self):
+        payload = {
+            "room_id": self.room.id,
+            "visitor_name": "Alice Johnson",
+            "visitor_email": "alice@example.com",
+            "start_datetime": self.booking.start_datetime + timedelta(hours=2),
+            "end_datetime": self.booking.end_datetime + timedelta(hours=2),
+        }
+        response = self.client.post('/api/bookings/', payload, format='json', HTTP_X_REQUESTED_WITH=custom_header)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        entry = EmailOutbox.objects.get(booking_id=response.json()["id"])
+        self.assertEqual((entry.kind, entry.recipient, entry.status), ("CONFIRMED", "alice@example.com", "PENDING"))
+
+    def test_queued_emails_are_sent_by_the_worker(self):
+        confirmed = enqueue_email("CONFIRMED", "john@example.com", "Booking confirmation", self.context,
+                                  booking_id=self.booking.id)
+        cancelled = enqueue_emails([{
+            "kind": "CANCELLED",
+            "recipient": f"visitor{index}@example.com",
+            "subject": "Booking cancellation",
+            "context": self.context,
+            "booking_id": self.booking.id,
+        } for index in range(3)])
+
+        self.assertEqual(process_email_outbox(workers=2), {"sent": 4, "retried": 0, "failed": 0})
+        self.assertEqual(len(mail.outbox), 4)
+        message = next(message for message in mail.outbox if message.to == ["john@example.com"])
+        filename, content, _ = message.attachments[0]
+        self.assertEqual(filename, "booking.ics")
+        self.assertIn("RRULE:FREQ=WEEKLY;COUNT=2", content)
+        self.assertIn(self.booking.start_datetime.astimezone(dt_timezone.utc).strftime("DTSTART:%Y%m%dT%H%M%SZ"), content)
+        for entry in [confirmed, *cancelled]:
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts), ("SENT", 1))
+            self.assertIsNotNone(entry.sent_at)
+        self.assertEqual(process_email_outbox(), {"sent": 0, "retried": 0, "failed": 0})
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    @patch('django.core.mail.backends.locmem.EmailBackend.send_messages')
+    def test_failed_email_is_retried_then_given_up(self, mock_send_messages):
+        mock_send_messages.side_effect = Exception("unavailable")
+        entry = enqueue_email("CANCELLED", "john@example.com", "Booking cancellation", self.context)
+
+        self.assertEqual(process_email_outbox(), {"sent": 0, "retried": 1, "failed": 0})
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.last_error), ("PENDING", "unavailable"))
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+
+        EmailOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_email_outbox(), {"sent": 0, "retried": 0, "failed": 1})
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("FAILED", 2))
+
+    @override_settings(ANYMAIL={"RESEND_API_KEY": ""})
+    def test_nothing_is_queued_without_email_configuration(self):
+        self.assertIsNone(enqueue_email("CANCELLED", "john@example.com", "Booking cancellation", self.context))
+        self.assertEqual(enqueue_emails([{"kind": "CANCELLED", "recipient": "john@example.com",
+                                          "subject": "Booking cancellation", "context": self.context}]), [])
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+class GoogleCalendarClientTest(SimpleTestCase):
+
+    def setUp(self):
+        reset_calendar_service()
+        self.addCleanup(reset_calendar_service)
+
+    @patch.dict(os.environ, {"GOOGLE_CREDENTIALS_FILE": "/tmp/service-account.json"})
+    @patch('api.booking.google_calendar.client.service_account.Credentials.from_service_account_file')
+    def test_service_is_built_once_per_thread(self, mock_from_file):
+        mock_from_file.return_value = AnonymousCredentials()
+
+        service = get_calendar_service()
+        self.assertIs(get_calendar_service(), service)
+        mock_from_file.assert_called_once()
+
+        # httplib2 connections are not shared between threads, credentials are
+        services = []
+        thread = threading.Thread(target=lambda: services.append(get_calendar_service()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(services[0], service)
+        mock_from_file.assert_called_once()
+
+    @patch.dict(os.environ, {"GOOGLE_CREDENTIALS_FILE": ""})
+    def test_missing_credentials_file(self):
+        with self.assertRaises(ValueError):
+            get_calendar_service()
+
+
+class FakeCalendarBatchHandler(BaseHTTPRequestHandler):
+    """Answers Calendar batch requests: events are created, updated and deleted unless their ID is "missing"."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        self.server.batches.append(self.path)
+        boundary = "fake-batch-boundary"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, path, _ = request_line.strip().split(" ")
+            payload = rest.replace("\r\n", "\n").partition("\n\n")[2]
+            event_id = path.split("?")[0].rstrip("/").split("/")[-1]
+            if event_id == "missing":
+                response = 'HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n\r\n{"error": {"code": 404}}'
+            elif method == "DELETE":
+                # the CRLF before the next boundary belongs to the boundary
+                response = "HTTP/1.1 204 No Content\r\n\r\n\r\n"
+            else:
+                event = json.loads(payload)
+                event["id"] = f"created-{len(self.server.created)}" if method == "POST" else event_id
+                if method == "POST":
+                    self.server.created.append(event["id"])
+                response = f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(event)}"
+            content_id = part["Content-ID"].strip("<>")
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n{response}\r\n")
+        content = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class GoogleCalendarBatchTest(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCalendarBatchHandler)
+        self.server.batches = []
+        self.server.created = []
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        environ = patch.dict(os.environ, {
+            "GOOGLE_CREDENTIALS_FILE": "/tmp/service-account.json",
+            "GOOGLE_CALENDAR_ID": "calendar-id",
+            "GOOGLE_CALENDAR_API_ENDPOINT": f"http://127.0.0.1:{self.server.server_port}/calendar/v3/",
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+        credentials = patch('api.booking.google_calendar.client.service_account.Credentials.from_service_account_file',
+                            return_value=AnonymousCredentials())
+        credentials.start()
+        self.addCleanup(credentials.stop)
+        reset_calendar_service()
+        self.addCleanup(reset_calendar_service)
+
+    def test_results_are_returned_per_operation_in_order(self):
+        event_data = {"summary": "Booking"}
+        results = batch_events([
+            {"action": "create", "event_data": event_data},
+            {"action": "update", "event_id": "event-1", "event_data": event_data},
+            {"action": "delete", "event_id": "missing"},
+            {"action": "delete", "event_id": "event-2"},
+        ])
+
+        self.assertEqual(self.server.batches, ["/batch/calendar/v3"])
+        self.assertEqual([result["ok"] for result in results], [True, True, False, True])
+        self.assertEqual(results[0]["event"]["id"], "created-0")
+        self.assertEqual(results[1]["event"]["id"], "event-1")
+        self.assertEqual(results[2]["error"].resp.status, 404)
+        self.assertIsNone(results[3]["event"])
+
+    def test_operations_are_split_into_batches_of_50(self):
+        results = batch_events([{"action": "delete", "event_id": f"event-{i}"} for i in range(120)])
+        self.assertEqual(len(self.server.batches), 3)
+        self.assertTrue(all(result["ok"] for result in results))
+
+    def test_unknown_action_is_rejected(self):
+        with self.assertRaises(ValueError):
+            batch_events([{"action": "move", "event_id": "event-1"}])
+        self.assertEqual(self.server.batches, [])
+
+
+class BookingOccurrenceTest(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Building B")
+        self.room = Room.objects.create(
+            name="Meeting Room B",
+            location=self.location,
+            capacity=8,
+            is_active=True
+        )
+        self.start = future_date.replace(
+            hour=9, minute=0, second=0, microsecond=0)
+        self.series = Booking.objects.create(
+            room=self.room,
+            visitor_name='Weekly Standup',
+            visitor_email='standup@example.com',
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(hours=1),
+            recurrence_rule="FREQ=WEEKLY;COUNT=4",
+            status='CONFIRMED',
+            google_event_id='test-series-id'
+        )
+
+    def test_recurring_booking_is_expanded_on_save(self):
+        occurrences = list(self.series.occurrences.all())
+        self.assertEqual(len(occurrences), 4)
+        self.assertEqual(occurrences[0].start_datetime, self.start)
+        self.assertEqual(occurrences[3].start_datetime,
+                         self.start + timedelta(weeks=3))
+        self.assertTrue(all(o.room_id == self.room.id for o in occurrences))
+
+    def test_non_recurring_booking_has_single_occurrence(self):
+        booking = Booking.objects.create(
+            room=self.room,
+            visitor_name='One Off',
+            visitor_email='oneoff@example.com',
+            start_datetime=self.start + timedelta(hours=2),
+            end_datetime=self.start + timedelta(hours=3),
+        )
+        self.assertEqual(booking.occurrences.count(), 1)
+
+    def test_occurrences_follow_updates_and_cancellation(self):
+        self.series.recurrence_rule = "FREQ=WEEKLY;COUNT=2"
+        self.series.save()
+        self.assertEqual(self.series.occurrences.count(), 2)
+
+        self.series.status = 'CANCELLED'
+        self.series.save(update_fields=['status'])
+        self.assertFalse(self.series.occurrences.exclude(
+            status='CANCELLED').exists())
+
+    def test_booking_conflicting_with_later_occurrence_is_rejected(self):
+        payload = {
+            "room_id": self.room.id,
+            "visitor_name": "Late Comer",
+            "visitor_email": "late@example.com",
+            # third occurrence of the weekly series
+            "start_datetime": self.start + timedelta(weeks=2, minutes=30),
+            "end_datetime": self.start + timedelta(weeks=2, hours=2),
+            "recurrence_rule": ""
+        }
+        response = self.client.post(
+            '/api/bookings/', payload, format='json', HTTP_X_REQUESTED_WITH=custom_header)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Room is already booked",
+                      response.json()["non_field_errors"][0])
+
+    def test_room_with_bookings_can_be_deleted(self):
+        # bookings are collected with deferred fields
+        self.room.delete()
+        self.assertFalse(Booking.objects.filter(pk=self.series.pk).exists())
+        self.assertFalse(BookingOccurrence.objects.filter(booking_id=self.series.pk).exists())
+
+    def test_booking_writes_bump_room_booking_version(self):
+        self.room.refresh_from_db()
+        version = self.room.booking_version
+        other_room = Room.objects.create(name="Meeting Room C", location=self.location)
+
+        self.series.visitor_name = 'Daily Standup'
+        self.series.save(update_fields=['visitor_name'])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.booking_version, version + 1)
+
+        # moving a booking bumps both rooms
+        self.series.room = other_room
+        self.series.save()
+        self.room.refresh_from_db()
+        other_room.refresh_from_db()
+        self.assertEqual(self.room.booking_version, version + 2)
+        self.assertEqual(other_room.booking_version, 1)
+
+    def test_booking_list_etag(self):
+        user = User.objects.create_superuser("etag", "etag@test.com", "pass")
+        self.client.force_authenticate(user=user)
+        url = f'/api/bookings/?room_ids={self.room.id}'
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # other filters change the ETag
+        response = self.client.get(url + '&visitor_name=Weekly', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.series.status = 'CANCELLED'
+        self.series.save(update_fields=['status'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["status"], 'CANCELLED')
+
+    def test_recurring_booking_conflicting_with_existing_series_is_rejected(self):
+        payload = {
+            "room_id": self.room.id,
+            "visitor_name": "Daily Sync",
+            "visitor_email": "sync@example.com",
+            # first occurrence is free, the 7th overlaps the second occurrence of the weekly series
+            "start_datetime": self.start + timedelta(days=1, minutes=30),
+            "end_datetime": self.start + timedelta(days=1, hours=1, minutes=30),
+            "recurrence_rule": "FREQ=DAILY;COUNT=10"
+        }
+        serializer = BookingSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        second = timezone.localtime(self.start + timedelta(weeks=1))
+        self.assertIn(f"from {second.strftime('%Y-%m-%d %H:%M')}",
+                      serializer.errors["non_field_errors"][0])
+
+        # the series only has 4 occurrences, a daily series starting after it is free
+        serializer = BookingSerializer(data={
+            **payload,
+            "start_datetime": self.start + timedelta(weeks=3, days=1),
+            "end_datetime": self.start + timedelta(weeks=3, days=1, hours=1),
+            "recurrence_rule": "FREQ=DAILY",
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class BookingBulkCreateTest(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Building B")
+        self.room = Room.objects.create(name="Meeting Room B", location=self.location)
+        self.other_room = Room.objects.create(name="Meeting Room C", location=self.location)
+        self.start = future_date.replace(hour=9, minute=0, second=0, microsecond=0)
+        self.series = Booking.objects.create(
+            room=self.room,
+            visitor_name='Weekly Standup',
+            visitor_email='standup@example.com',
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(hours=1),
+            recurrence_rule="FREQ=WEEKLY;COUNT=4",
+        )
+        self.user = User.objects.create_superuser("bulk", "bulk@test.com", "pass")
+        self.client.force_authenticate(user=self.user)
+
+    def _item(self, room, start, hours=1, recurrence_rule=""):
+        return {
+            "room_id": room.id,
+            "visitor_name": "Class",
+            "visitor_email": "class@example.com",
+            "start_datetime": start,
+            "end_datetime": start + timedelta(hours=hours),
+            "recurrence_rule": recurrence_rule,
+        }
+
+    def _post(self, items):
+        return self.client.post('/api/bookings/bulk/', {"bookings": items}, format='json',
+                                HTTP_X_REQUESTED_WITH=custom_header)
+
+    def test_bookings_are_created_with_occurrences_and_calendar_sync(self):
+        self.room.refresh_from_db()
+        version = self.room.booking_version
+        response = self._post([
+            self._item(self.room, self.start + timedelta(hours=2), recurrence_rule="FREQ=WEEKLY;COUNT=10"),
+            self._item(self.room, self.start + timedelta(hours=4)),
+            self._item(self.other_room, self.start),
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ids = [booking["id"] for booking in response.json()]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(response.json()[2]["room"]["id"], self.other_room.id)
+        self.assertEqual(Booking.objects.get(pk=ids[0]).occurrences.count(), 10)
+        self.assertEqual(Booking.objects.get(pk=ids[1]).occurrences.count(), 1)
+        self.assertEqual(CalendarOutbox.objects.filter(booking_id__in=ids, action="CREATE").count(), 3)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.booking_version, version + 1)
+
+    def test_overlaps_in_the_batch_and_with_existing_bookings_are_rejected(self):
+        response = self._post([
+            self._item(self.room, self.start + timedelta(days=1)),
+            # overlaps the third occurrence of the weekly series
+            self._item(self.room, self.start + timedelta(weeks=2, minutes=30)),
+            # overlaps the first booking of the batch
+            self._item(self.room, self.start + timedelta(days=1, minutes=30)),
+            self._item(self.other_room, self.start + timedelta(days=1)),
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()["bookings"]
+        self.assertEqual(list(errors), ["1", "2"])
+        self.assertIn("Room is already booked", errors["1"]["non_field_errors"][0])
+        self.assertIn("by Weekly Standup", errors["1"]["non_field_errors"][0])
+        self.assertEqual(errors["2"], {"non_field_errors": ["Overlaps booking 0 of the batch."]})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_invalid_room_is_reported_per_booking(self):
+        item = self._item(self.room, self.start + timedelta(days=1))
+        response = self._post([item, {**item, "room_id": 0}])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.json()["bookings"]), ["1"])
+        self.assertIn("room_id", response.json()["bookings"]["1"])
+
+    def test_cancel_reason_is_rejected(self):
+        item = self._item(self.room, self.start + timedelta(days=1))
+        response = self._post([{**item, "cancel_reason": ""}, {**item, "cancel_reason": "Not needed"}])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["bookings"],
+                         {"1": {"cancel_reason": ["Bookings created in bulk cannot be cancelled."]}})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_bulk_creation_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self._post([self._item(self.room, self.start + timedelta(days=1))])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BookingBulkCancelTest(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Building B")
+        self.other_location = Location.objects.create(name="Building C")
+        self.room = Room.objects.create(name="Meeting Room B", location=self.location)
+        self.other_room = Room.objects.create(name="Meeting Room C", location=self.location)
+        self.far_room = Room.objects.create(name="Meeting Room D", location=self.other_location)
+        self.start = future_date.replace(hour=1, minute=0, second=0, microsecond=0)
+        self.first_date = timezone.localtime(self.start).date() + timedelta(days=1)
+
+        # second occurrence is within the range
+        self.series = self._booking(self.room, self.start - timedelta(days=6, hours=-2), recurrence_rule="FREQ=WEEKLY;COUNT=4")
+        self.with_event = self._booking(self.room, self.start + timedelta(days=1), google_event_id="event-1")
+        self.without_event = self._booking(self.room, self.start + timedelta(days=2))
+        self.later = self._booking(self.room, self.start + timedelta(days=10))
+        self.other_room_booking = self._booking(self.other_room, self.start + timedelta(days=1))
+        self.far_booking = self._booking(self.far_room, self.start + timedelta(days=1))
+
+        self.user = User.objects.create_superuser("cancel", "cancel@test.com", "pass")
+        self.client.force_authenticate(user=self.user)
+
+    def _booking(self, room, start, **kwargs):
+        return Booking.objects.create(
+            room=room,
+            visitor_name='Visitor',
+            visitor_email='visitor@example.com',
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            **kwargs
+        )
+
+    def _post(self, payload):
+        return self.client.post('/api/bookings/bulk-cancel/', {
+            "start_date": self.first_date,
+            "end_date": self.first_date + timedelta(days=2),
+            "cancel_reason": "Maintenance",
+            **payload,
+        }, format='json', HTTP_X_REQUESTED_WITH=custom_header)
+
+    def test_bookings_of_rooms_are_cancelled(self):
+        self.room.refresh_from_db()
+        version = self.room.booking_version
+        response = self._post({"room_ids": [self.room.id]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            "cancelled": 2,
+            "room_ids": [self.room.id],
+            "calendar_deletions": 1,
+            "recurring_booking_ids_not_cancelled": [self.series.id],
+        })
+        for booking in [self.with_event, self.without_event]:
+            booking.refresh_from_db()
+            self.assertEqual((booking.status, booking.cancel_reason, booking.google_event_id),
+                             ("CANCELLED", "Maintenance", ""))
+            self.assertFalse(booking.occurrences.exclude(status="CANCELLED").exists())
+        self.assertEqual(
+            list(CalendarOutbox.objects.values_list("booking_id", "action", "event_id")),
+            [(self.with_event.id, "DELETE", "event-1")])
+        self.assertEqual(Booking.objects.filter(status="CONFIRMED").count(), 4)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.booking_version, version + 1)
+
+    def test_recurring_bookings_are_only_cancelled_within_the_range(self):
+        # starts within the range, later occurrences are after it
+        weekly = self._booking(self.other_room, self.start + timedelta(days=1, hours=3), recurrence_rule="FREQ=WEEKLY;COUNT=10")
+        daily = self._booking(self.other_room, self.start + timedelta(days=1, hours=5), recurrence_rule="FREQ=DAILY;COUNT=2")
+        response = self._post({"room_ids": [self.other_room.id]})
+
+        self.assertEqual(response.json()["cancelled"], 2)
+        self.assertEqual(response.json()["recurring_booking_ids_not_cancelled"], [weekly.id])
+        weekly.refresh_from_db()
+        self.assertEqual(weekly.status, "CONFIRMED")
+        self.assertEqual(weekly.occurrences.filter(status="CONFIRMED").count(), 10)
+        daily.refresh_from_db()
+        self.assertEqual(daily.status, "CANCELLED")
+
+    def test_bookings_of_locations_are_cancelled(self):
+        response = self._post({"location_ids": [self.location.id]})
+
+        self.assertEqual(response.json()["cancelled"], 3)
+        self.assertEqual(response.json()["room_ids"], [self.room.id, self.other_room.id])
+        self.far_booking.refresh_from_db()
+        self.assertEqual(self.far_booking.status, "CONFIRMED")
+
+    def test_rooms_or_locations_are_required(self):
+        response = self._post({})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("room_ids or location_ids", response.json()["non_field_errors"][0])
+
+    def test_bulk_cancellation_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self._post({"room_ids": [self.room.id]})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class IdempotencyKeyTest(APITestCase):
+
+    def setUp(self):
+        # reset the rate limit counters, stored in the same cache
+        cache.clear()
+        location = Location.objects.create(name="Building B")
+        self.room = Room.objects.create(name="Meeting Room B", location=location)
+        self.start = future_date.replace(hour=1, minute=0, second=0, microsecond=0)
+        self.payload = {
+            "room_id": self.room.id,
+            "visitor_name": "Alice Johnson",
+            "visitor_email": "alice@example.com",
+            "start_datetime": self.start,
+            "end_datetime": self.start + timedelta(hours=1),
+            "recurrence_rule": ""
+        }
+
+    def _post(self, payload, key):
+        return self.client.post('/api/bookings/', payload, format='json',
+                                HTTP_X_REQUESTED_WITH=custom_header, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_creation_returns_the_first_response(self):
+        first = self._post(self.payload, "key-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with patch('api.booking.views.BookingViewSet.get_serializer') as mock_get_serializer:
+            replay = self._post(self.payload, "key-1")
+        mock_get_serializer.assert_not_called()
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(CalendarOutbox.objects.count(), 1)
+
+        # a new key is a new request, rejected as the room is now booked
+        response = self._post(self.payload, "key-2")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Room is already booked", response.json()["non_field_errors"][0])
+
+    def test_validation_errors_are_replayed(self):
+        payload = {**self.payload, "end_datetime": self.start - timedelta(hours=1)}
+        self.assertEqual(self._post(payload, "key-1").status_code, status.HTTP_400_BAD_REQUEST)
+        replay = self._post(payload, "key-1")
+        self.assertEqual(replay.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertIn("end_datetime", replay.json())
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self._post(self.payload, "key-1")
+        response = self._post({**self.payload, "visitor_name": "Bob"}, "key-1")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_retried_update_returns_the_first_response(self):
+        booking = Booking.objects.create(room=self.room, **{
+            key: value for key, value in self.payload.items() if key != "room_id"})
+        payload = {
+            "visitor_email": booking.visitor_email,
+            "start_datetime": self.start + timedelta(hours=2),
+            "end_datetime": self.start + timedelta(hours=3),
+        }
+        url = f'/api/bookings/{booking.id}/'
+        first = self.client.patch(url, payload, format='json',
+                                  HTTP_X_REQUESTED_WITH=custom_header, HTTP_IDEMPOTENCY_KEY="key-1")
+        replay = self.client.patch(url, payload, format='json',
+                                   HTTP_X_REQUESTED_WITH=custom_header, HTTP_IDEMPOTENCY_KEY="key-1")
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(CalendarOutbox.objects.filter(action="UPDATE").count(), 1)
+
+
+class RoomLockTest(TestCase):
+
+    def _try_lock_from_another_connection(self, room_id):
+        results = []
+
+        def try_lock():
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", [ROOM_BOOKING_LOCK_NAMESPACE, room_id])
+                    results.append(cursor.fetchone()[0])
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return results[0]
+
+    def test_lock_is_held_per_room_until_the_transaction_ends(self):
+        with transaction.atomic():
+            lock_rooms([2, 1])
+            self.assertFalse(self._try_lock_from_another_connection(1))
+            self.assertFalse(self._try_lock_from_another_connection(2))
+            self.assertTrue(self._try_lock_from_another_connection(3))
+
+    def test_room_ids_of_request_data(self):
+        self.assertEqual(get_room_ids([{"room_id": "3"}, {"room_id": 4}, {"room_id": "x"}, {}, "text", {"room_id": 0}]), {3, 4})
+
+
+class BookingCompletionTest(TestCase):
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Building C")
+        self.room = Room.objects.create(name="Meeting Room C", location=self.location)
+        self.past = (timezone.now() - timedelta(days=30)).replace(minute=0, second=0, microsecond=0)
+
+    def _create(self, start, recurrence_rule="", status="CONFIRMED"):
+        return Booking.objects.create(
+            room=self.room,
+            visitor_name="Visitor",
+            visitor_email="visitor@example.com",
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            recurrence_rule=recurrence_rule,
+            status=status,
+        )
+
+    def test_series_end_is_the_end_of_the_last_occurrence(self):
+        booking = self._create(self.past)
+        series = self._create(self.past + timedelta(hours=2), "FREQ=WEEKLY;COUNT=4")
+        open_ended = self._create(self.past + timedelta(hours=4), "FREQ=DAILY")
+        self.assertEqual(booking.series_end_datetime, self.past + timedelta(hours=1))
+        self.assertEqual(series.series_end_datetime, self.past + timedelta(weeks=3, hours=3))
+        self.assertIsNone(open_ended.series_end_datetime)
+
+        series.recurrence_rule = "FREQ=WEEKLY;COUNT=2"
+        series.save(update_fields=["recurrence_rule"])
+        series.refresh_from_db()
+        self.assertEqual(series.series_end_datetime, self.past + timedelta(weeks=1, hours=3))
+
+    @override_settings(BOOKING_OCCURRENCE_HORIZON_DAYS=60)
+    def test_series_end_is_only_expanded_up_to_the_horizon(self):
+        # would take seconds to expand completely
+        series = self._create(self.past, "FREQ=DAILY;COUNT=100000000")
+        self.assertIsNone(series.series_end_datetime)
+        long_series = self._create(self.past + timedelta(hours=2), "FREQ=WEEKLY;COUNT=20")
+        self.assertIsNone(long_series.series_end_datetime)
+
+        # the horizon reached the end of the series
+        with override_settings(BOOKING_OCCURRENCE_HORIZON_DAYS=730):
+            call_command("refresh_booking_occurrences", stdout=StringIO())
+        long_series.refresh_from_db()
+        self.assertEqual(long_series.series_end_datetime, self.past + timedelta(weeks=19, hours=3))
+
+    def test_finished_bookings_are_completed_in_batches(self):
+        finished = [self._create(self.past + timedelta(hours=hour)) for hour in range(3)]
+        finished_series = self._create(self.past + timedelta(hours=4), "FREQ=DAILY;COUNT=3")
+        running_series = self._create(self.past + timedelta(hours=6), "FREQ=WEEKLY;COUNT=8")
+        open_ended = self._create(self.past + timedelta(hours=8), "FREQ=WEEKLY")
+        cancelled = self._create(self.past + timedelta(hours=10), status="CANCELLED")
+        upcoming = self._create(future_date)
+        version = Room.objects.get(pk=self.room.pk).booking_version
+
+        out = StringIO()
+        call_command("complete_bookings", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Completed 4 booking(s).", out.getvalue())
+        for booking in [*finished, finished_series]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, "COMPLETED")
+            self.assertFalse(booking.occurrences.exclude(status="COMPLETED").exists())
+        for booking, expected in [(running_series, "CONFIRMED"), (open_ended, "CONFIRMED"),
+                                  (cancelled, "CANCELLED"), (upcoming, "CONFIRMED")]:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, expected)
+            self.assertFalse(booking.occurrences.exclude(status=expected).exists())
+        self.assertGreater(Room.objects.get(pk=self.room.pk).booking_version, version)
+
+        out = StringIO()
+        call_command("complete_bookings", stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+
+class RecurrenceConflictTest(SimpleTestCase):
+
+    RULES = [
+        "FREQ=DAILY",
+        "FREQ=DAILY;INTERVAL=3",
+        "FREQ=DAILY;COUNT=5",
+        "FREQ=DAILY;BYDAY=MO,WE,FR",
+        "FREQ=WEEKLY",
+        "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,SA",
+        "FREQ=WEEKLY;INTERVAL=3;BYDAY=MO;WKST=SU",
+        "FREQ=WEEKLY;BYDAY=TH;COUNT=3",
+        f"FREQ=WEEKLY;BYDAY=MO,TH;UNTIL={(future_date + timedelta(days=40)).strftime('%Y%m%dT%H%M%SZ')}",
+    ]
+
+    def test_period_arithmetic_matches_expansion(self):
+        start = timezone.localtime(future_date).replace(hour=9, minute=0, second=0, microsecond=0)
+        end = start + timedelta(hours=1, minutes=30)
+        until = start + timedelta(days=120)
+        windows = [
+            (start + timedelta(hours=hours), start + timedelta(hours=hours, minutes=45))
+            for hours in range(-24, 24 * 100, 7)
+        ]
+        for rule in self.RULES:
+            with self.subTest(rule=rule):
+                periodic = PeriodicSeries.from_rule(start, end, rule, until)
+                self.assertIsNotNone(periodic)
+                expanded = ExpandedSeries(start, end, rule, until)
+                for window_start, window_end in windows:
+                    self.assertEqual(periodic.overlaps(window_start, window_end),
+                                     expanded.overlaps(window_start, window_end),
+                                     (window_start, window_end))
+
+    def test_unsupported_rules_fall_back_to_expansion(self):
+        start = timezone.localtime(future_date)
+        for rule in ["FREQ=MONTHLY", "FREQ=WEEKLY;BYDAY=1MO", "FREQ=DAILY;BYHOUR=9", "FREQ=WEEKLY;BYDAY=MO,TU;COUNT=4"]:
+            self.assertIsNone(PeriodicSeries.from_rule(start, start + timedelta(hours=1), rule, start + timedelta(days=30)))
+
+
+class BookingOverlapConstraintTest(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Building C")
+        self.room = Room.objects.create(
+            name="Meeting Room C",
+            location=self.location,
+            capacity=4,
+            is_active=True
+        )
+        self.start = future_date.replace(
+            hour=13, minute=0, second=0, microsecond=0)
+
+    def _create_booking(self, start, end, **kwargs):
+        return Booking.objects.create(
+            room=self.room,
+            visitor_name=kwargs.pop('visitor_name', 'Alice'),
+            visitor_email='alice@example.com',
+            start_datetime=start,
+            end_datetime=end,
+            **kwargs
+        )
+
+    def test_database_rejects_overlapping_bookings(self):
+        self._create_booking(self.start, self.start + timedelta(hours=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._create_booking(self.start + timedelta(minutes=30),
+                                 self.start + timedelta(hours=2))
+
+    def test_database_allows_back_to_back_and_cancelled_bookings(self):
+        self._create_booking(self.start, self.start + timedelta(hours=1))
+        self._create_booking(self.start + timedelta(hours=1),
+                             self.start + timedelta(hours=2))
+        self._create_booking(self.start, self.start + timedelta(hours=1),
+                             status='CANCELLED')
+        self.assertEqual(Booking.objects.filter(room=self.room).count(), 3)
+
+    def test_concurrent_overlap_is_reported_as_validation_error(self):
+        serializer = BookingListSerializer(data={
+            "room_id": self.room.id,
+            "visitor_name": "Bob",
+            "visitor_email": "bob@example.com",
+            "start_datetime": self.start,
+            "end_datetime": self.start + timedelta(hours=1),
+            "recurrence_rule": ""
+        })
+        self.assertTrue(serializer.is_valid())
+
+        # Another request books the same slot after validation has passed
+        self._create_booking(self.start, self.start + timedelta(hours=1),
+                             visitor_name='Carol')
+
+        with self.assertRaises(ValidationError) as context:
+            serializer.save()
+        self.assertIn("by Carol",
+                      str(context.exception.detail["non_field_errors"][0]))
+
+
+class OccurrenceCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = OccurrenceCache(maxsize=2)
+        self.dtstart = timezone.make_aware(timezone.datetime(2030, 1, 7, 9, 0))
+        self.window = (self.dtstart, self.dtstart + timedelta(days=28))
+
+    def test_expansion_is_cached(self):
+        first = self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        second = self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        self.assertEqual(len(first), 5)
+        self.assertIs(first, second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        self.cache.expand(self.dtstart, "FREQ=DAILY", *self.window)
+        # touch the weekly rule so the daily one becomes least recently used
+        self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        self.cache.expand(self.dtstart, "FREQ=MONTHLY", *self.window)
+
+        self.assertEqual(len(self.cache), 2)
+        self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        self.assertEqual(self.cache.hits, 2)
+        self.cache.expand(self.dtstart, "FREQ=DAILY", *self.window)
+        self.assertEqual(self.cache.misses, 4)
+
+    def test_invalidate_drops_every_window_of_a_series(self):
+        self.cache.expand(self.dtstart, "FREQ=WEEKLY", *self.window)
+        self.cache.expand(self.dtstart, "FREQ=WEEKLY",
+                          self.window[0], self.window[1] + timedelta(days=7))
+        self.cache.invalidate("FREQ=WEEKLY", self.dtstart)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_changed_booking_invalidates_its_previous_series(self):
+        location = Location.objects.create(name="Building D")
+        room = Room.objects.create(name="Room D", location=location)
+        booking = Booking.objects.create(
+            room=room,
+            visitor_name='Series',
+            visitor_email='series@example.com',
+            start_datetime=future_date,
+            end_datetime=future_date + timedelta(hours=1),
+            recurrence_rule="FREQ=WEEKLY;COUNT=3"
+        )
+        booking = Booking.objects.get(id=booking.id)
+        with patch.object(occurrence_cache, 'invalidate') as mock_invalidate:
+            booking.recurrence_rule = "FREQ=WEEKLY;COUNT=2"
+            booking.save()
+        mock_invalidate.assert_called_once_with(
+            "FREQ=WEEKLY;COUNT=3", timezone.localtime(future_date).replace(microsecond=0))
+        self.assertEqual(booking.occurrences.count(), 2)
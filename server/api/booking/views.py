@@ -1,7 +1,9 @@
 import os
 from rest_framework import permissions
 from .models import Booking
-from .serializers import BookingSerializer, BookingListSerializer
+from api.room.models import Room
+from .serializers import (BOOKING_LIST_VALUES, BookingBulkCancelSerializer, BookingBulkCreateSerializer, BookingSerializer,
+                          BookingListSerializer, booking_list_data)
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
@@ -9,10 +11,12 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 import django_filters
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from .google_calendar.events import create_event, update_event, delete_event
-from googleapiclient.errors import HttpError
+from .outbox import enqueue_calendar_sync, enqueue_calendar_syncs
+from .locks import get_room_ids, lock_rooms
 from django.db import transaction
-from ..email_utils import send_booking_confirmed_email, send_booking_cancelled_email
+from .email_outbox import enqueue_email, enqueue_emails
+from ..etag_utils import etag_matches, make_etag, not_modified_response
+from ..idempotency_utils import idempotent
 import logging
 import csv
 from django.http import HttpResponse
@@ -23,6 +27,21 @@ logger = logging.getLogger(__name__)
 
 frontend_url = os.getenv("FRONTEND_URL", "")
 
+
+def get_confirmed_email_context(booking):
+    """Template context of the booking confirmed email."""
+    return {
+        "booking_id": booking.id,
+        "room_name": booking.room.name,
+        "start_datetime": booking.start_datetime,
+        "end_datetime": booking.end_datetime,
+        "recurrence_rule": booking.recurrence_rule,
+        "visitor_name": booking.visitor_name,
+        "location_name": booking.room.location.name,
+        "manage_url": frontend_url + "/find-my-booking"
+    }
+
+
 # For admin to filter booking in /api/bookings
 
 
@@ -75,6 +94,10 @@ class BookingViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         # GET /api/bookings/, GET /api/bookings/download/ and GET /bookings/{id}/ (when no visitor_email provided, admin only)
+        # POST /api/bookings/bulk/ and POST /api/bookings/bulk-cancel/ (admin only)
+        if self.action in ("bulk", "bulk_cancel"):
+            return [permissions.IsAuthenticated()]
+
         if self.action == "retrieve" or self.action == "list" or self.action == "download":
             visitor_email = self.request.query_params.get("visitor_email")
             if not visitor_email:
@@ -96,6 +119,37 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """List bookings, answering conditional requests filtered by room_ids with 304 when unchanged."""
+        etag = self._get_list_etag(request)
+        if etag and etag_matches(request, etag):
+            return not_modified_response(etag)
+        # read-only fast path: same JSON as BookingListSerializer, built from .values() rows
+        queryset = self.filter_queryset(self.get_queryset()).values(*BOOKING_LIST_VALUES)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(booking_list_data(page))
+        else:
+            response = Response(booking_list_data(queryset))
+        if etag:
+            response["ETag"] = etag
+        return response
+
+    def _get_list_etag(self, request):
+        """
+        Returns an ETag for GET /api/bookings/?room_ids=... based on the booking versions of the rooms,
+        or None when the list is not limited to rooms (or room_ids is invalid).
+        """
+        try:
+            room_ids = {int(room_id) for room_id in request.query_params.get("room_ids", "").split(",") if room_id}
+        except ValueError:
+            return None
+        if not room_ids:
+            return None
+        room_versions = list(Room.objects.filter(pk__in=room_ids).order_by("id").values_list(
+            "id", "booking_version", "updated_at"))
+        return make_etag(room_versions, request.user.pk, sorted(request.query_params.lists()))
+
     def _check_custom_header(self, request):
         # Require X-Requested-With header for all requests
         if request.headers.get("X-Requested-With") != os.getenv("BLOOM_CLIENT_HEADER", "Bloom"):
@@ -103,76 +157,43 @@ class BookingViewSet(viewsets.ModelViewSet):
         return None
 
     # custom create logic to integrate Google calendar api
+    # retries with the same Idempotency-Key header get the first response (see idempotency_utils.py)
+    @idempotent
     @method_decorator(ratelimit(key='ip', rate='5/m', block=True))
     def create(self, request, *args, **kwargs):
-        """Create booking with Google Calendar integration and transaction rollback."""
+        """Create booking, its Google Calendar event is created by the outbox worker."""
         header_error = self._check_custom_header(request)
         if header_error:
             return header_error
 
         try:
-            # Step 1: Validate booking data
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-
-            # Step 2 & 3: Perform both Google Calendar creation and DB save atomically
             with transaction.atomic():
-                # Save booking to database first
+                # Step 1: Validate booking data, holding the write lock of the room so a concurrent
+                # booking of the room cannot pass the overlap check at the same time (see locks.py)
+                lock_rooms(get_room_ids([request.data]))
+                serializer = self.get_serializer(data=request.data)
+                serializer.is_valid(raise_exception=True)
+
+                # Step 2: Save the booking and queue its Google Calendar event in the same transaction
+                # (the event is created by the process_calendar_outbox worker, see outbox.py)
                 booking = serializer.save()
+                enqueue_calendar_sync(booking, "CREATE")
+
+                # Queue the confirmation email in the same transaction, so it is only sent if the
+                # booking is committed (sent by the process_email_outbox worker, see email_outbox.py)
+                enqueue_email(
+                    "CONFIRMED",
+                    booking.visitor_email,
+                    f"Booking confirmation #{booking.id}",
+                    get_confirmed_email_context(booking),
+                    booking_id=booking.id,
+                )
 
-                # Create Google Calendar event
-                event_data = self._build_event_data(booking)
-                try:
-                    created_event = create_event(event_data)
-                    booking.google_event_id = created_event["id"]
-                    booking.save(update_fields=["google_event_id"])
-                except HttpError as error:
-                    logger.error(
-                        f"Failed to create Google Calendar event: {error}")
-                    # This will cause the transaction to rollback
-                    raise Exception({
-                        "detail": "Failed to create Google Calendar event. Please try again later."
-                    })
-                except Exception as error:
-                    logger.error(
-                        f"Failed to create Google Calendar event: {error}")
-                    # This will cause the transaction to rollback
-                    raise Exception({
-                        "detail": "Failed to create Google Calendar event. Please try again later."
-                    })
-
-                # Queue confirmation email to send after transaction commits.
-                # Defined inside atomic block so it is only queued on success —
-                # if the transaction rolls back, the email will not be sent.
-                def send_confirmation_email():
-                    try:
-                        send_booking_confirmed_email(
-                            subject=f"Booking confirmation #{booking.id}",
-                            recipients=[booking.visitor_email],
-                            context={
-                                "booking_id": booking.id,
-                                "room_name": booking.room.name,
-                                "start_datetime": booking.start_datetime,
-                                "end_datetime": booking.end_datetime,
-                                "recurrence_rule": booking.recurrence_rule,
-                                "visitor_name": booking.visitor_name,
-                                "location_name": booking.room.location.name,
-                                "manage_url": frontend_url + "/find-my-booking"
-                            }
-                        )
-                    except Exception as email_error:
-                        logger.error(
-                            f"Booking {booking.id} created, but failed to send confirmation email: {email_error}")
-
-                transaction.on_commit(send_confirmation_email)
-
-            # If we get here, both Google Calendar and DB creation succeeded
             response_serializer = self.get_serializer(booking)
 
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
         except ValidationError:
-            # Re-raise ValidationError (includes Google Calendar failures)
             raise
         except Exception as error:
             # Handle any other unexpected errors
@@ -182,7 +203,75 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=False, methods=['POST'])
+    @method_decorator(ratelimit(key='user', rate='30/m', block=True))
+    def bulk(self, request, *args, **kwargs):
+        """Create many bookings at once, checking their overlaps with a single query."""
+        header_error = self._check_custom_header(request)
+        if header_error:
+            return header_error
+
+        with transaction.atomic():
+            items = request.data.get("bookings") if isinstance(request.data, dict) else None
+            if isinstance(items, list):
+                lock_rooms(get_room_ids(items))
+            serializer = BookingBulkCreateSerializer(
+                data=request.data, context=self.get_serializer_context())
+            serializer.is_valid(raise_exception=True)
+            bookings = serializer.save()
+            enqueue_calendar_syncs([booking.id for booking in bookings], "CREATE")
+
+            enqueue_emails({
+                "kind": "CONFIRMED",
+                "recipient": booking.visitor_email,
+                "subject": f"Booking confirmation #{booking.id}",
+                "context": get_confirmed_email_context(booking),
+                "booking_id": booking.id,
+            } for booking in bookings)
+
+        return Response(BookingListSerializer(bookings, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['POST'], url_path='bulk-cancel')
+    @method_decorator(ratelimit(key='user', rate='30/m', block=True))
+    def bulk_cancel(self, request, *args, **kwargs):
+        """Cancel the bookings of rooms or locations within a date range, returns a summary."""
+        header_error = self._check_custom_header(request)
+        if header_error:
+            return header_error
+
+        serializer = BookingBulkCancelSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            cancelled, skipped_recurring_ids = serializer.save()
+            deletions = [booking for booking in cancelled if booking["google_event_id"]]
+            enqueue_calendar_syncs([booking["id"] for booking in deletions], "DELETE",
+                                   event_ids=[booking["google_event_id"] for booking in deletions])
+
+            enqueue_emails({
+                "kind": "CANCELLED",
+                "recipient": booking["visitor_email"],
+                "subject": f"Booking cancellation #{booking['id']}",
+                "context": {
+                    "booking_id": booking["id"],
+                    "room_name": booking["room__name"],
+                    "start_datetime": booking["start_datetime"],
+                    "end_datetime": booking["end_datetime"],
+                    "recurrence_rule": booking["recurrence_rule"],
+                    "book_room_url": frontend_url + "/book-room"
+                },
+                "booking_id": booking["id"],
+            } for booking in cancelled)
+
+        return Response({
+            "cancelled": len(cancelled),
+            "room_ids": sorted({booking["room_id"] for booking in cancelled}),
+            "calendar_deletions": len(deletions),
+            "recurring_booking_ids_not_cancelled": skipped_recurring_ids,
+        })
+
     # custom PATCH (including both booking update and deletion)
+    @idempotent
     @method_decorator(ratelimit(key='ip', rate='5/m', block=True))
     def partial_update(self, request, *args, **kwargs):
         header_error = self._check_custom_header(request)
@@ -216,63 +305,42 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         # Check if this is a cancellation request
         if cancel_reason and cancel_reason.strip():
-            # Handle cancellation with transaction, Google Calendar deletion and cancellation email
+            # Handle cancellation with transaction, queued Google Calendar deletion and cancellation email
             try:
                 with transaction.atomic():
-                    # Delete from Google Calendar first, inside the transaction
-                    if instance.google_event_id:
-                        try:
-                            delete_event(instance.google_event_id)
-                        except HttpError as error:
-                            logger.error(
-                                f"Failed to delete Google Calendar event: {error}"
-                            )
-                            raise Exception(
-                                "Failed to delete Google Calendar event. Please try again later."
-                            )
-                        except Exception as error:
-                            logger.error(
-                                f"Failed to delete Google Calendar event: {error}"
-                            )
-                            raise Exception(
-                                "Failed to delete Google Calendar event. Please try again later."
-                            )
-
-                    # Update database (serializer will auto-set status to CANCELLED)
+                    # Lock the booking and read its event ID again, the outbox worker may just have created it
+                    google_event_id = Booking.objects.select_for_update().values_list(
+                        "google_event_id", flat=True).get(pk=instance.pk)
+
+                    # Update database (serializer will auto-set status to CANCELLED) and clear the event ID
                     serializer = self.get_serializer(
                         instance, data=data, partial=True)
                     serializer.is_valid(raise_exception=True)
+                    instance.google_event_id = ""
                     booking = serializer.save()
 
-                    # Clear Google event ID after successful deletion
-                    booking.google_event_id = ""
-                    booking.save(update_fields=["google_event_id"])
+                    # Queue the deletion of the Google Calendar event
+                    if google_event_id:
+                        enqueue_calendar_sync(booking, "DELETE", event_id=google_event_id)
 
                     response_serializer = BookingSerializer(booking, fields=(
                         'id', 'status', 'cancel_reason', 'updated_at'))
 
-                    # Send cancellation email
-                    # A non-critical feature - booking cancellation should not fail if email sending fails
-                    # Use on_commit to ensure email is sent only after transaction commits
-                    def send_cancellation_email():
-                        try:
-                            send_booking_cancelled_email(
-                                subject=f"Booking cancellation #{booking.id}",
-                                recipients=[visitor_email],
-                                context={
-                                    "booking_id": booking.id,
-                                    "room_name": booking.room.name,
-                                    "start_datetime": booking.start_datetime,
-                                    "end_datetime": booking.end_datetime,
-                                    "recurrence_rule": booking.recurrence_rule,
-                                    "book_room_url": frontend_url + "/book-room"
-                                }
-                            )
-                        except Exception as email_error:
-                            logger.error(
-                                f"Booking {booking.id} cancelled, but failed to send cancellation email: {email_error}")
-
-                    transaction.on_commit(send_cancellation_email)
+                    # Queue the cancellation email in the same transaction (see email_outbox.py)
+                    enqueue_email(
+                        "CANCELLED",
+                        visitor_email,
+                        f"Booking cancellation #{booking.id}",
+                        {
+                            "booking_id": booking.id,
+                            "room_name": booking.room.name,
+                            "start_datetime": booking.start_datetime,
+                            "end_datetime": booking.end_datetime,
+                            "recurrence_rule": booking.recurrence_rule,
+                            "book_room_url": frontend_url + "/book-room"
+                        },
+                        booking_id=booking.id,
+                    )
 
                     return Response(response_serializer.data)
 
@@ -286,78 +354,37 @@ class BookingViewSet(viewsets.ModelViewSet):
         # Regular update (not cancellation)
         try:
             with transaction.atomic():
-                # Step 1: Prepare updated booking data but do not save yet
+                # lock the current room and the new one (if the booking moves)
+                lock_rooms({instance.room_id} | get_room_ids([data]))
                 serializer = self.get_serializer(
                     instance, data=data, partial=True)
                 serializer.is_valid(raise_exception=True)
-
-                # Step 2: Sync to Google Calendar with updated data before saving
-                temp_booking = serializer.update(
-                    instance, serializer.validated_data)
-                if temp_booking.google_event_id:
-                    event_data = self._build_event_data(temp_booking)
-                    try:
-                        update_event(
-                            temp_booking.google_event_id, event_data)
-                    except HttpError as error:
-                        # Raise exception to trigger rollback
-                        logger.error(
-                            f"Failed to update Google Calendar event: {error}"
-                        )
-                        raise Exception(
-                            "Failed to update Google Calendar event. Please try again later."
-                        )
-                    except Exception as error:
-                        # Raise exception to trigger rollback
-                        logger.error(
-                            f"Failed to update Google Calendar event: {error}"
-                        )
-                        raise Exception(
-                            "Failed to update Google Calendar event. Please try again later."
-                        )
-
-                # Step 3: Save the booking after successful Google Calendar update using serializer.save()
                 updated_booking = serializer.save()
 
-                # If we get here, both Google Calendar and DB updates succeeded
+                # Queue the Google Calendar sync in the same transaction (see outbox.py)
+                enqueue_calendar_sync(updated_booking, "UPDATE")
+
                 response_serializer = BookingSerializer(
                     updated_booking, fields=('id', 'status', 'updated_at'))
 
-                # Send updated booking confirmation email
-                # A non-critical feature - booking update should not fail if email sending fails
-                # Use on_commit to ensure email is sent only after transaction commits
-                def send_update_confirmation_email():
-                    try:
-                        send_booking_confirmed_email(
-                            subject=f"Booking confirmation #{updated_booking.id} - Booking updated",
-                            recipients=[updated_booking.visitor_email],
-                            context={
-                                "booking_id": updated_booking.id,
-                                "room_name": updated_booking.room.name,
-                                "start_datetime": updated_booking.start_datetime,
-                                "end_datetime": updated_booking.end_datetime,
-                                "recurrence_rule": updated_booking.recurrence_rule,
-                                "visitor_name": updated_booking.visitor_name,
-                                "location_name": updated_booking.room.location.name,
-                                "manage_url": frontend_url + "/find-my-booking"
-                            }
-                        )
-                    except Exception as email_error:
-                        logger.error(
-                            f"Booking {updated_booking.id} updated, but failed to send confirmation email: {email_error}")
-
-                transaction.on_commit(send_update_confirmation_email)
+                # Queue the updated booking confirmation email in the same transaction (see email_outbox.py)
+                enqueue_email(
+                    "CONFIRMED",
+                    updated_booking.visitor_email,
+                    f"Booking confirmation #{updated_booking.id} - Booking updated",
+                    get_confirmed_email_context(updated_booking),
+                    booking_id=updated_booking.id,
+                )
 
                 return Response(response_serializer.data)
 
         except ValidationError:
-            # Re-raise ValidationError (includes Google Calendar failures)
             raise
         except Exception as error:
             # Handle any other unexpected errors
             logger.error(f"Unexpected error during booking update: {error}")
             return Response(
-                {"detail": "Failed to update Google Calendar event. Please try again later."},
+                {"detail": "Failed to update booking. Please try again later."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
@@ -389,42 +416,19 @@ class BookingViewSet(viewsets.ModelViewSet):
             'Updated at'
         ])
 
-        # Write data rows
-        for booking in queryset:
-            writer.writerow([
-                booking.id,
-                booking.room.name,
-                booking.visitor_name,
-                booking.visitor_email,
-                booking.start_datetime,
-                booking.end_datetime,
-                booking.recurrence_rule,
-                booking.status,
-                booking.cancel_reason,
-                booking.created_at,
-                booking.updated_at
-            ])
+        # Write data rows, streamed from the database as tuples instead of Booking instances
+        writer.writerows(queryset.values_list(
+            'id',
+            'room__name',
+            'visitor_name',
+            'visitor_email',
+            'start_datetime',
+            'end_datetime',
+            'recurrence_rule',
+            'status',
+            'cancel_reason',
+            'created_at',
+            'updated_at'
+        ).iterator(chunk_size=2000))
 
         return response
-
-    # helper method for google calendar data construction
-    def _build_event_data(self, booking):
-        return {
-            "summary": f"Booking of {booking.room.name} - {booking.visitor_name}",
-            "description": "Booking confirmed",
-            "start": {
-                "dateTime": booking.start_datetime.isoformat(),
-                "timeZone": "Australia/Perth",
-            },
-            "end": {
-                "dateTime": booking.end_datetime.isoformat(),
-                "timeZone": "Australia/Perth",
-            },
-            "recurrence": [f"RRULE:{booking.recurrence_rule}"] if booking.recurrence_rule else [],
-            # Add for the filtering of events to render in frontend calendar
-            "extendedProperties": {
-                "shared": {
-                    "roomId": str(booking.room.id)
-                }
-            }
-        }
@@ -4,25 +4,23 @@ from typing import Iterable
 from django.conf import settings
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
-from datetime import datetime, timezone
-from rrule_humanize import humanize
 from smtplib import SMTPAuthenticationError, SMTPResponseException, SMTPException
 from anymail.exceptions import AnymailError
 
+from .email_rendering import BOOKING_CANCELLED_TEMPLATE, BOOKING_CONFIRMED_TEMPLATE, build_ics, humanize_rule, render_email
+
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-# Template paths under api/templates/emails
-BOOKING_CONFIRMED_TEMPLATE = "emails/booking_confirmed.html"
-BOOKING_CANCELLED_TEMPLATE = "emails/booking_cancelled.html"
-
 """
 Email utilities for booking notifications.
 
 Usage:
-- Call `send_booking_confirmed_email` or `send_booking_cancelled_email`
+- Booking views queue emails in the email outbox (see api/booking/email_outbox.py), the worker
+  builds them with `build_booking_confirmed_email` / `build_booking_cancelled_email`
+- Call `send_booking_confirmed_email` or `send_booking_cancelled_email` to send one immediately
 - Pass booking-specific data via the `context` dictionary
 - Shared layout and branding (e.g. Bloom logo) are injected automatically
 
@@ -75,11 +73,16 @@ def get_bloom_logo_url() -> str:
     return os.environ.get("FRONTEND_URL", "") + "images/bloom_logo.png"
 
 
+def email_is_configured() -> bool:
+    """True when both RESEND_API_KEY and DEFAULT_FROM_EMAIL are set."""
+    resend_key = getattr(settings, "ANYMAIL", {}).get("RESEND_API_KEY")
+    default_from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "")
+    return bool(resend_key and default_from_email)
+
+
 def requires_email_exists(func):
     def wrapper(*args, **kwargs):
-        resend_key = getattr(settings, "ANYMAIL", {}).get("RESEND_API_KEY")
-        default_from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "")
-        if not resend_key or not default_from_email:
+        if not email_is_configured():
             logger.warning(
                 "RESEND_API_KEY or DEFAULT_FROM_EMAIL is not set. Emails will not be sent.")
             return 0
@@ -206,6 +209,73 @@ def send_email_with_attachments(
         raise
 
 
+def _get_booking_email_context(context: dict) -> dict:
+    """Adds the shared variables and the humanized recurrence rule to a booking email context."""
+    ctx = dict(context or {})
+    ctx.setdefault("bloom_logo_url", get_bloom_logo_url())
+    ctx["recurrence_rule_human"] = humanize_rule(ctx.get('recurrence_rule'))
+    return ctx
+
+
+def build_booking_ics(context: dict) -> str:
+    """Returns the iCalendar invite attached to booking confirmed emails."""
+    room_name = context.get('room_name', 'Bloom Meeting Room')
+    return build_ics([{
+        "uid": f"booking-{context.get('booking_id', 'unknown')}@Bloom",
+        "summary": f"Bloom room booking - {room_name}",
+        "start_datetime": context['start_datetime'],
+        "end_datetime": context['end_datetime'],
+        "recurrence_rule": context.get('recurrence_rule'),
+        "description": f"Room: {context['room_name']}, Location: {context['location_name']}, Visitor: {context['visitor_name']}",
+    }])
+
+
+def build_booking_confirmed_email(
+    recipients: Iterable[str],
+    *,
+    context: dict,
+    subject: str = "Booking confirmed!",
+    from_email: str | None = None,
+) -> EmailMultiAlternatives | None:
+    """
+    Builds the booking confirmed email (HTML and ICS invite) without sending it.
+    Returns None when the context has no start or end datetime.
+    """
+    if not context.get('start_datetime') or not context.get('end_datetime'):
+        logger.error("Missing required datetime objects in context.")
+        return None
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body="",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipients),
+    )
+    email.attach_alternative(render_email(
+        BOOKING_CONFIRMED_TEMPLATE, _get_booking_email_context(context)), "text/html")
+    email.attach("booking.ics", build_booking_ics(context), "text/calendar")
+    return email
+
+
+def build_booking_cancelled_email(
+    recipients: Iterable[str],
+    *,
+    context: dict,
+    subject: str = "Booking cancelled!",
+    from_email: str | None = None,
+) -> EmailMultiAlternatives:
+    """Builds the booking cancelled email without sending it."""
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body="",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipients),
+    )
+    email.attach_alternative(render_email(
+        BOOKING_CANCELLED_TEMPLATE, _get_booking_email_context(context)), "text/html")
+    return email
+
+
 def send_booking_confirmed_email(
     recipients: Iterable[str],
     *,
@@ -218,67 +288,17 @@ def send_booking_confirmed_email(
     Expects `context` to match the variables used in
     emails/booking_confirmed.html.
     """
-    ctx = dict(context or {})
-    ctx.setdefault("bloom_logo_url", get_bloom_logo_url())
-
-    start_dt = context.get('start_datetime')
-    end_dt = context.get('end_datetime')
-    booking_id = context.get('booking_id', 'unknown')
-    room_name = context.get('room_name', 'Bloom Meeting Room')
-    rrule_str = context.get('recurrence_rule')
-
-    if not start_dt or not end_dt:
+    if not context.get('start_datetime') or not context.get('end_datetime'):
         logger.error("Missing required datetime objects in context.")
         return 0
 
-    start_utc = start_dt.astimezone(timezone.utc)
-    end_utc = end_dt.astimezone(timezone.utc)
-
-    start_str = start_utc.strftime('%Y%m%dT%H%M%SZ')
-    end_str = end_utc.strftime('%Y%m%dT%H%M%SZ')
-
-    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    uid = f"booking-{booking_id}@Bloom"
-
-    ics_lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//Bloom//EN",
-        "BEGIN:VEVENT",
-        f"UID:{uid}",
-        f"DTSTAMP:{dtstamp}",
-        f"SUMMARY:Bloom room booking - {room_name}",
-        f"DTSTART:{start_str}",
-        f"DTEND:{end_str}",
-    ]
-
-    # Only add the RRULE line if it has content
-    if rrule_str:
-        # Ensure it starts with RRULE: if it doesn't already
-        if not rrule_str.startswith("RRULE:"):
-            rrule_str = f"RRULE:{rrule_str}"
-        ics_lines.append(rrule_str)
-
-    ics_lines.extend([
-        f"DESCRIPTION:Room: {context['room_name']}, Location: {context['location_name']}, Visitor: {context['visitor_name']}",
-        "END:VEVENT",
-        "END:VCALENDAR"
-    ])
-
-    ics_content = "\r\n".join(ics_lines)
-
-    if rrule_str:
-        ctx["recurrence_rule_human"] = humanize(rrule_str)
-    else:
-        ctx["recurrence_rule_human"] = ""
-
     return send_email_with_attachments(
         subject=subject,
         recipients=recipients,
         html_template=BOOKING_CONFIRMED_TEMPLATE,
-        context=ctx,
+        context=_get_booking_email_context(context),
         fail_silently=fail_silently,
-        attachments=[("booking.ics", ics_content, "text/calendar")],
+        attachments=[("booking.ics", build_booking_ics(context), "text/calendar")],
     )
 
 
@@ -294,19 +314,10 @@ def send_booking_cancelled_email(
     Expects `context` to match the variables used in
     emails/booking_cancelled.html.
     """
-    ctx = dict(context or {})
-    ctx.setdefault("bloom_logo_url", get_bloom_logo_url())
-
-    rrule_str = context.get('recurrence_rule')
-    if rrule_str:
-        ctx["recurrence_rule_human"] = humanize(rrule_str)
-    else:
-        ctx["recurrence_rule_human"] = ""
-
     return send_simple_email(
         subject=subject,
         recipients=recipients,
         html_template=BOOKING_CANCELLED_TEMPLATE,
-        context=ctx,
+        context=_get_booking_email_context(context),
         fail_silently=fail_silently,
     )
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+"""
+ETag utilities for conditional GET requests.
+
+Usage:
+- Build a strong ETag from everything the response depends on with `make_etag`
+  (e.g. room booking versions and query parameters), before computing the response
+- Return `not_modified_response(etag)` when `etag_matches(request, etag)`
+- Otherwise set `response["ETag"] = etag` on the computed response
+"""
+
+
+def make_etag(*parts):
+    """Returns a strong ETag (quoted) hashing the given parts."""
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    """Returns True if the If-None-Match header of the request matches the ETag."""
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    # If-None-Match uses the weak comparison
+    return "*" in etags or etag in etags or f"W/{etag}" in etags
+
+
+def not_modified_response(etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response["ETag"] = etag
+    return response
@@ -0,0 +1,95 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+"""
+Idempotency-Key support for unsafe requests (e.g. retried booking creations).
+
+Usage:
+- Decorate a view(set) method with `@idempotent`, outside rate limiting so replays are not counted
+- Requests without an Idempotency-Key header are handled as usual
+- The first response of a key (including validation errors) is stored in the default cache for
+  settings.IDEMPOTENCY_KEY_TIMEOUT seconds, replays return it without running the view
+  The cache must be shared by every worker (see CACHES in settings), else a retry handled by
+  another worker runs the request again
+  (with an `Idempotent-Replayed: true` header). Server errors and 403/429 responses (rate limits,
+  missing headers) are not stored, so the request can be retried
+- A key reused with another method, path, user or body is rejected with 422, and a replay
+  arriving while the first request is still running gets 409
+"""
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+DEFAULT_IDEMPOTENCY_KEY_TIMEOUT = 24 * 60 * 60
+# how long a request may hold its key before a replay is allowed to run it again (seconds)
+IN_PROGRESS_TIMEOUT = 60
+NOT_STORED_STATUSES = {status.HTTP_403_FORBIDDEN, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+def _get_fingerprint(request):
+    """Hashes everything the response depends on: method, path, user and body."""
+    try:
+        body = json.dumps(request.data, sort_keys=True, default=str)
+    except TypeError:
+        body = repr(request.data)
+    return hashlib.sha256(
+        repr((request.method, request.path, request.user.pk, body)).encode()).hexdigest()
+
+
+def idempotent(view_method):
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_KEY_HEADER} must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = f"idempotency:{hashlib.sha256(key.encode()).hexdigest()}"
+        lock_key = f"{cache_key}:lock"
+        fingerprint = _get_fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None:
+            if not cache.add(lock_key, fingerprint, IN_PROGRESS_TIMEOUT):
+                return Response(
+                    {"detail": f"A request with this {IDEMPOTENCY_KEY_HEADER} is already in progress."},
+                    status=status.HTTP_409_CONFLICT)
+            # the first request may have finished between the two reads
+            stored = cache.get(cache_key)
+            if stored is not None:
+                cache.delete(lock_key)
+
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_KEY_HEADER} was already used for another request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            response = Response(stored["data"], status=stored["status"])
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception as exc:
+                # turn API exceptions (e.g. validation errors) into their response so it can be stored
+                response = self.handle_exception(exc)
+            data = getattr(response, "data", None)
+            if response.status_code < 500 and response.status_code not in NOT_STORED_STATUSES and data is not None:
+                cache.set(cache_key, {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "data": data,
+                }, getattr(settings, "IDEMPOTENCY_KEY_TIMEOUT", DEFAULT_IDEMPOTENCY_KEY_TIMEOUT))
+            return response
+        finally:
+            cache.delete(lock_key)
+    return wrapper
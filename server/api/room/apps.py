@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RoomConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api.room"
+
+    def ready(self):
+        # register signal receivers
+        from . import signals  # noqa: F401
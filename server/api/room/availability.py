@@ -0,0 +1,153 @@
+"""
+Shared building blocks for room availability.
+
+Windows and booked slots are lists of (start, end) local datetime tuples that can be fed
+to the interval engine (see intervals.py). They are used by RoomViewSet and the slot bitmaps.
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import localtime, make_aware
+
+from api.booking.models import BookingOccurrence
+from api.booking.occurrences import occurrence_cache
+from .intervals import subtract_intervals
+
+# Size of the calendar-aligned blocks room opening windows are expanded (and cached) in
+WINDOW_BLOCK_DAYS = 28
+
+
+def get_day_bounds(day):
+    """Returns the (start, end) local datetimes of a date, as used by the availability endpoints."""
+    return (make_aware(datetime.combine(day, time.min)),
+            make_aware(datetime.combine(day, time.max)))
+
+
+def get_day_windows(start_date, end_date):
+    """Returns one full-day window per date (24/7 availability)."""
+    day_windows = []
+    current_date = start_date
+    while current_date <= end_date:
+        day_windows.append(get_day_bounds(current_date))
+        current_date += timedelta(days=1)
+    return day_windows
+
+
+def get_room_windows(room, start_date, end_date):
+    """
+    Returns the opening windows of a room between two dates (inclusive), based on
+    room.start_datetime, room.end_datetime and room.recurrence_rule.
+    Assumption: Room starttime and endtime are on the same day.
+    """
+    room_windows = []
+    if not room.recurrence_rule:
+        # assume room.start_datetime and room.end_datetime are on the same date
+        available_date = localtime(room.start_datetime).date()
+        if start_date <= available_date <= end_date:
+            room_windows.append(
+                (localtime(room.start_datetime), localtime(room.end_datetime)))
+    else:
+        duration = room.end_datetime - room.start_datetime
+        # get start time of occurrences between start_date and end_date
+        for occurrence_start in _iter_room_occurrences(room, start_date, end_date):
+            room_windows.append(
+                (occurrence_start, localtime(occurrence_start + duration)))
+    return room_windows
+
+
+def _iter_room_occurrences(room, start_date, end_date):
+    """
+    Yields the local start of the room opening windows starting between two dates (inclusive).
+    Rules are expanded in fixed blocks of WINDOW_BLOCK_DAYS aligned on the calendar, so the
+    expansions cached by occurrence_cache are shared by every request range of the room.
+    """
+    dtstart = localtime(room.start_datetime)
+    block_start = date.fromordinal(
+        start_date.toordinal() - start_date.toordinal() % WINDOW_BLOCK_DAYS)
+    while block_start <= end_date:
+        block_end = block_start + timedelta(days=WINDOW_BLOCK_DAYS - 1)
+        for occurrence_start in occurrence_cache.expand(
+            dtstart,
+            room.recurrence_rule,
+            get_day_bounds(block_start)[0],
+            get_day_bounds(block_end)[1]
+        ):
+            if start_date <= occurrence_start.date() <= end_date:
+                yield occurrence_start
+        block_start = block_end + timedelta(days=1)
+
+
+def get_booked_slots_by_room(room_ids, start_date, end_date):
+    """
+    Returns a dict mapping room ID to a list of (booked_start, booked_end) local datetime tuples
+    of confirmed booking occurrences overlapping the dates, loaded with a single range query.
+    """
+    booked_slots_by_room = {room_id: [] for room_id in room_ids}
+    if not booked_slots_by_room:
+        return booked_slots_by_room
+    occurrences = BookingOccurrence.objects.filter(
+        room_id__in=booked_slots_by_room.keys(),
+        status="CONFIRMED",
+        start_datetime__lt=get_day_bounds(end_date)[1],
+        end_datetime__gt=get_day_bounds(start_date)[0],
+    ).values_list("room_id", "start_datetime", "end_datetime")
+    for room_id, occurrence_start, occurrence_end in occurrences:
+        booked_slots_by_room[room_id].append(
+            (localtime(occurrence_start), localtime(occurrence_end)))
+    return booked_slots_by_room
+
+
+def _free_slots_cache_key(room_id, booking_version, day, room_version=None):
+    # Free slots depend on the room bookings, its booking_version is part of the key. Opening hours
+    # slots also depend on the room itself, its version (updated_at) is part of the key too
+    if room_version is None:
+        return f"room-availability:247:{room_id}:{booking_version}:{day.isoformat()}"
+    return f"room-availability:hours:{room_id}:{booking_version}:{room_version}:{day.isoformat()}"
+
+
+def _room_version(updated_at):
+    return int(updated_at.timestamp() * 1_000_000)
+
+
+def get_free_slots_by_date(room, start_date, end_date, opening_hours=False):
+    """
+    Returns a dict mapping every date between two dates (inclusive) to the free
+    (start, end) local datetime tuples of the room on that date (past time is not trimmed).
+    Days are cached by room version and date in the default Django cache, only missing days are
+    computed (with a single booking query). Writing a booking bumps the room booking_version, so
+    outdated days are never read again and expire with ROOM_AVAILABILITY_CACHE_TIMEOUT.
+    The room must be loaded before its bookings are read (e.g. at the start of the request).
+    """
+    room_version = _room_version(room.updated_at) if opening_hours else None
+    keys = {}
+    day = start_date
+    while day <= end_date:
+        keys[day] = _free_slots_cache_key(room.id, room.booking_version, day, room_version)
+        day += timedelta(days=1)
+    cached = cache.get_many(keys.values())
+    free_slots_by_date = {day: cached[key] for day, key in keys.items() if key in cached}
+    missing_dates = [day for day in keys if day not in free_slots_by_date]
+    if not missing_dates:
+        return free_slots_by_date
+
+    first_date, last_date = missing_dates[0], missing_dates[-1]
+    if opening_hours:
+        windows = get_room_windows(room, first_date, last_date)
+    else:
+        windows = get_day_windows(first_date, last_date)
+    booked_slots = get_booked_slots_by_room(
+        [room.id], first_date, last_date)[room.id]
+    computed = {day: [] for day in missing_dates}
+    for free_start, free_end in subtract_intervals(windows, booked_slots):
+        # windows never span two dates, so free slots belong to the date they start on
+        free_date = free_start.date()
+        if free_date in computed:
+            computed[free_date].append((free_start, free_end))
+    cache.set_many(
+        {keys[day]: slots for day, slots in computed.items()},
+        timeout=settings.ROOM_AVAILABILITY_CACHE_TIMEOUT,
+    )
+    free_slots_by_date.update(computed)
+    return free_slots_by_date
@@ -0,0 +1,219 @@
+"""
+Slot bitmap index for boolean room availability.
+
+Each room day is split into fixed-size slots (SLOT_MINUTES). Bit i of a day's bitmap is set
+when slot i is entirely unavailable (room closed or booked), so "is there any free time in
+this window" becomes a mask test:
+
+- a slot fully inside the window with its bit clear has free time -> available
+- every slot overlapping the window has its bit set -> not available
+- otherwise the only free time is in partially covered edge slots -> undecided, callers fall
+  back to the exact interval computation
+
+Bitmaps are stored in RoomSlotBitmap rows, built lazily on first read. Each row records the
+room's booking_version and updated_at it was built from, a row that no longer matches the room
+(bookings changed or room edited since) is treated as missing and rebuilt.
+Only dates from today up to STORED_BITMAP_DAYS ahead are stored, other dates are built per request.
+Run `python manage.py prune_room_bitmaps` regularly (e.g. daily) to drop the rows of past dates.
+Assumption: local days are 24 hours long (no DST in Australia/Perth).
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.utils.timezone import localdate, localtime, make_aware
+
+from .availability import get_booked_slots_by_room, get_room_windows
+from .intervals import subtract_intervals
+from .models import RoomSlotBitmap
+
+SLOT_MINUTES = 15
+SLOT = timedelta(minutes=SLOT_MINUTES)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+BITMAP_BYTES = (SLOTS_PER_DAY + 7) // 8
+
+# Windows spanning more days than this are evaluated exactly instead of through bitmaps
+MAX_BITMAP_DAYS = 62
+# Bitmaps of dates further ahead than this are not stored
+STORED_BITMAP_DAYS = 92
+
+
+def slot_mask(first, last):
+    """Returns a mask with bits first..last-1 set."""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _slot_floor(offset, slot):
+    return offset // slot
+
+
+def _slot_ceil(offset, slot):
+    return -(-offset // slot)
+
+
+def overlap_mask(range_start, intervals, slot=SLOT, slot_count=SLOTS_PER_DAY):
+    """
+    Paints intervals onto `slot_count` consecutive slots (a day by default) starting at range_start:
+    returns a mask with a bit set for every slot that overlaps at least one interval.
+    """
+    range_end = range_start + slot * slot_count
+    mask = 0
+    for start, end in intervals:
+        start, end = max(start, range_start), min(end, range_end)
+        if start >= end:
+            continue
+        mask |= slot_mask(_slot_floor(start - range_start, slot),
+                          _slot_ceil(end - range_start, slot))
+    return mask
+
+
+def encode_runs(layers, length, default=0):
+    """
+    Run-length encodes `length` slots painted with layers of (value, mask) in priority order:
+    a slot takes the value of the first layer with its bit set, else `default`.
+    Returns a list of [value, run length]. Only run boundaries are visited, not every slot.
+    """
+    full = (1 << length) - 1
+    # a run starts at slot 0 and wherever any layer changes
+    boundaries = 1
+    for _, mask in layers:
+        mask &= full
+        boundaries |= (mask ^ (mask << 1)) & full
+    runs = []
+    while boundaries:
+        lowest = boundaries & -boundaries
+        start = lowest.bit_length() - 1
+        boundaries ^= lowest
+        end = (boundaries & -boundaries).bit_length() - 1 if boundaries else length
+        value = next((value for value, mask in layers if mask >> start & 1), default)
+        if runs and runs[-1][0] == value:
+            runs[-1][1] += end - start
+        else:
+            runs.append([value, end - start])
+    return runs
+
+
+def _day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def _dates_between(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def get_window_dates(windows):
+    """Returns the sorted local dates touched by a list of (start, end) datetime windows."""
+    return sorted({
+        day
+        for start_datetime, end_datetime in windows
+        for day in _dates_between(localtime(start_datetime).date(), localtime(end_datetime).date())
+    })
+
+
+def build_room_bitmaps(rooms, dates):
+    """
+    Computes the bitmaps of rooms for the given dates, bookings are loaded with a single range query.
+    Returns a dict mapping (room ID, date) to the bitmap integer.
+    """
+    date_set = set(dates)
+    if not date_set:
+        return {}
+    start_date, end_date = min(date_set), max(date_set)
+    booked_slots_by_room = get_booked_slots_by_room(
+        [room.id for room in rooms], start_date, end_date)
+    bitmaps = {}
+    for room in rooms:
+        # only the windows of the requested dates, windows never span two dates
+        windows = [window for window in get_room_windows(room, start_date, end_date)
+                   if localtime(window[0]).date() in date_set or localtime(window[1]).date() in date_set]
+        # untrimmed free time, past slots are never queried
+        free_intervals_by_date = defaultdict(list)
+        for free_start, free_end in subtract_intervals(windows, booked_slots_by_room[room.id]):
+            for day in _dates_between(localtime(free_start).date(), localtime(free_end).date()):
+                free_intervals_by_date[day].append((free_start, free_end))
+        for day in date_set:
+            bitmaps[(room.id, day)] = FULL_DAY & ~overlap_mask(
+                _day_start(day), free_intervals_by_date[day])
+    return bitmaps
+
+
+def _to_bytes(bitmap):
+    return bitmap.to_bytes(BITMAP_BYTES, "little")
+
+
+def _from_bytes(value):
+    return int.from_bytes(bytes(value), "little")
+
+
+def get_room_bitmaps(rooms, dates):
+    """
+    Returns a dict mapping (room ID, date) to the bitmap integer for the given dates, loading stored
+    bitmaps in one query and building the missing or outdated ones (stored if their date is within
+    STORED_BITMAP_DAYS from today).
+    The rooms must be loaded before their bookings are read (e.g. at the start of the request) so
+    a bitmap is never stored with a booking_version newer than the bookings it was built from.
+    """
+    dates = sorted(set(dates))
+    versions = {room.id: (room.booking_version, room.updated_at) for room in rooms}
+    bitmaps = {
+        (room_id, day): _from_bytes(busy)
+        for room_id, day, busy, booking_version, room_updated_at in RoomSlotBitmap.objects.filter(
+            room__in=rooms, date__in=dates
+        ).values_list("room_id", "date", "busy", "booking_version", "room_updated_at")
+        if versions[room_id] == (booking_version, room_updated_at)
+    }
+    missing = [(room, day) for room in rooms for day in dates if (room.id, day) not in bitmaps]
+    if missing:
+        built = build_room_bitmaps(
+            list({room.id: room for room, _ in missing}.values()), {day for _, day in missing})
+        first_stored_date = localdate()
+        last_stored_date = first_stored_date + timedelta(days=STORED_BITMAP_DAYS)
+        RoomSlotBitmap.objects.bulk_create(
+            [RoomSlotBitmap(room_id=room_id, date=day, busy=_to_bytes(bitmap),
+                            booking_version=versions[room_id][0], room_updated_at=versions[room_id][1])
+             for (room_id, day), bitmap in built.items()
+             if (room_id, day) not in bitmaps and first_stored_date <= day <= last_stored_date],
+            update_conflicts=True,
+            unique_fields=["room", "date"],
+            update_fields=["busy", "booking_version", "room_updated_at"],
+        )
+        for key, bitmap in built.items():
+            bitmaps.setdefault(key, bitmap)
+    return bitmaps
+
+
+def prune_room_bitmaps():
+    """Deletes the stored bitmaps of past dates, returns the number of deleted rows."""
+    deleted, _ = RoomSlotBitmap.objects.filter(date__lt=localdate()).delete()
+    return deleted
+
+
+def is_window_available(bitmaps, room_id, start_datetime, end_datetime):
+    """
+    Tests a window against a room's bitmaps (see get_room_bitmaps).
+    Returns True or False, or None when only partially covered edge slots may have free time.
+    """
+    start_datetime, end_datetime = localtime(start_datetime), localtime(end_datetime)
+    availability = False
+    for day in _dates_between(start_datetime.date(), end_datetime.date()):
+        day_start = _day_start(day)
+        window_start = max(start_datetime, day_start) - day_start
+        window_end = min(end_datetime, day_start + SLOT * SLOTS_PER_DAY) - day_start
+        if window_start >= window_end:
+            continue
+        free = ~bitmaps[(room_id, day)] & FULL_DAY
+        interior = slot_mask(_slot_ceil(window_start, SLOT),
+                             _slot_floor(window_end, SLOT))
+        if free & interior:
+            return True
+        overlapping = slot_mask(_slot_floor(window_start, SLOT),
+                                _slot_ceil(window_end, SLOT))
+        if free & overlapping & ~interior:
+            availability = None
+    return availability
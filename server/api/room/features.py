@@ -0,0 +1,123 @@
+"""
+In-memory feature index of active rooms, used to rank room recommendations.
+
+Each room is reduced to a compact feature tuple (capacity, amenity bitmask, location and opening
+hours) so candidates can be scored without the multi-join amenity filters of RoomFilter.
+The index is rebuilt lazily (3 queries) whenever its generation token, stored in the default
+Django cache so every worker sees it, changes. Receivers in signals.py reset the token when a
+Room, Amenity or Location is written or the amenities of a room change.
+"""
+
+import threading
+import uuid
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Amenity, Room
+
+FEATURE_GENERATION_CACHE_KEY = "room-features:generation"
+
+
+class RoomFeatures(NamedTuple):
+    id: int
+    name: str
+    capacity: int | None
+    location_id: int
+    location_name: str
+    amenity_mask: int
+    # opening hours, so features can be passed to get_room_windows
+    start_datetime: object
+    end_datetime: object
+    recurrence_rule: str
+
+
+def invalidate_room_features():
+    """
+    Makes every worker rebuild its index on next use.
+    Done again after the current transaction commits, so an index rebuilt from uncommitted data is not kept.
+    """
+    cache.set(FEATURE_GENERATION_CACHE_KEY, uuid.uuid4().hex, None)
+    transaction.on_commit(
+        lambda: cache.set(FEATURE_GENERATION_CACHE_KEY, uuid.uuid4().hex, None))
+
+
+def _get_generation():
+    generation = cache.get(FEATURE_GENERATION_CACHE_KEY)
+    if generation is None:
+        cache.add(FEATURE_GENERATION_CACHE_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(FEATURE_GENERATION_CACHE_KEY)
+    return generation
+
+
+class RoomFeatureIndex:
+    def __init__(self):
+        self.generation = None
+        self.rooms = []
+        # lower-cased amenity name -> bit
+        self.amenity_bits = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuilds the index if its generation changed, returns self."""
+        generation = _get_generation()
+        with self._lock:
+            if generation != self.generation:
+                self._build()
+                self.generation = generation
+        return self
+
+    def _build(self):
+        amenity_bits = {}
+        bit_by_amenity_id = {}
+        for bit, (amenity_id, name) in enumerate(Amenity.objects.order_by("id").values_list("id", "name")):
+            bit_by_amenity_id[amenity_id] = bit
+            amenity_bits.setdefault(name.lower(), 0)
+            amenity_bits[name.lower()] |= 1 << bit
+        masks = {}
+        for room_id, amenity_id in Room.amenities.through.objects.values_list("room_id", "amenity_id"):
+            masks[room_id] = masks.get(room_id, 0) | (1 << bit_by_amenity_id[amenity_id])
+        self.rooms = [
+            RoomFeatures(
+                id=room["id"],
+                name=room["name"],
+                capacity=room["capacity"],
+                location_id=room["location_id"],
+                location_name=room["location__name"],
+                amenity_mask=masks.get(room["id"], 0),
+                start_datetime=room["start_datetime"],
+                end_datetime=room["end_datetime"],
+                recurrence_rule=room["recurrence_rule"],
+            )
+            for room in Room.objects.filter(is_active=True).order_by("id").values(
+                "id", "name", "capacity", "location_id", "location__name",
+                "start_datetime", "end_datetime", "recurrence_rule")
+        ]
+        self.amenity_bits = amenity_bits
+
+
+# Process-wide index
+room_feature_index = RoomFeatureIndex()
+
+
+def capacity_fit(room_capacity, capacity):
+    """1 for an exact fit, decreasing as the room gets larger. 0 if the room is too small."""
+    if not capacity:
+        return 1.0
+    if room_capacity is None:
+        # unknown capacity, neither excluded nor preferred
+        return 0.5
+    if room_capacity < capacity:
+        return 0.0
+    return capacity / room_capacity
+
+
+def amenity_match(room_mask, requested_masks):
+    """
+    Fraction of the requested amenities the room has (1 when none are requested).
+    `requested_masks` holds the bits of every requested amenity (0 for unknown amenities).
+    """
+    if not requested_masks:
+        return 1.0
+    return sum(1 for mask in requested_masks if room_mask & mask) / len(requested_masks)
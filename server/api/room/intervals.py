@@ -0,0 +1,84 @@
+"""
+Interval engine used by room availability.
+
+Intervals are (start, end) tuples of comparable values (aware datetimes in practice),
+treated as half-open [start, end). Booked intervals are sorted and merged once, then a
+single sweep walks all windows (days or room opening windows) to produce free slots,
+instead of filtering and re-sorting the booked list for every window.
+"""
+
+
+def merge_intervals(intervals):
+    """
+    Returns the union of the intervals as a sorted list of disjoint intervals.
+    Overlapping and touching intervals are merged. Empty intervals are dropped.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def clip_intervals(intervals, start, end):
+    """Returns the parts of the intervals within [start, end), dropping the ones outside."""
+    return [
+        (max(interval_start, start), min(interval_end, end))
+        for interval_start, interval_end in intervals
+        if interval_end > start and interval_start < end
+    ]
+
+
+def subtract_intervals(windows, busy, not_before=None):
+    """
+    Subtracts busy intervals from every window in a single sweep.
+
+    - `windows` must be sorted by start (e.g. consecutive days or room opening windows).
+    - `busy` can be in any order and may overlap; it is merged once.
+    - Past time is trimmed when `not_before` is given: free intervals ending at or before it are
+      dropped and free intervals containing it start at it.
+
+    Returns a flat list of free (start, end) intervals in window order.
+    """
+    busy = merge_intervals(busy)
+    free_intervals = []
+    first_busy = 0
+    for window_start, window_end in windows:
+        if not_before is not None:
+            if window_end <= not_before:
+                continue
+            window_start = max(window_start, not_before)
+        # Busy intervals ending before this window cannot affect this or any later window
+        while first_busy < len(busy) and busy[first_busy][1] <= window_start:
+            first_busy += 1
+
+        current_start = window_start
+        index = first_busy
+        while index < len(busy) and busy[index][0] < window_end:
+            b_start, b_end = busy[index]
+            if b_start > current_start:
+                free_intervals.append((current_start, b_start))
+            current_start = max(current_start, b_end)
+            if current_start >= window_end:
+                break
+            index += 1
+        # Add any remaining free interval after the latest busy interval
+        if current_start < window_end:
+            free_intervals.append((current_start, window_end))
+    return free_intervals
+
+
+def find_first_fit(free_intervals, duration):
+    """
+    Returns the earliest (start, start + duration) slot that fits in one of the free intervals,
+    or None. `free_intervals` must be sorted by start (e.g. the output of subtract_intervals).
+    """
+    for free_start, free_end in free_intervals:
+        if free_end - free_start >= duration:
+            return free_start, free_start + duration
+    return None
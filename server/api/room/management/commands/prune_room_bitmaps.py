@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.room.bitmaps import prune_room_bitmaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the stored availability bitmaps of past dates. Run daily (e.g. from cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_room_bitmaps()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} past room bitmap(s)."))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0003_merged_room_updates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSlotBitmap',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('busy', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_bitmaps', to='room.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'date'), name='room_slot_bitmap_unique_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0004_roomslotbitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='booking_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
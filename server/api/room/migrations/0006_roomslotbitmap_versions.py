@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0005_room_booking_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomslotbitmap',
+            name='booking_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='roomslotbitmap',
+            name='room_updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -49,8 +49,36 @@ class Room(models.Model):
     start_datetime = models.DateTimeField(default=get_start_of_today, blank=True)
     end_datetime = models.DateTimeField(default=get_end_of_today, blank=True)
     recurrence_rule = models.CharField(default='FREQ=DAILY', max_length=64, blank=True)
+    # incremented whenever a booking of the room is written (see Booking.save), used for ETags
+    booking_version = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
+
+
+class RoomSlotBitmap(models.Model):
+    """
+    Per-room, per-day bitmap of fixed-size time slots, managed by api.room.bitmaps.
+    Bit i is set when slot i of the day is entirely unavailable (room closed or booked).
+    A row is only used while its booking_version and room_updated_at match the room.
+    """
+    id = models.AutoField(primary_key=True)
+    room = models.ForeignKey(
+        Room, on_delete=models.CASCADE, related_name="slot_bitmaps")
+    date = models.DateField()
+    # little-endian bytes of the bitmap integer
+    busy = models.BinaryField()
+    # room state the bitmap was built from
+    booking_version = models.PositiveBigIntegerField(default=0)
+    room_updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["room", "date"], name="room_slot_bitmap_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"Slot bitmap of room {self.room_id} on {self.date}"
@@ -0,0 +1,16 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .features import invalidate_room_features
+from .models import Amenity, Location, Room
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(m2m_changed, sender=Room.amenities.through)
+def invalidate_room_features_on_change(sender, **kwargs):
+    invalidate_room_features()
@@ -1,10 +1,20 @@
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Room, Location, Amenity
+from .models import Room, Location, Amenity, RoomSlotBitmap
+from .availability import get_free_slots_by_date, get_room_windows
+from .bitmaps import (
+    FULL_DAY, STORED_BITMAP_DAYS, encode_runs, get_room_bitmaps, is_window_available, prune_room_bitmaps, slot_mask
+)
+from .intervals import find_first_fit, merge_intervals, subtract_intervals
 from django.utils import timezone
 from datetime import timedelta, time
+from unittest import mock
 from api.booking.models import Booking
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
 
 User = get_user_model()
 
@@ -377,3 +387,517 @@ class AvailabilityAPITest(APITestCase):
         self.assertEqual(data[1]['availability'], True)
         self.assertEqual(data[2]['room_id'], self.room3.id)
         self.assertEqual(data[2]['availability'], True)
+
+    def test_rooms_availability_query_count_is_independent_of_page_size(self):
+        start_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(11, 0))
+        )
+        end_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(12, 0))
+        )
+        url = f"/api/rooms/availability/?start_datetime={start_datetime.isoformat()}&end_datetime={end_datetime.isoformat()}"
+
+        with CaptureQueriesContext(connection) as three_rooms:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for i in range(4, 9):
+            room = Room.objects.create(
+                name=f"Meeting Room {i}", location=self.loc1, capacity=5, is_active=True)
+            Booking.objects.create(
+                room=room,
+                visitor_name='Jane Doe',
+                visitor_email='jane@example.com',
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                recurrence_rule="",
+                status='CONFIRMED'
+            )
+
+        with CaptureQueriesContext(connection) as eight_rooms:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 8)
+        # Bookings of every room on the page are loaded in a single query
+        self.assertEqual(len(three_rooms.captured_queries),
+                         len(eight_rooms.captured_queries))
+        availability = {r["room_id"]: r["availability"] for r in response.data["results"]}
+        self.assertFalse(availability[self.room1.id])
+        self.assertTrue(availability[self.room2.id])
+        self.assertFalse(availability[room.id])
+
+    def test_rooms_availability_for_many_windows(self):
+        def window(hour):
+            return {
+                "start_datetime": timezone.make_aware(
+                    timezone.datetime.combine(next_monday, time(hour, 0))).isoformat(),
+                "end_datetime": timezone.make_aware(
+                    timezone.datetime.combine(next_monday, time(hour + 1, 0))).isoformat(),
+            }
+        past_window = {"end_datetime": (timezone.now() - timedelta(hours=1)).isoformat()}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/rooms/availability/",
+                {"windows": [window(11), window(13), window(15), past_window, {}]},
+                format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        availability = {r["room_id"]: r["availability"] for r in response.data["results"]}
+        self.assertEqual(availability[self.room1.id], [False, True, True, False, True])
+        self.assertEqual(availability[self.room2.id], [True, False, True, False, True])
+        self.assertEqual(availability[self.room3.id], [True, True, False, False, True])
+        # Bookings are loaded once for every window
+        self.assertLessEqual(
+            sum("booking_bookingoccurrence" in query["sql"] for query in queries.captured_queries), 1)
+
+        response = self.client.post("/api/rooms/availability/", {"windows": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            "/api/rooms/availability/", {"windows": [{"start_datetime": "2030-01-01"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_first_available_slots_across_rooms(self):
+        start_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(11, 0)))
+        end_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(14, 0)))
+        url = (f"/api/rooms/first-available/?duration=60&start_datetime={start_datetime.isoformat()}"
+               f"&end_datetime={end_datetime.isoformat()}")
+        response = self.client.get(url.replace("+", "%2B"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot["room_id"], slot["start"]) for slot in response.data],
+            [
+                (self.room2.id, start_datetime.isoformat()),
+                (self.room3.id, start_datetime.isoformat()),
+                (self.room1.id, (start_datetime + timedelta(hours=1)).isoformat()),
+            ]
+        )
+        # Room filters are applied, rooms without a long enough slot are omitted
+        response = self.client.get(url.replace("+", "%2B") + "&min_capacity=6")
+        self.assertEqual([slot["room_id"] for slot in response.data], [self.room1.id])
+        response = self.client.get(url.replace("+", "%2B").replace("duration=60", "duration=150"))
+        self.assertEqual([slot["room_id"] for slot in response.data], [self.room3.id])
+
+    def test_first_available_slots_requires_duration_and_end_datetime(self):
+        response = self.client.get("/api/rooms/first-available/?end_datetime=2030-01-01T10:00:00")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/rooms/first-available/?duration=30")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_availability_grid(self):
+        response = self.client.get(f"/api/rooms/grid/?start_date={next_monday}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["columns"], 48)
+        runs = {row["room_id"]: row["runs"] for row in response.data["rooms"]}
+        self.assertEqual(runs[self.room1.id], [[0, 22], [1, 2], [0, 24]])
+        self.assertEqual(runs[self.room2.id], [[0, 26], [1, 2], [0, 20]])
+        self.assertEqual(runs[self.room3.id], [[0, 30], [1, 2], [0, 16]])
+
+        response = self.client.get(f"/api/rooms/grid/?start_date={next_monday}&days=7&min_capacity=6")
+        self.assertEqual(response.data["columns"], 7 * 48)
+        self.assertEqual([row["room_id"] for row in response.data["rooms"]], [self.room1.id])
+        self.assertEqual(response.data["rooms"][0]["runs"], [[0, 22], [1, 2], [0, 312]])
+
+        response = self.client.get("/api/rooms/grid/?days=8")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IntervalEngineTest(SimpleTestCase):
+    def setUp(self):
+        self.day = timezone.make_aware(timezone.datetime(2030, 1, 7))
+
+    def at(self, hour, day=0):
+        return self.day + timedelta(days=day, hours=hour)
+
+    def test_merge_intervals_merges_overlapping_and_touching(self):
+        merged = merge_intervals([
+            (self.at(13), self.at(14)),
+            (self.at(9), self.at(10)),
+            (self.at(10), self.at(11)),
+            (self.at(9.5), self.at(10.5)),
+        ])
+        self.assertEqual(merged, [(self.at(9), self.at(11)),
+                                  (self.at(13), self.at(14))])
+
+    def test_subtract_intervals_sweeps_across_windows(self):
+        windows = [(self.at(0), self.at(24)), (self.at(0, 1), self.at(24, 1))]
+        busy = [
+            (self.at(23), self.at(1, 1)),  # crosses midnight
+            (self.at(9), self.at(10)),
+            (self.at(9.5), self.at(11)),
+        ]
+        self.assertEqual(subtract_intervals(windows, busy), [
+            (self.at(0), self.at(9)),
+            (self.at(11), self.at(23)),
+            (self.at(1, 1), self.at(24, 1)),
+        ])
+
+    def test_subtract_intervals_trims_past_time(self):
+        windows = [(self.at(0), self.at(24)), (self.at(0, 1), self.at(24, 1))]
+        busy = [(self.at(14), self.at(15))]
+        self.assertEqual(
+            subtract_intervals(windows, busy, not_before=self.at(12)),
+            [(self.at(12), self.at(14)), (self.at(15), self.at(24)),
+             (self.at(0, 1), self.at(24, 1))])
+
+    def test_find_first_fit(self):
+        free = [(self.at(9), self.at(9.5)), (self.at(10), self.at(12))]
+        self.assertEqual(find_first_fit(free, timedelta(hours=1)),
+                         (self.at(10), self.at(11)))
+        self.assertIsNone(find_first_fit(free, timedelta(hours=3)))
+
+    def test_subtract_intervals_fully_booked_window(self):
+        windows = [(self.at(9), self.at(17))]
+        self.assertEqual(subtract_intervals(
+            windows, [(self.at(8), self.at(18))]), [])
+
+
+class RoomSlotBitmapTest(APITestCase):
+    def setUp(self):
+        self.loc = Location.objects.create(name="Building A")
+        # Opening hours 09:00-17:00 every day
+        self.room = Room.objects.create(
+            name="Meeting Room",
+            location=self.loc,
+            start_datetime=timezone.make_aware(
+                timezone.datetime.combine(today, time(9, 0))),
+            end_datetime=timezone.make_aware(
+                timezone.datetime.combine(today, time(17, 0))),
+            recurrence_rule="FREQ=DAILY",
+        )
+        self.booking = Booking.objects.create(
+            room=self.room,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=self.at(10, 0),
+            end_datetime=self.at(10, 20),
+            recurrence_rule="",
+            status='CONFIRMED'
+        )
+
+    def at(self, hour, minute):
+        return timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(hour, minute)))
+
+    def bitmap(self):
+        self.room.refresh_from_db()
+        return get_room_bitmaps([self.room], [next_monday])[(self.room.id, next_monday)]
+
+    def test_bitmap_marks_closed_and_booked_slots(self):
+        closed = slot_mask(0, 36) | slot_mask(68, 96)
+        # 10:00-10:15 is fully booked, 10:15-10:30 still has free time
+        self.assertEqual(self.bitmap(), closed | slot_mask(40, 41))
+        self.assertTrue(RoomSlotBitmap.objects.filter(room=self.room, date=next_monday).exists())
+
+    def test_window_availability(self):
+        bitmaps = {(self.room.id, next_monday): self.bitmap()}
+        self.assertFalse(is_window_available(
+            bitmaps, self.room.id, self.at(10, 0), self.at(10, 15)))
+        self.assertFalse(is_window_available(
+            bitmaps, self.room.id, self.at(18, 0), self.at(20, 0)))
+        self.assertTrue(is_window_available(
+            bitmaps, self.room.id, self.at(10, 0), self.at(10, 30)))
+        # free time only within a partially covered edge slot
+        self.assertIsNone(is_window_available(
+            bitmaps, self.room.id, self.at(10, 5), self.at(10, 25)))
+
+    def test_bitmap_rebuilt_when_bookings_or_room_change(self):
+        self.bitmap()
+        stale_room = Room.objects.get(pk=self.room.pk)
+        self.booking.status = "CANCELLED"
+        self.booking.save(update_fields=["status"])
+        self.assertEqual(self.bitmap(), slot_mask(0, 36) | slot_mask(68, 96))
+
+        # a request that loaded the room before the change stores its bitmap with the old version,
+        # which later requests ignore
+        RoomSlotBitmap.objects.filter(room=self.room).update(
+            busy=bytes(12), booking_version=stale_room.booking_version)
+        self.assertEqual(self.bitmap(), slot_mask(0, 36) | slot_mask(68, 96))
+        self.assertEqual(RoomSlotBitmap.objects.get(room=self.room).booking_version, self.room.booking_version)
+
+        self.room.recurrence_rule = ""
+        self.room.save()
+        self.assertEqual(self.bitmap(), FULL_DAY)
+
+    def test_only_bitmaps_of_upcoming_dates_are_stored(self):
+        past_date = today - timedelta(days=1)
+        far_date = today + timedelta(days=STORED_BITMAP_DAYS + 1)
+        get_room_bitmaps([self.room], [past_date, far_date])
+        self.assertFalse(RoomSlotBitmap.objects.exists())
+
+        RoomSlotBitmap.objects.create(room=self.room, date=past_date, busy=bytes(12))
+        self.bitmap()
+        self.assertEqual(prune_room_bitmaps(), 1)
+        self.assertEqual(list(RoomSlotBitmap.objects.values_list("date", flat=True)), [next_monday])
+
+    def test_rooms_availability_uses_bitmaps_with_exact_fallback(self):
+        url = "/api/rooms/availability/?start_datetime={}&end_datetime={}"
+        response = self.client.get(url.format(
+            self.at(10, 0).isoformat(), self.at(10, 15).isoformat()))
+        self.assertFalse(response.data["results"][0]["availability"])
+        # 10:20-10:25 is free but lies within a partially covered slot
+        response = self.client.get(url.format(
+            self.at(10, 5).isoformat(), self.at(10, 25).isoformat()))
+        self.assertTrue(response.data["results"][0]["availability"])
+        response = self.client.get(url.format(
+            self.at(10, 5).isoformat(), self.at(10, 20).isoformat()))
+        self.assertFalse(response.data["results"][0]["availability"])
+
+    def test_rooms_availability_builds_bitmaps_of_window_dates_only(self):
+        later = timedelta(days=21)
+        response = self.client.post("/api/rooms/availability/", {"windows": [
+            {"start_datetime": self.at(10, 0).isoformat(), "end_datetime": self.at(10, 15).isoformat()},
+            {"start_datetime": (self.at(10, 0) + later).isoformat(), "end_datetime": (self.at(10, 15) + later).isoformat()},
+        ]}, format="json")
+        self.assertEqual(response.data["results"][0]["availability"], [False, True])
+        self.assertEqual(
+            sorted(RoomSlotBitmap.objects.values_list("date", flat=True)), [next_monday, next_monday + later])
+
+
+class OpeningHoursAvailabilityTest(APITestCase):
+    def setUp(self):
+        self.loc = Location.objects.create(name="Building A")
+        # Opening hours 09:00-17:00 every day
+        self.room = Room.objects.create(
+            name="Meeting Room",
+            location=self.loc,
+            start_datetime=timezone.make_aware(
+                timezone.datetime.combine(today, time(9, 0))),
+            end_datetime=timezone.make_aware(
+                timezone.datetime.combine(today, time(17, 0))),
+            recurrence_rule="FREQ=DAILY",
+        )
+        Booking.objects.create(
+            room=self.room,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=self.at(10, 0),
+            end_datetime=self.at(10, 20),
+            recurrence_rule="",
+            status='CONFIRMED'
+        )
+        self.url = f"/api/rooms/{self.room.id}/availability/?start_date={next_monday}&end_date={next_monday}"
+
+    def at(self, hour, minute):
+        return timezone.make_aware(
+            timezone.datetime.combine(next_monday, time(hour, minute)))
+
+    def test_room_availability_within_opening_hours(self):
+        response = self.client.get(self.url + "&opening_hours=true")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["availability"][0]["slots"], [
+            {"start": self.at(9, 0).isoformat(), "end": self.at(10, 0).isoformat()},
+            {"start": self.at(10, 20).isoformat(), "end": self.at(17, 0).isoformat()},
+        ])
+
+    def test_availability_mode_defaults_to_setting(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["availability"][0]["slots"][0]["start"],
+                         self.at(0, 0).isoformat())
+        with self.settings(ROOM_AVAILABILITY_OPENING_HOURS=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["availability"][0]["slots"][0]["start"],
+                         self.at(9, 0).isoformat())
+        response = self.client.get(self.url + "&opening_hours=maybe")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_first_available_within_opening_hours(self):
+        url = (f"/api/rooms/first-available/?duration=45&start_datetime={self.at(6, 0).isoformat()}"
+               f"&end_datetime={self.at(20, 0).isoformat()}").replace("+", "%2B")
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]["start"], self.at(6, 0).isoformat())
+        response = self.client.get(url + "&opening_hours=true")
+        self.assertEqual(response.data[0]["start"], self.at(9, 0).isoformat())
+        self.assertEqual(response.data[0]["end"], self.at(9, 45).isoformat())
+
+    def test_first_available_slots_do_not_cross_midnight(self):
+        start_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_sunday, time(22, 30)))
+        end_datetime = timezone.make_aware(
+            timezone.datetime.combine(next_monday + timedelta(days=7), time(2, 0)))
+        url = (f"/api/rooms/first-available/?duration=90&start_datetime={start_datetime.isoformat()}"
+               f"&end_datetime={end_datetime.isoformat()}").replace("+", "%2B")
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]["start"], (start_datetime + timedelta(minutes=90)).isoformat())
+
+    def test_availability_grid_within_opening_hours(self):
+        response = self.client.get(
+            f"/api/rooms/grid/?start_date={next_monday}&opening_hours=true")
+        self.assertEqual(response.data["rooms"][0]["runs"],
+                         [[2, 18], [0, 2], [1, 1], [0, 13], [2, 14]])
+
+    def test_encode_runs(self):
+        layers = [(1, slot_mask(2, 4)), (2, ~slot_mask(1, 6))]
+        self.assertEqual(encode_runs(layers, 8), [[2, 1], [0, 1], [1, 2], [0, 2], [2, 2]])
+        self.assertEqual(encode_runs([], 4), [[0, 4]])
+
+    def test_room_windows_span_expansion_blocks(self):
+        windows = get_room_windows(self.room, next_monday, next_monday + timedelta(days=59))
+        self.assertEqual(len(windows), 60)
+        self.assertEqual(windows[0], (self.at(9, 0), self.at(17, 0)))
+        self.assertEqual(windows[-1][0].date(), next_monday + timedelta(days=59))
+
+
+class AvailabilityCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.loc = Location.objects.create(name="Building A")
+        self.room = Room.objects.create(name="Meeting Room", location=self.loc)
+        self.other_room = Room.objects.create(name="Other Room", location=self.loc)
+        self.url = (f"/api/rooms/{self.room.id}/availability/"
+                    f"?start_date={next_monday}&end_date={next_monday + timedelta(days=7)}")
+
+    def at(self, hour, days=0):
+        return timezone.make_aware(
+            timezone.datetime.combine(next_monday + timedelta(days=days), time(hour, 0)))
+
+    def slots(self, response, days=0):
+        day = (next_monday + timedelta(days=days)).isoformat()
+        return next(d["slots"] for d in response.data["availability"] if d["date"] == day)
+
+    def book(self, room, start, end, recurrence_rule=""):
+        return Booking.objects.create(
+            room=room,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=start,
+            end_datetime=end,
+            recurrence_rule=recurrence_rule,
+            status='CONFIRMED'
+        )
+
+    def test_availability_served_from_cache(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(any("bookingoccurrence" in query["sql"] for query in queries.captured_queries))
+
+    def test_availability_etag(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get(self.url + "&opening_hours=true", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.book(self.room, self.at(10), self.at(11))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_availability_of_today_trimmed_to_the_etag_minute(self):
+        current_time = timezone.localtime().replace(hour=12, minute=30, second=42, microsecond=5)
+        url = f"/api/rooms/{self.room.id}/availability/?end_date={today.isoformat()}"
+        with mock.patch("api.room.views.now", return_value=current_time):
+            response = self.client.get(url)
+        self.assertEqual(response.data["availability"][0]["slots"][0]["start"],
+                         current_time.replace(second=0, microsecond=0).isoformat())
+
+    def test_cache_keyed_by_room_booking_version(self):
+        self.client.get(self.url)
+        other_url = self.url.replace(f"/rooms/{self.room.id}/", f"/rooms/{self.other_room.id}/")
+        self.client.get(other_url)
+        stale_room = Room.objects.get(pk=self.room.pk)
+
+        # weekly series touching next monday and the monday after
+        booking = self.book(self.room, self.at(10), self.at(11), "FREQ=WEEKLY;COUNT=2")
+        # a request that loaded the room before the booking caches under the old version only
+        get_free_slots_by_date(stale_room, next_monday, next_monday + timedelta(days=7))
+        response = self.client.get(self.url)
+        self.assertEqual(self.slots(response)[1]["start"], self.at(11).isoformat())
+        self.assertEqual(self.slots(response, days=7)[1]["start"], self.at(11, days=7).isoformat())
+        self.assertEqual(len(self.slots(response, days=1)), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.slots(self.client.get(other_url))), 1)
+        self.assertFalse(any("bookingoccurrence" in query["sql"] for query in queries.captured_queries))
+
+        booking.status = "CANCELLED"
+        booking.save(update_fields=["status"])
+        response = self.client.get(self.url)
+        self.assertEqual(len(self.slots(response)), 1)
+        self.assertEqual(len(self.slots(response, days=7)), 1)
+
+
+class RoomRecommendationTest(APITestCase):
+    def setUp(self):
+        self.loc_a = Location.objects.create(name="Building A")
+        self.loc_b = Location.objects.create(name="Building B")
+        self.projector = Amenity.objects.create(name="Projector")
+        self.whiteboard = Amenity.objects.create(name="Whiteboard")
+        self.small = Room.objects.create(name="Small", location=self.loc_a, capacity=4)
+        self.small.amenities.set([self.projector])
+        self.exact = Room.objects.create(name="Exact", location=self.loc_a, capacity=8)
+        self.exact.amenities.set([self.projector, self.whiteboard])
+        self.large = Room.objects.create(name="Large", location=self.loc_b, capacity=20)
+        self.large.amenities.set([self.projector])
+        self.bare = Room.objects.create(name="Bare", location=self.loc_b, capacity=8)
+        self.start = timezone.make_aware(timezone.datetime.combine(next_tuesday, time(14, 0)))
+        self.end = self.start + timedelta(hours=1)
+        self.url = (f"/api/rooms/recommend/?capacity=8&amenities=Projector&start_datetime={self.start.isoformat()}"
+                    f"&end_datetime={self.end.isoformat()}").replace("+", "%2B")
+
+    def test_rooms_ranked_by_fit_amenities_and_free_time(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # too small rooms are excluded
+        self.assertEqual([r["room_id"] for r in response.data],
+                         [self.exact.id, self.large.id, self.bare.id])
+        self.assertEqual(response.data[0]["score"], 1.0)
+        self.assertEqual(response.data[1]["capacity_fit"], 0.4)
+        self.assertEqual(response.data[1]["score"], 0.82)
+        self.assertEqual(response.data[2]["amenity_match"], 0.0)
+
+        # half of the requested time is booked
+        Booking.objects.create(
+            room=self.exact,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(minutes=30),
+            recurrence_rule="",
+            status='CONFIRMED'
+        )
+        response = self.client.get(self.url + "&locations=Building A")
+        self.assertEqual(response.data[0]["room_id"], self.exact.id)
+        self.assertEqual(response.data[0]["free_time"], 0.5)
+        self.assertEqual(response.data[0]["score"], 0.8)
+
+    def test_index_refreshed_when_rooms_change(self):
+        self.client.get(self.url)
+        self.bare.amenities.add(self.projector)
+        self.large.is_active = False
+        self.large.save()
+        response = self.client.get(self.url)
+        self.assertEqual([r["room_id"] for r in response.data], [self.exact.id, self.bare.id])
+        self.assertEqual(response.data[1]["score"], 1.0)
+
+    def test_free_time_ignores_past_time(self):
+        Booking.objects.create(
+            room=self.exact,
+            visitor_name='John Doe',
+            visitor_email='john@example.com',
+            start_datetime=self.start + timedelta(minutes=30),
+            end_datetime=self.end,
+            recurrence_rule="",
+            status='CONFIRMED'
+        )
+        url = self.url + "&locations=Building A"
+        # only 14:15-14:30 of the remaining 14:15-15:00 is free
+        with mock.patch("api.room.views.now", return_value=self.start + timedelta(minutes=15)):
+            response = self.client.get(url)
+        self.assertEqual(response.data[0]["free_time"], 0.333)
+        with mock.patch("api.room.views.now", return_value=self.end):
+            response = self.client.get(url)
+        self.assertEqual(response.data[0]["free_time"], 0.0)
+
+    def test_invalid_parameters(self):
+        response = self.client.get("/api/rooms/recommend/?capacity=many")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/rooms/recommend/?capacity=-1")
+        self.assertEqual(response.data["detail"], "capacity must be non-negative and limit between 1 and 50.")
+        response = self.client.get("/api/rooms/recommend/?capacity=0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(f"/api/rooms/recommend/?start_datetime={self.start.isoformat()}".replace("+", "%2B"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
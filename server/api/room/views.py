@@ -4,19 +4,22 @@ from rest_framework import status
 from .models import Room, Location, Amenity
 from .serializers import RoomSerializer, LocationSerializer, AmenitySerializer
 from .filters import RoomFilter
+from .intervals import clip_intervals, find_first_fit, subtract_intervals
+from .availability import get_booked_slots_by_room, get_day_windows, get_free_slots_by_date, get_room_windows
+from .features import amenity_match, capacity_fit, room_feature_index
+from .bitmaps import MAX_BITMAP_DAYS, encode_runs, get_room_bitmaps, get_window_dates, is_window_available, overlap_mask
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.decorators import action
-from django.db.models import Q
 from django.utils.dateparse import parse_date, parse_datetime
-from dateutil.rrule import rruleset, rrulestr
-from api.booking.models import Booking
 from datetime import datetime, time, timedelta
 from django.utils.timezone import localdate, make_aware, localtime, now
 from collections import defaultdict
 from rest_framework.exceptions import ValidationError
 from django.utils.decorators import method_decorator
 from django_ratelimit.decorators import ratelimit
+from django.conf import settings
+from ..etag_utils import etag_matches, make_etag, not_modified_response
 # Viewset is library that provides CRUD operations for api
 # Admin have create update delete permissions everyone can read
 # get request can filter by name, location, capacity for get
@@ -26,22 +29,6 @@ from django_ratelimit.decorators import ratelimit
 # Delete has custom response message
 
 
-# Helper function to expand recurrence rules
-def _expand_recurrences(base_start_datetime, rrule_str, rdate_list=None, exdate_list=None):
-    # Convert DTSTART to local timezone (where the recurrence rule apply)
-    start_local = localtime(base_start_datetime)
-    rrule_set = rruleset()
-    if rrule_str:
-        rrule_set.rrule(rrulestr(rrule_str, dtstart=start_local))
-    if rdate_list:
-        for dt in rdate_list:
-            rrule_set.rdate(dt)
-    if exdate_list:
-        for dt in exdate_list:
-            rrule_set.exdate(dt)
-    return rrule_set
-
-
 # Helper function to validate optional datetime string (excluding date string)
 def parse_optional_datetime(value, field_name):
     # Allow None
@@ -67,6 +54,31 @@ def parse_optional_datetime(value, field_name):
     return parsed_datetime
 
 
+# Maximum number of windows of POST /rooms/availability
+MAX_AVAILABILITY_WINDOWS = 100
+
+# Weights of the room recommendation score components (each between 0 and 1)
+RECOMMENDATION_WEIGHTS = {"free_time": 0.4, "amenity_match": 0.3, "capacity_fit": 0.3}
+
+# Column size and cell values of the availability grid
+GRID_SLOT_MINUTES = 30
+GRID_LEGEND = {0: "free", 1: "booked", 2: "closed"}
+
+
+# Helper function to parse the availability mode (opening hours or 24/7) of a request
+def parse_opening_hours_mode(value):
+    # Fall back to the configured default
+    if value is None:
+        return settings.ROOM_AVAILABILITY_OPENING_HOURS
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValidationError({
+        "detail": "Invalid value for opening_hours. Use true or false."
+    })
+
+
 @method_decorator(ratelimit(key='ip', rate='200/h', block=True), name='list')
 @method_decorator(ratelimit(key='ip', rate='200/h', block=True), name='retrieve')
 @method_decorator(ratelimit(key='ip', rate='20/m', block=True), name='create')
@@ -105,53 +117,256 @@ class RoomViewSet(viewsets.ModelViewSet):
         return qs
 
     # get boolean availability (whether they can be booked) for rooms
-    @action(detail=False, methods=["get"], url_path="availability")
+    @action(detail=False, methods=["get", "post"], url_path="availability")
     def get_rooms_availability(self, request, pk=None):
         """
         Get availability (whether they can be booked) for rooms within a datetime range.
-        Returns: JSON response with room ID and availability (boolean).
+        POST takes a list of datetime ranges instead: {"windows": [{"start_datetime": ..., "end_datetime": ...}]}
+        Returns: JSON response with room ID and availability (boolean, or one boolean per window for POST).
         """
+        if request.method == "POST":
+            windows = self._parse_availability_windows(request.data)
+        else:
+            # Get start_datetime & end_datetime from params
+            windows = [(
+                parse_optional_datetime(request.query_params.get("start_datetime"), 'start_datetime'),
+                parse_optional_datetime(request.query_params.get("end_datetime"), 'end_datetime'),
+            )]
         # Get the same base queryset as /rooms
         queryset = self.get_queryset()
         # Apply filter and order as /rooms
         queryset = self.filter_queryset(queryset)
         # Apply pagination as /rooms
         page = self.paginate_queryset(queryset)
-        # Get start_datetime & end_datetime from params
-        start_datetime = request.query_params.get("start_datetime")
-        end_datetime = request.query_params.get("end_datetime")
+        # Evaluate the whole page at once (bookings are loaded in one query and reused across windows)
+        availability_by_room = self._calculate_boolean_availability_matrix(page, windows)
+        results = []
+        for room in page:
+            availability = availability_by_room[room.id]
+            results.append({
+                "room_id": room.id,
+                "availability": availability if request.method == "POST" else availability[0],
+            })
+        # Return paginated response
+        return self.get_paginated_response(results)
+
+    def _parse_availability_windows(self, data):
+        """Returns the (start_datetime, end_datetime) tuples of a POST /rooms/availability body."""
+        windows = data.get("windows") if isinstance(data, dict) else None
+        if not isinstance(windows, list) or not windows:
+            raise ValidationError({"detail": "windows must be a non-empty list."})
+        if len(windows) > MAX_AVAILABILITY_WINDOWS:
+            raise ValidationError({
+                "detail": f"Too many windows. Please limit to {MAX_AVAILABILITY_WINDOWS} or fewer."
+            })
+        parsed_windows = []
+        for index, window in enumerate(windows):
+            if not isinstance(window, dict):
+                raise ValidationError({"detail": f"windows[{index}] must be an object."})
+            parsed_windows.append((
+                parse_optional_datetime(window.get("start_datetime"), f"windows[{index}].start_datetime"),
+                parse_optional_datetime(window.get("end_datetime"), f"windows[{index}].end_datetime"),
+            ))
+        return parsed_windows
+
+    # get the earliest free slot of a given duration for every matching room
+    @action(detail=False, methods=["get"], url_path="first-available")
+    def get_first_available_slots(self, request, pk=None):
+        """
+        Find the earliest free slot of `duration` minutes between start_datetime and end_datetime
+        for every active room matching the /rooms filters (capacity, amenities, locations...).
+        Returns: JSON list of slots sorted by start, rooms without a free slot are omitted.
+        """
+        try:
+            duration = int(request.query_params.get("duration", ""))
+        except ValueError:
+            return Response({"detail": "duration (in minutes) is required"}, status=400)
+        if duration <= 0:
+            return Response({"detail": "duration must be a positive number of minutes"}, status=400)
         start_datetime = parse_optional_datetime(
-            start_datetime, 'start_datetime')
-        end_datetime = parse_optional_datetime(end_datetime, 'end_datetime')
+            request.query_params.get("start_datetime"), 'start_datetime')
+        end_datetime = parse_optional_datetime(
+            request.query_params.get("end_datetime"), 'end_datetime')
+        # end_datetime is required (else the search is unbounded)
+        if end_datetime is None:
+            return Response({"detail": "end_datetime is required"}, status=400)
         # if start_datetime is earlier than now, set to now
         current_time = localtime(now())
         if start_datetime is None or start_datetime < current_time:
             start_datetime = current_time
-        # Compute availability for each room in the page
-        results = []
-        # If there is no end_datetime, theoretically the room cannot be fully booked
-        if end_datetime is None:
-            for room in page:
-                # Availability is based on is_active status
-                availability = bool(room.is_active)
-                results.append(
-                    {"room_id": room.id, "availability": availability})
-        # If end_datetime is earlier than now, the room cannot be booked
-        elif end_datetime < current_time:
-            for room in page:
-                results.append({"room_id": room.id, "availability": False})
-        else:
-            for room in page:
-                # If a room is inactive, its availability is always False
-                if not room.is_active:
-                    availability = False
+        # Same limit as the availability of a single room
+        if (end_datetime.date() - start_datetime.date()).days > 42:
+            return Response(
+                {"detail": "Date range too large. Please limit to 42 days or fewer."},
+                status=400
+            )
+        if start_datetime >= end_datetime:
+            return Response([], status=200)
+
+        opening_hours = parse_opening_hours_mode(
+            request.query_params.get("opening_hours"))
+        rooms = list(self.filter_queryset(
+            self.get_queryset()).filter(is_active=True))
+        # Bookings of every matching room are loaded in a single range query
+        booked_slots_by_room = self._get_booked_slots_by_room(
+            rooms, start_datetime, end_datetime)
+        # 24/7 rooms are free one day at a time (as in the room availability), slots never cross midnight
+        day_windows = clip_intervals(
+            get_day_windows(start_datetime.date(), end_datetime.date()),
+            start_datetime, end_datetime)
+        first_slots = []
+        for room in rooms:
+            if opening_hours:
+                windows = clip_intervals(
+                    get_room_windows(room, start_datetime.date(), end_datetime.date()),
+                    start_datetime, end_datetime)
+            else:
+                windows = day_windows
+            free_intervals = subtract_intervals(
+                windows, booked_slots_by_room[room.id])
+            slot = find_first_fit(free_intervals, timedelta(minutes=duration))
+            if slot is not None:
+                first_slots.append((slot, room))
+        first_slots.sort(key=lambda first_slot: (first_slot[0][0], first_slot[1].id))
+        return Response([
+            {
+                "room_id": room.id,
+                "room_name": room.name,
+                "start": localtime(slot_start).isoformat(),
+                "end": localtime(slot_end).isoformat(),
+            }
+            for (slot_start, slot_end), room in first_slots
+        ], status=200)
+
+    # get a grid of every active room against fixed-size time columns
+    @action(detail=False, methods=["get"], url_path="grid")
+    def get_availability_grid(self, request, pk=None):
+        """
+        Build a room x time grid of GRID_SLOT_MINUTES columns for 1 to 7 days from start_date,
+        for every active room matching the /rooms filters.
+        Each row is run-length encoded as [cell value, number of columns] pairs (see GRID_LEGEND).
+        """
+        try:
+            start_date = parse_date(request.query_params.get("start_date", "")) or localdate()
+            days = int(request.query_params.get("days", 1))
+        except ValueError as e:
+            return Response({"detail": f"Invalid parameter. Error: {e}"}, status=400)
+        if not 1 <= days <= 7:
+            return Response({"detail": "days must be between 1 and 7."}, status=400)
+        opening_hours = parse_opening_hours_mode(
+            request.query_params.get("opening_hours"))
+        end_date = start_date + timedelta(days=days - 1)
+        slot = timedelta(minutes=GRID_SLOT_MINUTES)
+        columns = days * 24 * 60 // GRID_SLOT_MINUTES
+        grid_start = make_aware(datetime.combine(start_date, time.min))
+
+        rooms = list(self.filter_queryset(
+            self.get_queryset()).filter(is_active=True))
+        booked_slots_by_room = self._get_booked_slots_by_room(
+            rooms, grid_start, grid_start + slot * columns)
+        rows = []
+        for room in rooms:
+            # paint every booking of the room onto the row at once
+            layers = [(1, overlap_mask(
+                grid_start, booked_slots_by_room[room.id], slot=slot, slot_count=columns))]
+            if opening_hours:
+                open_mask = overlap_mask(
+                    grid_start, get_room_windows(room, start_date, end_date),
+                    slot=slot, slot_count=columns)
+                layers.append((2, ~open_mask))
+            rows.append({
+                "room_id": room.id,
+                "room_name": room.name,
+                "runs": encode_runs(layers, columns),
+            })
+        return Response({
+            "start": grid_start.isoformat(),
+            "slot_minutes": GRID_SLOT_MINUTES,
+            "columns": columns,
+            "legend": GRID_LEGEND,
+            "rooms": rows,
+        }, status=200)
+
+    # rank rooms for a request such as "8 people, projector, Tuesday 2pm"
+    @action(detail=False, methods=["get"], url_path="recommend")
+    def get_room_recommendations(self, request, pk=None):
+        """
+        Rank active rooms by capacity fit, amenity match and free time within start_datetime/end_datetime.
+        Rooms are scored from the in-memory feature index (see features.py), the bookings of the
+        candidates are loaded with a single range query.
+        Returns: JSON list of the best `limit` rooms with their score and its components.
+        """
+        try:
+            capacity = int(request.query_params.get("capacity", 0))
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError as e:
+            return Response({"detail": f"Invalid parameter. Error: {e}"}, status=400)
+        if capacity < 0 or not 1 <= limit <= 50:
+            return Response({"detail": "capacity must be non-negative and limit between 1 and 50."}, status=400)
+        amenity_names = [n.strip() for n in request.query_params.get("amenities", "").split(",") if n.strip()]
+        location_names = {n.strip().lower() for n in request.query_params.get("locations", "").split(",") if n.strip()}
+        start_datetime = parse_optional_datetime(
+            request.query_params.get("start_datetime"), 'start_datetime')
+        end_datetime = parse_optional_datetime(
+            request.query_params.get("end_datetime"), 'end_datetime')
+        if (start_datetime is None) != (end_datetime is None):
+            return Response({"detail": "start_datetime and end_datetime must be given together."}, status=400)
+        if start_datetime is not None and end_datetime <= start_datetime:
+            return Response({"detail": "end_datetime must be after start_datetime."}, status=400)
+        opening_hours = parse_opening_hours_mode(
+            request.query_params.get("opening_hours"))
+
+        index = room_feature_index.refresh()
+        requested_masks = [index.amenity_bits.get(name.lower(), 0) for name in amenity_names]
+        candidates = []
+        for room in index.rooms:
+            if location_names and room.location_name.lower() not in location_names:
+                continue
+            room_capacity_fit = capacity_fit(room.capacity, capacity)
+            # rooms that are too small cannot host the request
+            if room_capacity_fit == 0:
+                continue
+            candidates.append((room, room_capacity_fit, amenity_match(room.amenity_mask, requested_masks)))
+
+        free_time_by_room = {}
+        if start_datetime is not None:
+            # past time cannot be booked, free time is the free share of the rest of the range
+            range_start = max(start_datetime, localtime(now()))
+            booked_slots_by_room = get_booked_slots_by_room(
+                [room.id for room, _, _ in candidates], start_datetime.date(), end_datetime.date())
+            for room, _, _ in candidates:
+                if range_start >= end_datetime:
+                    free_time_by_room[room.id] = 0.0
+                    continue
+                if opening_hours:
+                    windows = clip_intervals(
+                        get_room_windows(room, start_datetime.date(), end_datetime.date()),
+                        range_start, end_datetime)
                 else:
-                    availability = self._calculate_boolean_availability(
-                        room, start_datetime, end_datetime)
-                results.append(
-                    {"room_id": room.id, "availability": availability})
-        # Return paginated response
-        return self.get_paginated_response(results)
+                    windows = [(range_start, end_datetime)]
+                free_intervals = subtract_intervals(windows, booked_slots_by_room[room.id])
+                free_time_by_room[room.id] = (
+                    sum((free_end - free_start for free_start, free_end in free_intervals), timedelta())
+                    / (end_datetime - range_start))
+
+        recommendations = []
+        for room, room_capacity_fit, room_amenity_match in candidates:
+            free_time = free_time_by_room.get(room.id, 1.0)
+            recommendations.append({
+                "room_id": room.id,
+                "room_name": room.name,
+                "location": room.location_name,
+                "capacity": room.capacity,
+                "score": round(
+                    RECOMMENDATION_WEIGHTS["free_time"] * free_time
+                    + RECOMMENDATION_WEIGHTS["amenity_match"] * room_amenity_match
+                    + RECOMMENDATION_WEIGHTS["capacity_fit"] * room_capacity_fit, 3),
+                "free_time": round(free_time, 3),
+                "amenity_match": round(room_amenity_match, 3),
+                "capacity_fit": round(room_capacity_fit, 3),
+            })
+        recommendations.sort(key=lambda recommendation: (-recommendation["score"], recommendation["room_id"]))
+        return Response(recommendations[:limit], status=200)
 
     # get availability slots (when a room can be booked) for a single room
     @action(detail=True, methods=["get"], url_path="availability")
@@ -161,6 +376,8 @@ class RoomViewSet(viewsets.ModelViewSet):
         Returns: JSON response with room ID and availability slots.
         """
         room = self.get_object()
+        opening_hours = parse_opening_hours_mode(
+            request.query_params.get("opening_hours"))
         # If a room is inactive, it has no availability.
         if not room.is_active:
             return Response({"room_id": room.id, "availability": []}, status=200)
@@ -192,33 +409,97 @@ class RoomViewSet(viewsets.ModelViewSet):
         # If the date range is invalid or end_date is in the past, return empty
         if start_date > end_date or end_date < today:
             return Response({"room_id": room.id, "availability": []}, status=200)
-        availability = self._calculate_availability(room, start_date, end_date)
-        return Response({"room_id": room.id, "availability": availability}, status=200)
-
-    def _calculate_boolean_availability(self, room, start_datetime, end_datetime):
+        # Slots only change when a booking of the room is written, or over time for today
+        # (trimmed to the current minute, so responses with the same ETag are identical)
+        current_minute = localtime(now()).replace(second=0, microsecond=0)
+        etag = make_etag(
+            room.id, room.booking_version, room.updated_at, start_date, end_date, opening_hours,
+            current_minute if start_date == today else None)
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        availability = self._calculate_availability(
+            room, start_date, end_date, opening_hours=opening_hours, not_before=current_minute)
+        response = Response({"room_id": room.id, "availability": availability}, status=200)
+        response["ETag"] = etag
+        return response
+
+    def _calculate_boolean_availability_matrix(self, rooms, windows):
         """
-        Returns True if the room has any free slot that overlaps with the requested time range.
-        Returns False only if no free interval intersects the requested time range.
-        Assumption: Room starttime and endtime are on the same day.
+        Returns True for a room and a window if the room has any free slot that overlaps with the
+        window, for a list of rooms and a list of (start_datetime, end_datetime) windows where
+        either bound can be None.
+        Slot bitmaps and bookings of all rooms are loaded once and reused across every window.
+        Returns: dict mapping room ID to a list of availability (boolean), one per window.
+        Inactive rooms are always False.
         """
-        availability_slots = self._get_availability_slots(
-            room, start_datetime, end_datetime)
-        for as_start, as_end in availability_slots:
-            if as_end > start_datetime and as_start < end_datetime:
-                return True
-        return False
+        current_time = localtime(now())
+        availability_by_room = {room.id: [False] * len(windows) for room in rooms}
+        active_rooms = [room for room in rooms if room.is_active]
+        evaluated_windows = []
+        for index, (start_datetime, end_datetime) in enumerate(windows):
+            # if start_datetime is earlier than now, set to now
+            if start_datetime is None or start_datetime < current_time:
+                start_datetime = current_time
+            # If there is no end_datetime, theoretically the room cannot be fully booked
+            if end_datetime is None:
+                for room in active_rooms:
+                    availability_by_room[room.id][index] = True
+            # If end_datetime is earlier than now, the room cannot be booked
+            elif end_datetime >= current_time:
+                evaluated_windows.append((index, start_datetime, end_datetime))
+        if not active_rooms or not evaluated_windows:
+            return availability_by_room
+
+        start_date = min(localtime(start_datetime).date() for _, start_datetime, _ in evaluated_windows)
+        end_date = max(localtime(end_datetime).date() for _, _, end_datetime in evaluated_windows)
+        undecided_windows = defaultdict(list)
+        if (end_date - start_date).days < MAX_BITMAP_DAYS:
+            # Decide most windows with slot bitmaps (of the dates touched by the windows only), only
+            # windows whose free time lies in partially covered edge slots need the exact computation
+            bitmaps = get_room_bitmaps(active_rooms, get_window_dates(
+                [(start_datetime, end_datetime) for _, start_datetime, end_datetime in evaluated_windows]))
+            for room in active_rooms:
+                for index, start_datetime, end_datetime in evaluated_windows:
+                    availability = is_window_available(
+                        bitmaps, room.id, start_datetime, end_datetime)
+                    if availability is None:
+                        undecided_windows[room].append((index, start_datetime, end_datetime))
+                    else:
+                        availability_by_room[room.id][index] = availability
+        else:
+            for room in active_rooms:
+                undecided_windows[room] = evaluated_windows
+        if not undecided_windows:
+            return availability_by_room
+
+        booked_slots_by_room = get_booked_slots_by_room(
+            [room.id for room in undecided_windows], start_date, end_date)
+        for room, room_windows in undecided_windows.items():
+            availability_slots = subtract_intervals(
+                get_room_windows(room, start_date, end_date),
+                booked_slots_by_room[room.id], not_before=current_time)
+            for index, start_datetime, end_datetime in room_windows:
+                availability_by_room[room.id][index] = any(
+                    as_end > start_datetime and as_start < end_datetime
+                    for as_start, as_end in availability_slots
+                )
+        return availability_by_room
 
-    def _calculate_availability(self, room, start_date, end_date):
+    def _calculate_availability(self, room, start_date, end_date, opening_hours=False, not_before=None):
         """
         Returns available slots grouped by date in a dictionary format.
+        Slots are limited to the room opening hours if `opening_hours` is set, else rooms are 24/7.
+        Slots are trimmed to start at `not_before` at the earliest (defaults to now).
         Assumption: Room starttime and endtime are on the same day.
         """
-        start_datetime = make_aware(datetime.combine(start_date, time.min))
         end_datetime = make_aware(datetime.combine(end_date, time.max))
-        # flattened_availability_slots = self._get_availability_slots(
-        #     room, start_datetime, end_datetime)
-        flattened_availability_slots = self._get_availability_slots_247(
-            room, start_datetime, end_datetime)
+        # free slots of every date come from the availability cache (see get_free_slots_by_date)
+        free_slots_by_date = get_free_slots_by_date(
+            room, start_date, end_date, opening_hours=opening_hours)
+        # trim past time
+        flattened_availability_slots = clip_intervals(
+            [slot for day in sorted(free_slots_by_date) for slot in free_slots_by_date[day]],
+            not_before or localtime(now()), end_datetime)
         # group slots by date
         availability_slots = defaultdict(list)
         for fi_start, fi_end in flattened_availability_slots:
@@ -229,169 +510,14 @@ class RoomViewSet(viewsets.ModelViewSet):
             })
         return [{"date": date, "slots": slots} for date, slots in sorted(availability_slots.items())]
 
-    # Helper function to get availability slots after subtracting booked slots
-    # (24/7 version — ignores room opening hours/recurrence rule)
-    def _get_availability_slots_247(self, room, start_datetime, end_datetime):
-        """
-        Returns a flat list of (free_start, free_end) datetime tuples.
-        Treats all rooms as 24/7 available — only confirmed bookings reduce availability.
-        """
-        # Step 1: get all slots that have been booked (identical to _get_availability_slots)
-        booked_slots = []
-        bookings = Booking.objects.filter(room=room, status="CONFIRMED").filter(
-            Q(recurrence_rule__isnull=False) |
-            Q(start_datetime__lt=end_datetime, end_datetime__gt=start_datetime)
-        )
-        for booking in bookings:
-            duration = booking.end_datetime - booking.start_datetime
-            if booking.recurrence_rule:
-                booking_recurrence_rule = booking.recurrence_rule
-                booking_occurrences = _expand_recurrences(
-                    localtime(booking.start_datetime),
-                    booking_recurrence_rule,
-                ).between(
-                    make_aware(datetime.combine(
-                        start_datetime.date(), time.min)),
-                    make_aware(datetime.combine(end_datetime.date(), time.max))
-                )
-                for occurrence_start in booking_occurrences:
-                    booked_slots.append(
-                        (localtime(occurrence_start), localtime(occurrence_start) + duration))
-            else:
-                booked_slots.append(
-                    (localtime(booking.start_datetime), localtime(booking.end_datetime)))
-
-        # Step 2: since rooms are 24/7, the available window is the full day for each date
-        availability_slots = []
-        current_date = start_datetime.date()
-        while current_date <= end_datetime.date():
-            day_start = make_aware(datetime.combine(current_date, time.min))
-            day_end = make_aware(datetime.combine(current_date, time.max))
-            availability_slots.extend(
-                self._calculate_free_intervals(
-                    day_start, day_end, booked_slots)
-            )
-            current_date += timedelta(days=1)
-        return availability_slots
-
-    # Helper function to get availability slots after subtracting booked slots
-    def _get_availability_slots(self, room, start_datetime, end_datetime):
+    # Helper function to load booked slots of many rooms in a single range query
+    def _get_booked_slots_by_room(self, rooms, start_datetime, end_datetime):
         """
-        Returns a flat list of (free_start, free_end) datetime tuples.
-        No sorting and formatting about output.
+        Returns a dict mapping room ID to a list of (booked_start, booked_end) local datetime tuples
+        of confirmed booking occurrences overlapping the dates of the datetime range.
         """
-        # Step 1: get all slots that have been booked
-        booked_slots = []
-        bookings = Booking.objects.filter(room=room, status="CONFIRMED").filter(
-            Q(recurrence_rule__isnull=False) |
-            Q(start_datetime__lt=end_datetime, end_datetime__gt=start_datetime)
-        )
-        for booking in bookings:
-            duration = booking.end_datetime - booking.start_datetime
-            if booking.recurrence_rule:
-                # handle rdate_list, exdate_list if needed
-                booking_recurrence_rule = booking.recurrence_rule
-                # get start time of occurrences between the date of start_datetime and the date of end_datetime
-                booking_occurrences = _expand_recurrences(
-                    localtime(booking.start_datetime),
-                    booking_recurrence_rule,
-                ).between(
-                    make_aware(datetime.combine(
-                        start_datetime.date(), time.min)),
-                    make_aware(datetime.combine(end_datetime.date(), time.max)),
-                    inc=True
-                )
-                for occurrence_start in booking_occurrences:
-                    booked_slots.append(
-                        (localtime(occurrence_start), localtime(occurrence_start) + duration))
-            else:
-                booked_slots.append(
-                    (localtime(booking.start_datetime), localtime(booking.end_datetime)))
-
-        # Step 2: get all available slots based on room's recurrence rules
-        availability_slots = []
-        if not room.recurrence_rule:
-            # assume room.start_datetime and room.end_datetime are on the same date
-            available_date = localtime(room.start_datetime).date()
-            if start_datetime.date() <= available_date <= end_datetime.date():
-                availability_slots.extend(
-                    self._calculate_free_intervals(
-                        localtime(room.start_datetime),
-                        localtime(room.end_datetime),
-                        booked_slots
-                    ))
-        else:
-            duration = room.end_datetime - room.start_datetime
-            # handle rdate_list, exdate_list if needed
-            room_recurrence_rule = room.recurrence_rule
-            # get start time of occurrences between the date of start_datetime and the date of end_datetime
-            room_occurrences = _expand_recurrences(
-                localtime(room.start_datetime),
-                room_recurrence_rule
-            ).between(
-                make_aware(datetime.combine(start_datetime.date(), time.min)),
-                make_aware(datetime.combine(end_datetime.date(), time.max)),
-                inc=True
-            )
-            for occurrence_start in room_occurrences:
-                occurrence_end = occurrence_start + duration
-                availability_slots.extend(
-                    self._calculate_free_intervals(
-                        localtime(occurrence_start),
-                        localtime(occurrence_end),
-                        booked_slots
-                    ))
-        return availability_slots
-
-    # Helper function to subtract booked slots from room availability
-    def _subtract_booked_from_room_availability(self, room_start, room_end, booked_slots):
-        booked_slots = sorted(booked_slots, key=lambda x: x[0])
-        free_intervals = []
-        current_start = room_start
-        for b_start, b_end in booked_slots:
-            # Skip bookings that end before current_start
-            if b_end <= current_start:
-                continue
-            # If booking starts after current_start, add the slot to free_intervals
-            if b_start > current_start:
-                free_intervals.append((current_start, min(b_start, room_end)))
-            # If b_end > current_start, move current_start forward
-            current_start = max(current_start, b_end)
-            # If current_start reaches room_end, end the loop
-            if current_start >= room_end:
-                break
-        # Add any remaining free interval after latest booking
-        if current_start < room_end:
-            free_intervals.append((current_start, room_end))
-        return free_intervals
-
-    # Helper function to get free intervals and trim past time
-    def _calculate_free_intervals(self, room_start, room_end, booked_slots):
-        # Filter only overlapping bookings
-        overlapping_bookings = [
-            (b_start, b_end)
-            for b_start, b_end in booked_slots
-            if b_end > room_start and b_start < room_end
-        ]
-        # Subtract booked intervals
-        free_intervals = self._subtract_booked_from_room_availability(
-            room_start, room_end, overlapping_bookings
-        )
-        # Trim past intervals
-        current_time = localtime(now())
-        trimmed_free_intervals = []
-        for fi_start, fi_end in free_intervals:
-            fi_start = localtime(fi_start)
-            fi_end = localtime(fi_end)
-            # If the interval is today, include only future times
-            if fi_start.date() == current_time.date():
-                # Skip intervals that end in the past
-                if fi_end <= current_time:
-                    continue
-                # Adjust fi_start to be current_time if it's in the past
-                fi_start = max(fi_start, current_time)
-            trimmed_free_intervals.append((fi_start, fi_end))
-        return trimmed_free_intervals
+        return get_booked_slots_by_room(
+            [room.id for room in rooms], start_datetime.date(), end_datetime.date())
 
 
 class LocationViewSet(viewsets.ModelViewSet):
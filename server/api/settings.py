@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 
 load_dotenv()
 
@@ -91,6 +93,9 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
     r"^https://bloom-booking-system.*\.vercel\.app$",
 ]
 
+# Idempotency-Key is sent by clients retrying booking requests (see idempotency_utils.py)
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 ROOT_URLCONF = "api.urls"
 
 TEMPLATES = [
@@ -241,4 +246,46 @@ MEDIA_URL = "/media/"
 
 AUTH_USER_MODEL = "api_user.CustomUser"
 
+# =========================
+# Cache
+# =========================
+
+# Shared by every worker (gunicorn runs several processes): cached availability, Idempotency-Key
+# responses and rate limits must be seen by all of them.
+# Database table by default, created by `python manage.py createcachetable` (run by the entrypoint),
+# or e.g. Redis with CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "django_cache"),
+    }
+}
+
+# Local memory is per process, only allowed for development
+if not DEBUG and CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+    raise ImproperlyConfigured(
+        "LocMemCache is not shared between workers, use a shared CACHE_BACKEND outside of development.")
+
+# =========================
+# Room availability
+# =========================
+
+# Lifetime (seconds) of cached room availability, entries are also invalidated when bookings change
+ROOM_AVAILABILITY_CACHE_TIMEOUT = int(
+    os.environ.get("ROOM_AVAILABILITY_CACHE_TIMEOUT", 24 * 60 * 60))
+
+# Compute free slots within room opening hours (start_datetime, end_datetime and recurrence_rule of a room)
+# instead of treating rooms as available 24/7. Can be overridden per request with ?opening_hours=true|false
+ROOM_AVAILABILITY_OPENING_HOURS = os.environ.get(
+    "ROOM_AVAILABILITY_OPENING_HOURS", "false").lower() == "true"
+
+# =========================
+# Idempotency keys
+# =========================
+
+# Lifetime (seconds) of the responses stored for Idempotency-Key headers (see idempotency_utils.py)
+IDEMPOTENCY_KEY_TIMEOUT = int(
+    os.environ.get("IDEMPOTENCY_KEY_TIMEOUT", 24 * 60 * 60))
+
 RECAPTCHA_SECRET_KEY = os.environ.get("RECAPTCHA_SECRET_KEY")
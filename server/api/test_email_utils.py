@@ -1,8 +1,10 @@
 from django.core import mail
 from django.utils import timezone
 from datetime import timedelta, timezone as dt_timezone
+from api.email_rendering import build_ics, clear_email_caches, fold_ics_line, humanize_rule
 from api.email_utils import send_booking_confirmed_email, send_booking_cancelled_email
-from django.test import TestCase, override_settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest.mock import patch
 
 
 class TestBookingConfirmedEmail(TestCase):
@@ -130,3 +132,40 @@ class TestBookingCancelledEmail(TestCase):
         )
         assert result == 0
         assert len(mail.outbox) == 0
+
+
+class TestEmailRendering(SimpleTestCase):
+
+    def setUp(self):
+        clear_email_caches()
+
+    def test_humanized_rules_are_memoized(self):
+        with patch('api.email_rendering.humanize', return_value="Every day, 3 times") as mock_humanize:
+            assert humanize_rule('FREQ=DAILY;COUNT=3') == "Every day, 3 times"
+            assert humanize_rule('RRULE:FREQ=DAILY;COUNT=3') == "Every day, 3 times"
+            assert humanize_rule('') == ""
+        mock_humanize.assert_called_once_with('FREQ=DAILY;COUNT=3')
+
+    def test_ics_text_is_escaped_and_folded(self):
+        start = timezone.now()
+        content = build_ics([{
+            "uid": "booking-1@Bloom",
+            "summary": "Room; A, level 2",
+            "start_datetime": start,
+            "end_datetime": start + timedelta(hours=1),
+            "recurrence_rule": "FREQ=WEEKLY;BYDAY=MO,WE",
+            "description": "Visitor: Zoë\nLine " + "x" * 100,
+        }])
+
+        assert "SUMMARY:Room\\; A\\, level 2\r\n" in content
+        assert "RRULE:FREQ=WEEKLY;BYDAY=MO,WE\r\n" in content
+        lines = content.split("\r\n")
+        assert all(len(line.encode()) <= 75 for line in lines)
+        description = "".join(line[1:] if line.startswith(" ") else line
+                              for line in lines if line.startswith(("DESCRIPTION", " ")))
+        assert description == "DESCRIPTION:Visitor: Zoë\\nLine " + "x" * 100
+
+    def test_fold_does_not_split_multibyte_characters(self):
+        folded = fold_ics_line("DESCRIPTION:" + "é" * 80)
+        assert all(len(line.encode()) <= 75 for line in folded.split("\r\n"))
+        assert folded.replace("\r\n ", "") == "DESCRIPTION:" + "é" * 80
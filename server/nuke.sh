@@ -2,4 +2,5 @@
 
 python manage.py reset_db --noinput
 python manage.py migrate --noinput
+python manage.py createcachetable
 python manage.py createsuperuser --noinput # recreate the superuser to login to the admin panel
\ No newline at end of file